@@ -0,0 +1,206 @@
+"""
+Embedding service: one warm encoder shared by every retrieval / ingest process.
+
+    python api/embed_api.py [--port 8010]
+    EMBED_SERVICE_URL=http://127.0.0.1:8010   (in the other processes' environment)
+
+POST /embed {"texts": [...], "model": "all-MiniLM-L6-v2", "int8": false, "normalize": true}
+  -> {"model", "backend", "version", "dim", "dtype": "float32", "count", "cached",
+      "vectors": base64 of the little-endian float32 [count, dim] matrix}
+"model" is the model id the vectors belong to (src/retriever/encoder.model_id,
+"<model>-int8" for quantized weights) and "version" the runtime + weights
+behind it; clients check it before using the vectors.
+
+Requests from all callers go through one MicroBatcher per model
+(src/serving/batcher.py): up to EMBED_MAX_BATCH texts per model call,
+waiting at most EMBED_MAX_WAIT_MS for more. Vectors are cached in memory by
+normalized text hash (EMBED_SERVICE_CACHE entries, LRU), so repeated texts
+and questions are not re-encoded. The backend is the service's own
+ENCODER_BACKEND / ENCODER_INT8 setting; the default model (EMBED_MODEL) is
+loaded at startup, others on first request.
+"""
+import os, sys, base64, asyncio, threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from src.serving import metrics, tracing, logs
+from src.serving.metrics import EMBED_BATCH_TEXTS, EMBED_CACHE, stage
+from src.serving.readiness import Loader
+from src.serving.batcher import MicroBatcher
+from src.retriever.embed_cache import model_key, text_key
+from src.retriever.encoder import EMBED_MODEL, ENCODER_INT8, load_encoder
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_SERVICE_CACHE = int(os.getenv("EMBED_SERVICE_CACHE", "50000"))
+EMBED_MAX_TEXTS = int(os.getenv("EMBED_MAX_TEXTS", "2048"))
+
+
+class VectorLRU:
+    """Un-normalized vectors by text hash; touched only from the event loop."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._d = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        v = self._d.get(key)
+        if v is None:
+            self.misses += 1
+            return None
+        self._d.move_to_end(key)
+        self.hits += 1
+        return v
+
+    def put(self, key, vec) -> None:
+        if self.capacity <= 0:
+            return
+        self._d[key] = vec
+        self._d.move_to_end(key)
+        while len(self._d) > self.capacity:
+            self._d.popitem(last=False)
+
+    def __len__(self):
+        return len(self._d)
+
+
+class Served:
+    """One model as served: encoder + batcher + vector cache."""
+
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.batcher = MicroBatcher(self._encode, EMBED_MAX_BATCH, EMBED_MAX_WAIT_MS, name="embed")
+        self.cache = VectorLRU(EMBED_SERVICE_CACHE)
+
+    def _encode(self, texts):
+        EMBED_BATCH_TEXTS.observe(len(texts))
+        with stage("encode_batch"):
+            return self.encoder.encode(texts, batch_size=EMBED_MAX_BATCH)
+
+    def info(self) -> dict:
+        enc = self.encoder
+        return {"backend": enc.backend, "version": enc.version, "dim": enc.dim,
+                "cache": {"entries": len(self.cache), "hits": self.cache.hits, "misses": self.cache.misses},
+                "batching": self.batcher.stats()}
+
+
+_served_lock = threading.Lock()
+
+
+def _served(res, name: str, int8: bool) -> Served:
+    key = (model_key(name), int8)
+    with _served_lock:
+        s = res["models"].get(key)
+        if s is None:
+            # remote=False: this process *is* the service, even if EMBED_SERVICE_URL is set
+            s = res["models"][key] = Served(load_encoder(name, int8=int8, remote=False))
+        return s
+
+
+def _load(loader):
+    res = {"models": {}}
+    with loader.step("load_model"):
+        _served(res, EMBED_MODEL, ENCODER_INT8)
+    return res
+
+
+def _warmup(res):
+    for s in res["models"].values():
+        s.encoder.encode(["warm-up query"])
+
+
+state = Loader("embed_api", _load, _warmup)
+logs.setup("embed_api")
+
+app = FastAPI(title="Contracts embedding service", version="0.1.0")
+metrics.install(app, "embed_api")
+tracing.install(app, "embed_api")
+state.install(app)
+
+
+class EmbedIn(BaseModel):
+    texts: List[str]
+    model: Optional[str] = None
+    int8: Optional[bool] = None
+    normalize: bool = False
+
+
+@app.get("/health")
+def health():
+    if not state.ready:
+        return {"ok": True, "ready": False, "status": state.status}
+    return {"ok": True, "ready": True,
+            "models": {s.encoder.model_id: s.info() for s in state.resources["models"].values()}}
+
+
+@app.post("/embed")
+async def embed(body: EmbedIn):
+    res = state.get()
+    if len(body.texts) > EMBED_MAX_TEXTS:
+        raise HTTPException(413, f"at most {EMBED_MAX_TEXTS} texts per request")
+    name = body.model or EMBED_MODEL
+    int8 = ENCODER_INT8 if body.int8 is None else body.int8
+    key = (model_key(name), int8)
+    served = res["models"].get(key)
+    if served is None:
+        try:
+            served = await asyncio.get_running_loop().run_in_executor(None, _served, res, name, int8)
+        except Exception as e:  # noqa: BLE001
+            raise HTTPException(400, f"cannot load model {name!r}: {type(e).__name__}: {e}")
+
+    keys = [text_key(t) for t in body.texts]
+    found = {}
+    missing = {}
+    for k, t in zip(keys, body.texts):
+        if k in found or k in missing:
+            continue
+        v = served.cache.get(k)
+        if v is None:
+            missing[k] = t
+        else:
+            found[k] = v
+    EMBED_CACHE.inc(len(found), result="hit")
+    EMBED_CACHE.inc(len(missing), result="miss")
+    if missing:
+        new = await served.batcher.submit(list(missing.values()))
+        for k, v in zip(missing.keys(), new):
+            v = np.asarray(v, dtype="float32")
+            served.cache.put(k, v)
+            found[k] = v
+
+    enc = served.encoder
+    dim = enc.dim or (len(next(iter(found.values()))) if found else 0)
+    out = np.empty((len(keys), dim), dtype="<f4")
+    for i, k in enumerate(keys):
+        out[i] = found[k]
+    if body.normalize:
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        out /= norms
+    return {"model": enc.model_id, "backend": enc.backend, "version": enc.version, "dim": dim,
+            "dtype": "float32", "count": len(keys), "cached": len(keys) - len(missing),
+            "vectors": base64.b64encode(out.tobytes()).decode("ascii")}
+
+
+def main():
+    import argparse
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description="Contracts embedding service (api/embed_api.py)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8010)
+    args = ap.parse_args()
+    # one process on purpose: one warm model, batching across every caller
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
-import os, re, json, numpy as np, pandas as pd
+import os, re, sys, json, numpy as np, pandas as pd
 from tqdm import tqdm
 
-BASE = os.path.dirname(os.path.dirname(__file__))
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE not in sys.path:
+    sys.path.insert(0, BASE)
+from src.retriever.embed_cache import get_cache
+from src.retriever.encoder import EMBED_MODEL, load_encoder, model_id
+from src.answerer.risk import RISK, LEVELS
+from src.retriever.mapped_meta import write_arrow
+
 RAW  = os.path.join(BASE, "data", "raw_pdfs")
 IDXD = os.path.join(BASE, "data", "index")
 os.makedirs(IDXD, exist_ok=True)
@@ -12,14 +19,10 @@ def log(msg):
         f.write(str(msg).rstrip()+"\n")
 
 def read_pdf(path):
-    # Try PyMuPDF first
+    # Try PyMuPDF first (OCR only for pages without a text layer)
     try:
-        import fitz
-        doc = fitz.open(path)
-        text = []
-        for p in doc:
-            text.append(p.get_text("text"))
-        return "\n".join(text)
+        from src.extract.ocr import extract_pages
+        return "\n".join(extract_pages(path))
     except Exception as e:
         # Fallback: pdfplumber
         try:
@@ -41,7 +44,6 @@ def chunk_text(t, size=800, overlap=200):
 
 def main():
     import faiss
-    from sentence_transformers import SentenceTransformer
 
     pdfs = [f for f in os.listdir(RAW) if f.lower().endswith(".pdf")]
     if not pdfs:
@@ -67,12 +69,17 @@ def main():
         raise RuntimeError("No chunks generated. Check PDFs and logs.")
 
     df = pd.DataFrame(rows)
+    # per-chunk risk level, stored as a column so per-owner summaries are a column read
+    df["risk"] = pd.Categorical(RISK.labels(df["text"].tolist()), categories=LEVELS, ordered=True)
     meta_path = os.path.join(IDXD, "meta.parquet")
     df.to_parquet(meta_path, index=False)
+    # same rows as an uncompressed Arrow file, memory-mapped by api/rag_api.py workers
+    write_arrow(df, os.path.join(IDXD, "meta.arrow"))
 
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    vecs = model.encode(df["text"].tolist(), normalize_embeddings=True)
+    cache = get_cache(model_id(EMBED_MODEL))
+    vecs = cache.encode(df["text"].tolist(), lambda: load_encoder(EMBED_MODEL), normalize=True)
     vecs = np.asarray(vecs, dtype="float32")
+    log(f"embed cache: {cache.last_hits} hits, {cache.last_misses} encoded")
 
     index = faiss.IndexFlatIP(vecs.shape[1])
     index.add(vecs)
@@ -1,74 +1,225 @@
-import os, re, numpy as np, pandas as pd, faiss
-from sentence_transformers import SentenceTransformer
+import os, sys, threading, numpy as np
+from typing import Optional
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-IDXD = os.path.join(BASE_DIR, "data", "index")
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from src.serving import metrics, tracing, profiling, logs
+from src.serving.metrics import stage
+from src.serving.readiness import Loader
+from src.answerer.extractive import classify_risk, extractive_answer
+from src.answerer.risk import RISK, LEVELS
+from src.retriever.encoder import (EMBED_MODEL, EMBED_SERVICE_URL, ENCODER_BACKEND, load_encoder, onnx_files,
+                                   set_num_threads)
+
+IDXD = os.getenv("RAG_INDEX_DIR", os.path.join(BASE_DIR, "data", "index"))
 INDEX = os.path.join(IDXD, "faiss.index")
 META  = os.path.join(IDXD, "meta.parquet")
-if not (os.path.exists(INDEX) and os.path.exists(META)):
-    raise RuntimeError("Index not found. Run ingestion first.")
+META_ARROW = os.path.join(IDXD, "meta.arrow")
+
+# Varios workers (python api/rag_api.py --workers N): índice faiss y metadatos
+# memory-mapped (solo lectura, page cache compartida entre procesos) y un modelo
+# por worker cargado en la primera consulta. RAG_MMAP=0 vuelve a leerlos en RAM.
+# Con EMBED_SERVICE_URL (api/embed_api.py) los workers no cargan modelo propio.
+RAG_WORKERS = int(os.getenv("RAG_WORKERS", "1"))
+RAG_MMAP = os.getenv("RAG_MMAP", "1") != "0"
+RAG_LAZY_MODEL = os.getenv("RAG_LAZY_MODEL", "1" if RAG_WORKERS > 1 else "0") != "0"
+
+def _with_risk(df):
+    # índices anteriores a la columna "risk" (api/ingest.py): se calcula una vez aquí
+    import pandas as pd
+    if "risk" not in df.columns:
+        df = df.assign(risk=RISK.labels(df["text"].tolist()))
+    df["risk"] = pd.Categorical(df["risk"], categories=LEVELS, ordered=True)
+    return df
+
+def prepare_files():
+    """meta.arrow al día respecto a meta.parquet (lo hace el proceso principal antes de los workers)."""
+    from src.retriever.mapped_meta import ensure_arrow
+    return ensure_arrow(META, META_ARROW, _with_risk)
+
+def _split_threads():
+    # N workers x todos los cores = sobre-suscripción; repartir los hilos del encoder/faiss
+    if RAG_WORKERS <= 1:
+        return
+    per = max(1, (os.cpu_count() or 1) // RAG_WORKERS)
+    set_num_threads(per)
+    import faiss
+    faiss.omp_set_num_threads(per)
+
+# faiss / pyarrow / the encoder are imported and loaded in the background
+# (see src/serving/readiness.py) so uvicorn is listening right away.
+def _load(loader):
+    if not (os.path.exists(INDEX) and os.path.exists(META)):
+        raise RuntimeError("Index not found. Run ingestion first.")
+    with loader.step("import_faiss"):
+        import faiss
+    with loader.step("import_pyarrow"):
+        from src.retriever.mapped_meta import MappedMeta
+    with loader.step("read_index"):
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) if RAG_MMAP else 0
+        index = faiss.read_index(INDEX, flags)
+    with loader.step("read_meta"):
+        meta = MappedMeta(prepare_files(), mmap=RAG_MMAP)
+    _split_threads()
+    res = {"index": index, "meta": meta, "model": None, "model_lock": threading.Lock(), "risk_selectors": {}}
+    if not RAG_LAZY_MODEL:
+        with loader.step("load_model"):
+            _model(res)
+    return res
+
+def _model(res):
+    """Encoder de este worker (ENCODER_BACKEND, se carga la primera vez que se necesita)."""
+    if res["model"] is None:
+        with res["model_lock"]:
+            if res["model"] is None:
+                with stage("load_model"):
+                    res["model"] = load_encoder(EMBED_MODEL)
+    return res["model"]
+
+def _warmup(res):
+    # con modelo perezoso solo se tocan las páginas del índice
+    if res["model"] is None:
+        q = np.zeros((1, res["index"].d), dtype="float32")
+    else:
+        q = np.asarray(res["model"].encode(["warm-up query"], normalize_embeddings=True), dtype="float32")
+    res["index"].search(q, 1)
 
-index = faiss.read_index(INDEX)
-meta  = pd.read_parquet(META)
-model = SentenceTransformer("all-MiniLM-L6-v2")
+state = Loader("api_rag", _load, _warmup)
+logs.setup("api_rag")
 
 app = FastAPI(title="Contracts RAG API", version="0.1.0")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+metrics.install(app, "api_rag")
+tracing.install(app, "api_rag")
+profiling.install(app, "api_rag")
+state.install(app)
+
+def _memory():
+    # memoria de este worker (Linux): Pss reparte las páginas compartidas entre procesos
+    vals = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    vals[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return None
+    mb = lambda *keys: round(sum(vals.get(k, 0) for k in keys) / 1024, 1)
+    return {"rss_mb": mb("Rss"), "pss_mb": mb("Pss"), "private_mb": mb("Private_Clean", "Private_Dirty"),
+            "shared_mb": mb("Shared_Clean", "Shared_Dirty")}
 
 @app.get("/health")
 def health():
-    return {"ok": True, "has_index": True, "chunks": int(meta.shape[0])}
+    if not state.ready:
+        return {"ok": True, "ready": False, "status": state.status, "has_index": os.path.exists(INDEX)}
+    res = state.resources
+    return {"ok": True, "ready": True, "has_index": True, "chunks": len(res["meta"]), "pid": os.getpid(),
+            "workers": RAG_WORKERS, "mmap": RAG_MMAP, "model_loaded": res["model"] is not None,
+            "encoder": res["model"].model_id if res["model"] else ENCODER_BACKEND,
+            "memory": _memory()}
+
+def _risk_selector(res, min_risk: str):
+    # ids de los chunks con riesgo >= min_risk, calculados una vez por nivel
+    sels = res["risk_selectors"]
+    if min_risk not in sels:
+        import faiss
+        codes = res["meta"].codes("risk", LEVELS)
+        sels[min_risk] = faiss.IDSelectorBatch(np.flatnonzero(codes >= LEVELS.index(min_risk)).astype("int64"))
+    return sels[min_risk]
 
 @app.post("/search")
-def search(question: str = Query(..., min_length=3), k: int = 5):
-    if meta.shape[0] == 0:
+def search(question: str = Query(..., min_length=3), k: int = 5,
+           min_risk: Optional[str] = Query(None, pattern="^(low|medium|high)$")):
+    res = state.get()
+    index, meta = res["index"], res["meta"]
+    if len(meta) == 0:
         raise HTTPException(500, "Empty index")
-    emb = model.encode([question], normalize_embeddings=True)
-    D, I = index.search(np.asarray(emb, dtype="float32"), k)
-    rows = meta.iloc[I[0]].copy()
-    rows = rows.assign(score=D[0])
-    return {"ok": True, "results": rows.to_dict(orient="records")}
+    model = _model(res)
+    with stage("encode"):
+        emb = model.encode([question], normalize_embeddings=True)
+    with stage("search"):
+        if min_risk:
+            import faiss
+            params = faiss.SearchParameters(sel=_risk_selector(res, min_risk))
+            D, I = index.search(np.asarray(emb, dtype="float32"), k, params=params)
+        else:
+            D, I = index.search(np.asarray(emb, dtype="float32"), k)
+    with stage("assemble"):
+        found = I[0] >= 0
+        results = [{**row, "score": float(s)} for row, s in zip(meta.rows(I[0][found]), D[0][found])]
+    return {"ok": True, "results": results}
 
 # ---- Simple /ask: extractivo + "riesgo" heurístico + citas  -----------------
-def classify_risk(answer:str)->str:
-    a = (answer or "").lower()
-    if any(w in a for w in ["terminate immediately","material breach","liquidated damages","penalty","default","forfeit"]): return "high"
-    if any(w in a for w in ["notice","30 days","cure period","renewal","termination","late fee","indemn"]): return "medium"
-    return "low"
-
+# (classify_risk / extractive_answer viven en src/answerer/extractive.py)
 @app.post("/ask")
 def ask(question: str = Query(..., min_length=3), top_k: int = 12, return_k: int = 5):
-    if meta.shape[0] == 0:
+    res = state.get()
+    index, meta = res["index"], res["meta"]
+    if len(meta) == 0:
         raise HTTPException(500, "Empty index")
+    model = _model(res)
 
     # Retrieve top_k
-    qemb = model.encode([question], normalize_embeddings=True)
-    D, I = index.search(np.asarray(qemb, dtype="float32"), int(top_k))
-    cands = meta.iloc[I[0]].copy()
-    cands = cands.assign(score=D[0])
-
-    # "Reranking" simple por score (ya es IP); cortar a return_k
-    cands = cands.sort_values("score", ascending=False).head(int(return_k))
-
-    # Respuesta extractiva básica: concatenar fragmentos más relevantes
-    snippets = cands["text"].tolist()
-    joined = "\n".join(snippets)
-    # pequeña extracción de frases que contienen palabras de la pregunta
-    toks = [t for t in re.split(r"[^a-zA-Z0-9]+", question.lower()) if t]
-    keep = []
-    for sent in re.split(r"(?<=[\.\!\?])\s+", joined):
-        sL = sent.lower()
-        if any(t and t in sL for t in toks):
-            keep.append(sent)
-        if len(keep) >= 6:
-            break
-    answer = ("\n".join(keep) or snippets[0] if snippets else "(no context)").strip()
+    with stage("encode"):
+        qemb = model.encode([question], normalize_embeddings=True)
+    with stage("search"):
+        D, I = index.search(np.asarray(qemb, dtype="float32"), int(top_k))
+    with stage("assemble"):
+        found = I[0] >= 0
+        cands = [{**row, "score": float(s)} for row, s in zip(meta.rows(I[0][found]), D[0][found])]
+
+        # "Reranking" simple por score (ya es IP); cortar a return_k
+        cands = sorted(cands, key=lambda r: r["score"], reverse=True)[:int(return_k)]
 
+    # Respuesta extractiva básica: frases de los fragmentos que contienen palabras de la pregunta
+    answer = extractive_answer(question, [r["text"] for r in cands])
     risk = classify_risk(answer)
     citations = [
-        {"owner": r["owner"], "text": r["text"], "score": float(r["score"])}
-        for _, r in cands.iterrows()
+        {"owner": r["owner"], "text": r["text"], "score": r["score"], "risk": r["risk"]}
+        for r in cands
     ]
-    return {"answer": answer, "risk": risk, "citations": citations}
\ No newline at end of file
+    return {"answer": answer, "risk": risk, "citations": citations}
+
+@app.get("/risk/summary")
+def risk_summary(owner: Optional[str] = None):
+    """Distribución de riesgo por owner (conteos de la columna "risk", sin reescanear textos)."""
+    names, counts = state.get()["meta"].level_counts("owner", "risk", LEVELS)
+    if owner is not None:
+        if owner not in names:
+            raise HTTPException(404, "unknown owner")
+        i = names.index(owner)
+        names, counts = [owner], counts[i:i + 1]
+    owners = []
+    for name, row in zip(names, counts):
+        total = int(row.sum())
+        if not total:
+            continue
+        owners.append({"owner": name, "chunks": total, **{lvl: int(n) for lvl, n in zip(LEVELS, row)},
+                       "high_share": round(int(row[LEVELS.index("high")]) / total, 4)})
+    owners.sort(key=lambda o: (-o["high_share"], o["owner"]))
+    totals = {lvl: int(n) for lvl, n in zip(LEVELS, counts.sum(axis=0))}
+    return {"ok": True, "chunks": int(sum(totals.values())), "totals": totals, "owners": owners}
+
+def main():
+    import argparse
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description="Contracts RAG API (api/rag_api.py)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--workers", type=int, default=RAG_WORKERS)
+    args = ap.parse_args()
+    # los workers leen RAG_WORKERS al importar el módulo
+    os.environ["RAG_WORKERS"] = str(args.workers)
+    if os.path.exists(META):
+        prepare_files()
+    if ENCODER_BACKEND == "onnx" and not EMBED_SERVICE_URL:
+        onnx_files(EMBED_MODEL)  # exportar / cuantizar una vez, no en cada worker
+    uvicorn.run("api.rag_api:app", host=args.host, port=args.port, workers=args.workers, log_level="info")
+
+if __name__ == "__main__":
+    main()
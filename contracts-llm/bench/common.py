@@ -0,0 +1,126 @@
+"""
+common.py
+
+Shared helpers for the bench/ scripts: percentiles, starting/stopping local
+uvicorn processes, parsing the apps' /metrics, and saving results as JSON
+under bench/results/.
+"""
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+RESULTS_DIR = BASE_DIR / "bench" / "results"
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile (p in 0..100); None for an empty list."""
+    if not values:
+        return None
+    s = sorted(values)
+    k = max(0, min(len(s) - 1, int(round(p / 100.0 * len(s) + 0.5)) - 1))
+    return s[k]
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, Optional[float]]:
+    def r(v):
+        return round(v, 2) if v is not None else None
+    return {
+        "p50_ms": r(percentile(latencies_ms, 50)),
+        "p95_ms": r(percentile(latencies_ms, 95)),
+        "p99_ms": r(percentile(latencies_ms, 99)),
+        "mean_ms": r(sum(latencies_ms) / len(latencies_ms)) if latencies_ms else None,
+        "max_ms": r(max(latencies_ms)) if latencies_ms else None,
+    }
+
+
+_SAMPLE_RE = re.compile(r'^([A-Za-z_:][A-Za-z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_prometheus(text: str) -> List[Tuple[str, Dict[str, str], float]]:
+    """Parse Prometheus text format into (name, labels, value) samples."""
+    out = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        m = _SAMPLE_RE.match(line.strip())
+        if not m:
+            continue
+        labels = dict(_LABEL_RE.findall(m.group(2) or ""))
+        try:
+            out.append((m.group(1), labels, float(m.group(3))))
+        except ValueError:
+            pass
+    return out
+
+
+def metric_sum(samples, name: str, **match: str) -> float:
+    """Sum of all samples called `name` whose labels include `match`."""
+    return sum(v for n, labels, v in samples
+               if n == name and all(labels.get(k) == want for k, want in match.items()))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port: int, timeout: float = 60.0, proc: Optional[subprocess.Popen] = None) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            return False
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return True
+        time.sleep(0.1)
+    return False
+
+
+def start_uvicorn(app: str, port: int, env: Optional[Dict[str, str]] = None,
+                  workers: int = 1) -> subprocess.Popen:
+    """Start `uvicorn <app>` from contracts-llm/ with extra env vars."""
+    cmd = [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1",
+           "--port", str(port), "--log-level", "warning", "--workers", str(workers)]
+    return subprocess.Popen(cmd, cwd=str(BASE_DIR), env={**os.environ, **(env or {})})
+
+
+def start_script(script: str, args: List[str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, str(BASE_DIR / script), *args], cwd=str(BASE_DIR))
+
+
+def stop(proc: Optional[subprocess.Popen]) -> None:
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def git_rev() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(BASE_DIR),
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or "unknown"
+    except Exception:  # noqa: BLE001
+        return "unknown"
+
+
+def save_result(kind: str, data: dict, out: Optional[str] = None) -> Path:
+    """Write results to bench/results/<kind>-<rev>-<timestamp>.json (or `out`)."""
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    rev = git_rev()
+    path = Path(out) if out else RESULTS_DIR / f"{kind}-{rev}-{time.strftime('%Y%m%d_%H%M%S')}.json"
+    payload = {"kind": kind, "git_rev": rev, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), **data}
+    path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    return path
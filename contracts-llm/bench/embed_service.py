@@ -0,0 +1,116 @@
+"""
+embed_service.py
+
+Throughput and latency of the embedding service (api/embed_api.py) under many
+concurrent callers, with and without dynamic batching.
+
+For each --max-batch value it starts `uvicorn api.embed_api:app` with
+EMBED_MAX_BATCH set (1 = no batching, every request is its own model call)
+and the vector cache off (EMBED_SERVICE_CACHE=0, so every text is encoded),
+waits for /health, then runs --concurrency closed-loop clients each posting
+--texts-per-request corpus chunks (cut to --max-chars for query-sized
+inputs) for --duration seconds. Reports
+texts/s, request latency and the mean batch the service actually ran
+(/health batching stats).
+
+Run with:
+    .venv\\Scripts\\python.exe bench\\embed_service.py --max-batch 1,64 --concurrency 16
+    ENCODER_BACKEND=onnx python bench/embed_service.py --max-batch 1,16,64 --texts-per-request 1
+"""
+import argparse
+import asyncio
+import itertools
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from common import free_port, latency_summary, save_result, start_uvicorn, stop, wait_port  # noqa: E402
+from encoder import corpus  # noqa: E402
+
+
+async def drive(base: str, texts: List[str], concurrency: int, per_request: int, duration: float) -> Dict:
+    latencies, errors, sent = [], 0, 0
+    counter = itertools.count()
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+
+        async def loop():
+            nonlocal errors, sent
+            while time.perf_counter() < deadline:
+                batch = [texts[next(counter) % len(texts)] for _ in range(per_request)]
+                t = time.perf_counter()
+                try:
+                    r = await client.post(f"{base}/embed", json={"texts": batch, "normalize": True})
+                    if r.status_code != 200:
+                        errors += 1
+                    else:
+                        sent += len(batch)
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - t) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+    return {"requests": len(latencies), "errors": errors, "texts_per_s": round(sent / wall, 1),
+            "latency_ms": latency_summary(latencies)}
+
+
+def run_one(max_batch: int, args, texts: List[str]) -> Dict:
+    port = free_port()
+    env = {"EMBED_MAX_BATCH": str(max_batch), "EMBED_MAX_WAIT_MS": str(args.max_wait_ms),
+           "EMBED_SERVICE_CACHE": "0", "EMBED_SERVICE_URL": ""}
+    if args.model:
+        env["EMBED_MODEL"] = args.model
+    proc = start_uvicorn("api.embed_api:app", port, env=env)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        if not wait_port(port, timeout=60, proc=proc):
+            raise SystemExit("api/embed_api did not start")
+        deadline = time.time() + args.ready_timeout
+        while time.time() < deadline and not httpx.get(f"{base}/health").json().get("ready"):
+            time.sleep(0.2)
+        load = asyncio.run(drive(base, texts, args.concurrency, args.texts_per_request, args.duration))
+        models = httpx.get(f"{base}/health").json().get("models", {})
+        batching = next(iter(models.values()), {}).get("batching", {})
+        row = {"max_batch": max_batch, **load, "mean_batch": batching.get("mean_batch"),
+               "model": next(iter(models), None)}
+        print(f"[embed_service] max_batch={max_batch:<4} texts/s={load['texts_per_s']:8} "
+              f"p50={load['latency_ms']['p50_ms']}ms p95={load['latency_ms']['p95_ms']}ms "
+              f"mean_batch={row['mean_batch']} errors={load['errors']}", flush=True)
+        return row
+    finally:
+        stop(proc)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Embedding service batching benchmark")
+    ap.add_argument("--max-batch", default="1,64", help="comma-separated EMBED_MAX_BATCH values")
+    ap.add_argument("--max-wait-ms", type=float, default=5.0)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--texts-per-request", type=int, default=1)
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--n", type=int, default=2000, help="corpus chunks to cycle through")
+    ap.add_argument("--max-chars", type=int, default=0, help="cut texts to this length (query-sized inputs)")
+    ap.add_argument("--model", default="", help="EMBED_MODEL for the service (default all-MiniLM-L6-v2)")
+    ap.add_argument("--ready-timeout", type=float, default=300.0)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    texts = corpus(args.n)
+    if not texts:
+        raise SystemExit("No chunks found in data/index")
+    if args.max_chars:
+        texts = [t[:args.max_chars] for t in texts]
+    rows = [run_one(int(b), args, texts) for b in args.max_batch.split(",") if b.strip()]
+    path = save_result("embed_service", {"args": vars(args), "runs": rows}, args.out)
+    print(f"[embed_service] saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+encoder.py
+
+Encoder backends of src/retriever/encoder.py side by side for one model:
+torch (sentence-transformers), onnx (ONNX Runtime fp32) and onnx-int8.
+
+Every backend runs in a fresh subprocess so its startup and memory are its own:
+    load_s        import + model load (ONNX export / int8 quantization is done
+                  beforehand by this script, so it is not counted)
+    rss_mb        resident memory after loading and encoding
+    texts_per_s   encode throughput over --n corpus chunks (--batch-size)
+    query_ms      one-question encode latency (docs/scope.md questions)
+
+Equivalence with the first backend listed (the reference):
+    cos_min / cos_mean   cosine between the two vectors of each chunk
+    max_abs              largest element-wise difference
+    neighbours@10        overlap of each chunk's 10 nearest chunks
+                         (1.0 = retrieval over this sample is unchanged)
+
+Run with:
+    .venv\\Scripts\\python.exe bench\\encoder.py --n 1000
+    python bench/encoder.py --model /models/all-MiniLM-L6-v2 --backends torch,onnx,onnx-int8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from common import BASE_DIR, latency_summary, save_result  # noqa: E402
+from load import scope_questions  # noqa: E402
+
+sys.path.insert(0, str(BASE_DIR))
+FALLBACK_QUESTIONS = ["termination notice period", "late payment penalty", "renewal terms", "indemnification"]
+
+
+def _backend(name: str):
+    """'onnx-int8' -> ('onnx', True)."""
+    backend, _, variant = name.partition("-")
+    return backend, variant == "int8"
+
+
+def corpus(n: int) -> List[str]:
+    idxd = BASE_DIR / "data" / "index"
+    if (idxd / "meta.parquet").exists():
+        import pandas as pd
+        texts = pd.read_parquet(idxd / "meta.parquet", columns=["text"])["text"].tolist()
+    else:
+        texts = [r["text"] for r in json.loads((idxd / "meta.json").read_text(encoding="utf-8"))["records"]]
+    return texts[:n]
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def worker(args) -> None:
+    """Child process: load one backend, encode, write vectors, print one JSON line."""
+    backend, int8 = _backend(args.worker)
+    payload = json.loads(Path(args.texts_file).read_text(encoding="utf-8"))
+    t0 = time.perf_counter()
+    from src.retriever.encoder import load_encoder
+    enc = load_encoder(args.model, backend, int8)
+    load_s = time.perf_counter() - t0
+
+    enc.encode(payload["texts"][:args.batch_size], batch_size=args.batch_size)  # warm-up
+    t0 = time.perf_counter()
+    vecs = enc.encode(payload["texts"], batch_size=args.batch_size, normalize_embeddings=True)
+    wall = time.perf_counter() - t0
+    lat = []
+    for q in payload["questions"]:
+        t = time.perf_counter()
+        enc.encode([q], normalize_embeddings=True)
+        lat.append((time.perf_counter() - t) * 1000)
+    np.save(args.vectors, vecs)
+    print(json.dumps({"backend": args.worker, "model_id": enc.model_id, "dim": enc.dim,
+                      "load_s": round(load_s, 3), "rss_mb": _rss_mb(),
+                      "texts_per_s": round(len(payload["texts"]) / wall, 1) if wall > 0 else None,
+                      "query_ms": latency_summary(lat)}))
+
+
+def neighbours(vecs: np.ndarray, k: int) -> np.ndarray:
+    sims = vecs @ vecs.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1)[:, :k]
+
+
+def compare(ref: np.ndarray, vecs: np.ndarray, k: int = 10) -> Dict:
+    cos = (ref * vecs).sum(axis=1)
+    k = min(k, len(ref) - 1)
+    overlap = None
+    if k > 0:
+        a, b = neighbours(ref, k), neighbours(vecs, k)
+        overlap = float(np.mean([len(set(x) & set(y)) / k for x, y in zip(a, b)]))
+    return {"cos_min": round(float(cos.min()), 6), "cos_mean": round(float(cos.mean()), 6),
+            "max_abs": float(np.abs(ref - vecs).max()), f"neighbours@{k}": round(overlap, 4) if overlap is not None else None}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Encoder backends: speed, memory and equivalence")
+    ap.add_argument("--model", default="all-MiniLM-L6-v2", help="model name or local sentence-transformers dir")
+    ap.add_argument("--backends", default="torch,onnx,onnx-int8", help="first one is the reference")
+    ap.add_argument("--n", type=int, default=1000, help="corpus chunks to encode")
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--texts-file", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--vectors", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.worker:
+        return worker(args)
+
+    from src.retriever.encoder import onnx_files
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    for b in backends:
+        backend, int8 = _backend(b)
+        if backend == "onnx":
+            onnx_files(args.model, int8)  # export / quantize outside the timed child
+
+    texts = corpus(args.n)
+    if not texts:
+        raise SystemExit("No chunks found in data/index (run api/ingest.py or src/retriever/indexer.py)")
+    rows, ref = [], None
+    with tempfile.TemporaryDirectory() as tmp:
+        texts_file = Path(tmp) / "texts.json"
+        texts_file.write_text(json.dumps({"texts": texts, "questions": scope_questions() or FALLBACK_QUESTIONS}),
+                              encoding="utf-8")
+        for b in backends:
+            vec_path = Path(tmp) / f"{b}.npy"
+            out = subprocess.run([sys.executable, __file__, "--worker", b, "--model", args.model,
+                                  "--batch-size", str(args.batch_size), "--texts-file", str(texts_file),
+                                  "--vectors", str(vec_path)],
+                                 cwd=str(BASE_DIR), env=dict(os.environ), capture_output=True, text=True)
+            if out.returncode != 0:
+                print(out.stderr[-2000:], file=sys.stderr)
+                raise SystemExit(f"backend {b} failed")
+            row = json.loads(out.stdout.strip().splitlines()[-1])
+            vecs = np.load(vec_path)
+            if ref is None:
+                ref = vecs
+            row["vs_" + backends[0]] = compare(ref, vecs)
+            rows.append(row)
+            print(f"[encoder] {b:10} load={row['load_s']}s rss={row['rss_mb']}MB "
+                  f"texts/s={row['texts_per_s']} query_p50={row['query_ms']['p50_ms']}ms "
+                  f"vs_{backends[0]}={row['vs_' + backends[0]]}", flush=True)
+
+    config = {"model": args.model, "n_texts": len(texts), "batch_size": args.batch_size, "backends": backends}
+    path = save_result("encoder", {"config": config, "results": rows}, args.out)
+    print(f"[encoder] saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+fake_upstream.py
+
+Offline stand-in for LM Studio / OpenAI (/v1/chat/completions) and Ollama
+(/api/generate) with configurable time-to-first-token, token rate, answer
+length and error rate. Supports streaming (SSE for OpenAI, NDJSON for Ollama).
+
+Run with:
+    python bench/fake_upstream.py --port 1234 --ttft-ms 200 --tokens 120 --tps 40
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+CFG = {"ttft_ms": 200.0, "tokens": 120, "tps": 40.0, "error_rate": 0.0, "answer_json": False}
+
+ANSWER_JSON = (
+    '{"verdict": "Tenant may terminate early with two months notice.", '
+    '"supporting_quotes": ["Tenant may terminate upon sixty days written notice."], '
+    '"citations": [{"doc_id": "lease_001.pdf", "page": 5, "clause_id": "termination"}], '
+    '"risk_level": "medium", "notes": "Early termination fee applies."}'
+)
+
+app = FastAPI(title="Fake LLM upstream")
+
+
+def _tokens(n: int):
+    if CFG["answer_json"]:
+        # split the canned JSON into ~n pieces so streaming parsers get partial objects
+        step = max(1, len(ANSWER_JSON) // max(1, n))
+        return [ANSWER_JSON[i:i + step] for i in range(0, len(ANSWER_JSON), step)]
+    return [f"tok{i} " for i in range(n)]
+
+
+def _prompt_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _fail() -> bool:
+    return CFG["error_rate"] > 0 and random.random() < CFG["error_rate"]
+
+
+async def _token_stream(pieces):
+    await asyncio.sleep(CFG["ttft_ms"] / 1000.0)
+    gap = 1.0 / CFG["tps"] if CFG["tps"] > 0 else 0.0
+    for i, p in enumerate(pieces):
+        if i and gap:
+            await asyncio.sleep(gap)
+        yield p
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if _fail():
+        return JSONResponse({"error": {"message": "fake upstream error"}}, status_code=500)
+    prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+    n = CFG["tokens"]
+    if body.get("max_tokens") and not CFG["answer_json"]:
+        n = min(n, int(body["max_tokens"]))
+    pieces = _tokens(n)
+    model = body.get("model", "fake")
+    usage = {"prompt_tokens": _prompt_tokens(prompt), "completion_tokens": len(pieces)}
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+    if body.get("stream"):
+        async def sse():
+            async for p in _token_stream(pieces):
+                chunk = {"id": "fake", "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": p}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            end = {"id": "fake", "object": "chat.completion.chunk", "model": model,
+                   "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            yield f"data: {json.dumps(end)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(sse(), media_type="text/event-stream")
+
+    text = "".join([p async for p in _token_stream(pieces)])
+    return {
+        "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    if _fail():
+        return JSONResponse({"error": "fake upstream error"}, status_code=500)
+    pieces = _tokens(CFG["tokens"])
+    model = body.get("model", "fake")
+    counts = {"prompt_eval_count": _prompt_tokens(body.get("prompt", "")), "eval_count": len(pieces)}
+
+    if body.get("stream", True):
+        async def ndjson():
+            async for p in _token_stream(pieces):
+                yield json.dumps({"model": model, "response": p, "done": False}) + "\n"
+            yield json.dumps({"model": model, "response": "", "done": True, **counts}) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    text = "".join([p async for p in _token_stream(pieces)])
+    return {"model": model, "response": text, "done": True, **counts}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", **CFG}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Fake OpenAI-compatible / Ollama upstream")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=1234)
+    ap.add_argument("--ttft-ms", type=float, default=CFG["ttft_ms"])
+    ap.add_argument("--tokens", type=int, default=CFG["tokens"])
+    ap.add_argument("--tps", type=float, default=CFG["tps"], help="tokens per second after the first")
+    ap.add_argument("--error-rate", type=float, default=CFG["error_rate"])
+    ap.add_argument("--answer-json", action="store_true", help="emit a contract_qa-style JSON answer")
+    args = ap.parse_args()
+    CFG.update(ttft_ms=args.ttft_ms, tokens=args.tokens, tps=args.tps,
+               error_rate=args.error_rate, answer_json=args.answer_json)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+latency.py
+
+End-to-end latency benchmark for the serving apps against a local fake
+upstream (bench/fake_upstream.py), so serving overhead can be measured
+separately from model speed. Everything runs offline on a CPU box.
+
+For each target the script starts the fake upstream and the app with uvicorn,
+fires --requests requests at --concurrency, and reports p50/p95/p99 latency,
+throughput, error rate and overhead above the configured upstream time.
+Results are saved to bench/results/latency-<git rev>-<timestamp>.json.
+
+Run with:
+    .venv\\Scripts\\python.exe bench\\latency.py --targets simple_backend,llm_server --concurrency 8
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from common import (free_port, latency_summary, save_result, start_script,  # noqa: E402
+                    start_uvicorn, stop, wait_port)
+
+CONTRACT = (
+    "SECTION 1. TERM. This Lease begins on January 1 and renews automatically for one-year terms "
+    "unless either party gives sixty (60) days written notice. "
+    "SECTION 2. EARLY TERMINATION. Tenant may terminate early upon payment of a fee equal to two months' rent. "
+    "SECTION 3. LIABILITY. Landlord's maximum liability shall not exceed the rent paid in the prior twelve months. "
+) * 20
+QUESTION = "Can I terminate early without penalty?"
+
+# name -> (uvicorn app, env builder(upstream base url), method, path, payload)
+TARGETS = {
+    "simple_backend": (
+        "simple_backend:app",
+        lambda up: {"LM_STUDIO_URL": up},
+        "/llm/ask-basic",
+        {"question": QUESTION, "contractText": CONTRACT},
+    ),
+    "llm_proxy": (
+        "llm_proxy:app",
+        lambda up: {"LMSTUDIO_BASE_URL": f"{up}/v1/chat/completions"},
+        "/llm/ask-basic",
+        {"question": QUESTION, "context": CONTRACT},
+    ),
+    "llm_server": (
+        "llm_server:app",
+        lambda up: {"LLM_API_BASE": f"{up}/v1"},
+        "/chat/contracts",
+        {"contract_text": CONTRACT, "question": QUESTION},
+    ),
+    "rag_api": (
+        "src.answerer.rag_api:app",
+        lambda up: {"OLLAMA_URL": up},
+        "/ask",
+        {"question": QUESTION, "top_k": 6},
+    ),
+}
+
+
+def _is_error(resp: httpx.Response) -> bool:
+    if resp.status_code >= 400:
+        return True
+    try:
+        body = resp.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("ok") is False
+
+
+async def drive(url: str, payload: dict, requests: int, concurrency: int, warmup: int,
+                timeout: float) -> Dict:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        for _ in range(warmup):
+            try:
+                await client.post(url, json=payload)
+            except httpx.HTTPError:
+                pass
+
+        async def one():
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.post(url, json=payload)
+                    failed = _is_error(resp)
+                    key = f"http_{resp.status_code}" if failed else None
+                except httpx.HTTPError as e:
+                    failed, key = True, type(e).__name__
+                dt = (time.perf_counter() - t0) * 1000.0
+                if failed:
+                    errors[key] = errors.get(key, 0) + 1
+                else:
+                    latencies.append(dt)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        wall = time.perf_counter() - t0
+
+    n_err = sum(errors.values())
+    return {
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "error_rate": round(n_err / requests, 4) if requests else 0.0,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall > 0 else None,
+        **latency_summary(latencies),
+        "_latencies": latencies,
+    }
+
+
+def run_target(name: str, args, upstream: str, upstream_floor_ms: float) -> Dict:
+    app, env_for, path, payload = TARGETS[name]
+    port = free_port()
+    proc = start_uvicorn(app, port, env_for(upstream))
+    try:
+        if not wait_port(port, timeout=args.startup_timeout, proc=proc):
+            return {"target": name, "error": "app did not start (missing deps or index?)"}
+        res = asyncio.run(drive(f"http://127.0.0.1:{port}{path}", payload, args.requests,
+                                args.concurrency, args.warmup, args.timeout))
+    finally:
+        stop(proc)
+    lat = res.pop("_latencies")
+    overhead = [v - upstream_floor_ms for v in lat]
+    res["overhead_p50_ms"] = latency_summary(overhead)["p50_ms"]
+    res["overhead_p99_ms"] = latency_summary(overhead)["p99_ms"]
+    return {"target": name, "path": path, **res}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Latency benchmark against a fake upstream")
+    ap.add_argument("--targets", default="simple_backend,llm_proxy,llm_server,rag_api")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--warmup", type=int, default=5)
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--startup-timeout", type=float, default=120.0)
+    ap.add_argument("--ttft-ms", type=float, default=200.0)
+    ap.add_argument("--tokens", type=int, default=64)
+    ap.add_argument("--tps", type=float, default=200.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--out", default=None, help="result file (default bench/results/...)")
+    args = ap.parse_args()
+
+    names = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = [t for t in names if t not in TARGETS]
+    if unknown:
+        raise SystemExit(f"Unknown targets: {unknown}. Choose from {sorted(TARGETS)}")
+
+    up_port = free_port()
+    upstream = f"http://127.0.0.1:{up_port}"
+    up_proc = start_script("bench/fake_upstream.py", [
+        "--port", str(up_port), "--ttft-ms", str(args.ttft_ms), "--tokens", str(args.tokens),
+        "--tps", str(args.tps), "--error-rate", str(args.error_rate)])
+    # time the fake upstream itself spends per (non-streamed) answer
+    floor_ms = args.ttft_ms + max(0, args.tokens - 1) * (1000.0 / args.tps if args.tps > 0 else 0.0)
+
+    results = []
+    try:
+        if not wait_port(up_port, proc=up_proc):
+            raise SystemExit("fake upstream did not start")
+        for name in names:
+            print(f"[bench] {name} ...", flush=True)
+            r = run_target(name, args, upstream, floor_ms)
+            results.append(r)
+            if "error" in r:
+                print(f"[bench] {name}: {r['error']}")
+            else:
+                print(f"[bench] {name}: p50={r['p50_ms']}ms p95={r['p95_ms']}ms p99={r['p99_ms']}ms "
+                      f"rps={r['throughput_rps']} errors={r['error_rate']:.2%} "
+                      f"overhead_p50={r['overhead_p50_ms']}ms")
+    finally:
+        stop(up_proc)
+
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    config["upstream_floor_ms"] = round(floor_ms, 2)
+    path = save_result("latency", {"config": config, "results": results}, args.out)
+    print(f"[bench] saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+load.py
+
+Concurrency sweep / saturation test for the serving apps. Replays a question
+mix against one endpoint with N closed-loop clients for --duration seconds,
+then doubles N (or walks --steps) until p99 latency or the error rate crosses
+a threshold. The last step below the thresholds is reported as the knee.
+
+Per step it reports throughput, client-side latency percentiles, error rate,
+and what the server's /metrics (src/serving/metrics.py) saw over the same
+window: server-side mean latency for the route, mean per-stage time
+(encode, search, upstream_ttft, upstream, ...), requests/upstream calls in
+flight (the queue), and client-minus-server time (time spent waiting before
+the app's middleware even saw the request).
+
+Question mix: the canonical questions in docs/scope.md, plus --questions
+files (JSONL rows with "question" and optional "contract_text", e.g.
+eval gold.jsonl or captured traffic, or plain text with one question per line).
+
+By default the app and bench/fake_upstream.py are started locally, so the
+sweep runs fully offline; --base-url points it at an already running server
+instead (no fake upstream, nothing started).
+Results are saved to bench/results/load-<git rev>-<timestamp>.json.
+
+Run with:
+    .venv\\Scripts\\python.exe bench\\load.py --target simple_backend --steps 1,2,4,8,16,32 --duration 15
+    .venv\\Scripts\\python.exe bench\\load.py --target api_rag_search --base-url http://10.0.0.5:8000
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from common import (BASE_DIR, free_port, latency_summary, metric_sum,  # noqa: E402
+                    parse_prometheus, save_result, start_script, start_uvicorn, stop, wait_port)
+from latency import CONTRACT, _is_error  # noqa: E402
+
+SCOPE = BASE_DIR / "docs" / "scope.md"
+
+# name -> (uvicorn app, env builder(upstream base url), path, request builder(question, contract))
+TARGETS = {
+    "simple_backend": (
+        "simple_backend:app",
+        lambda up: {"LM_STUDIO_URL": up},
+        "/llm/ask-basic",
+        lambda q, c: {"json": {"question": q, "contractText": c}},
+    ),
+    "llm_server": (
+        "llm_server:app",
+        lambda up: {"LLM_API_BASE": f"{up}/v1"},
+        "/chat/contracts",
+        lambda q, c: {"json": {"contract_text": c, "question": q}},
+    ),
+    "api_rag_search": (
+        "api.rag_api:app",
+        lambda up: {},
+        "/search",
+        lambda q, c: {"params": {"question": q, "k": 5}},
+    ),
+    "api_rag_ask": (
+        "api.rag_api:app",
+        lambda up: {},
+        "/ask",
+        lambda q, c: {"params": {"question": q, "top_k": 12, "return_k": 5}},
+    ),
+    "rag_api": (
+        "src.answerer.rag_api:app",
+        lambda up: {"OLLAMA_URL": up},
+        "/ask",
+        lambda q, c: {"json": {"question": q, "top_k": 6}},
+    ),
+}
+
+
+def scope_questions(path: Path = SCOPE) -> List[str]:
+    if not path.exists():
+        return []
+    lines = path.read_text(encoding="utf-8-sig").splitlines()
+    return [l[2:].strip() for l in lines if l.startswith("- ") and l.rstrip().endswith("?")]
+
+
+def load_mix(files: List[str]) -> List[Dict[str, str]]:
+    mix = [{"question": q} for q in scope_questions()]
+    for f in files:
+        for line in Path(f).read_text(encoding="utf-8-sig").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                row = json.loads(line)
+                if row.get("question"):
+                    mix.append({"question": row["question"],
+                                "contract_text": row.get("contract_text") or row.get("contractText")})
+            else:
+                mix.append({"question": line})
+    return mix
+
+
+def wait_ready(base: str, timeout: float) -> bool:
+    """Wait for GET /ready (src/serving/readiness.py); apps without it count as ready."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            r = httpx.get(f"{base}/ready", timeout=5)
+            if r.status_code != 503:
+                return True
+            if r.json().get("status") == "failed":
+                return False
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+async def scrape(client: httpx.AsyncClient, base: str):
+    try:
+        r = await client.get(f"{base}/metrics")
+        if r.status_code == 200:
+            return parse_prometheus(r.text)
+    except httpx.HTTPError:
+        pass
+    return None
+
+
+def server_window(before, after, gauges: List[Dict[str, float]], path: str) -> Dict:
+    """Deltas of the server's counters/histograms over one step."""
+    if before is None or after is None:
+        return {"metrics": False}
+
+    def delta(name, **match):
+        return metric_sum(after, name, **match) - metric_sum(before, name, **match)
+
+    out = {"metrics": True}
+    n = delta("contracts_request_seconds_count", route=path)
+    out["server_requests"] = int(n)
+    out["server_mean_ms"] = round(delta("contracts_request_seconds_sum", route=path) / n * 1000, 2) if n else None
+    stages = sorted({l["stage"] for name, l, _ in after if name == "contracts_stage_seconds_count"})
+    out["stages_mean_ms"] = {}
+    for st in stages:
+        c = delta("contracts_stage_seconds_count", stage=st)
+        if c:
+            out["stages_mean_ms"][st] = round(delta("contracts_stage_seconds_sum", stage=st) / c * 1000, 2)
+    for key in ("in_flight", "upstream_in_flight"):
+        vals = [g[key] for g in gauges if key in g]
+        out[f"{key}_mean"] = round(sum(vals) / len(vals), 2) if vals else None
+        out[f"{key}_max"] = max(vals) if vals else None
+    errs = {l.get("kind", ""): v for name, l, v in after if name == "contracts_upstream_errors_total"}
+    prev = {l.get("kind", ""): v for name, l, v in before if name == "contracts_upstream_errors_total"}
+    out["upstream_errors"] = {k: int(v - prev.get(k, 0)) for k, v in errs.items() if v - prev.get(k, 0)}
+    return out
+
+
+async def run_step(base: str, path: str, build, mix, concurrency: int, duration: float,
+                   timeout: float, scrape_interval: float, rng: random.Random) -> Dict:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    gauges: List[Dict[str, float]] = []
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        before = await scrape(client, base)
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                item = rng.choice(mix)
+                req = build(item["question"], item.get("contract_text") or CONTRACT)
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.post(f"{base}{path}", **req)
+                    failed = _is_error(resp)
+                    key = f"http_{resp.status_code}" if failed else None
+                except httpx.HTTPError as e:
+                    failed, key = True, type(e).__name__
+                dt = (time.perf_counter() - t0) * 1000.0
+                if failed:
+                    errors[key] = errors.get(key, 0) + 1
+                else:
+                    latencies.append(dt)
+
+        async def sampler():
+            while time.perf_counter() < deadline:
+                await asyncio.sleep(scrape_interval)
+                s = await scrape(client, base)
+                if s is not None:
+                    # the scrape itself is one of the in-flight requests
+                    gauges.append({"in_flight": metric_sum(s, "contracts_requests_in_flight") - 1,
+                                   "upstream_in_flight": metric_sum(s, "contracts_upstream_in_flight")})
+
+        t0 = time.perf_counter()
+        await asyncio.gather(sampler(), *(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+        after = await scrape(client, base)
+
+    total = len(latencies) + sum(errors.values())
+    res = {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall > 0 else None,
+        **latency_summary(latencies),
+    }
+    srv = server_window(before, after, gauges, path)
+    if srv.get("server_mean_ms") is not None and res["mean_ms"] is not None:
+        srv["client_minus_server_ms"] = round(res["mean_ms"] - srv["server_mean_ms"], 2)
+    res["server"] = srv
+    return res
+
+
+def breach(step: Dict, baseline: Optional[Dict], args) -> Optional[str]:
+    if step["error_rate"] > args.max_error_rate:
+        return f"error_rate {step['error_rate']:.2%} > {args.max_error_rate:.2%}"
+    p99 = step["p99_ms"]
+    if p99 is None:
+        return "no successful requests"
+    if args.p99_ms and p99 > args.p99_ms:
+        return f"p99 {p99}ms > {args.p99_ms}ms"
+    if args.p99_factor and baseline and baseline["p99_ms"] and p99 > args.p99_factor * baseline["p99_ms"]:
+        return f"p99 {p99}ms > {args.p99_factor}x baseline {baseline['p99_ms']}ms"
+    return None
+
+
+def concurrency_steps(args) -> List[int]:
+    if args.steps:
+        return [int(s) for s in args.steps.split(",") if s.strip()]
+    out, c = [], max(1, args.start)
+    while c <= args.max_concurrency:
+        out.append(c)
+        c = max(c + 1, int(c * args.factor))
+    return out
+
+
+async def sweep(base: str, path: str, build, mix, args) -> Dict:
+    rng = random.Random(args.seed)
+    steps: List[Dict] = []
+    knee, reason, baseline = None, None, None
+    for c in concurrency_steps(args):
+        res = await run_step(base, path, build, mix, c, args.duration, args.timeout, args.scrape_interval, rng)
+        why = breach(res, baseline, args)
+        res["breach"] = why
+        steps.append(res)
+        srv = res["server"]
+        print(f"[load] c={c:<4} rps={res['throughput_rps']} p50={res['p50_ms']}ms p99={res['p99_ms']}ms "
+              f"err={res['error_rate']:.2%} in_flight_max={srv.get('in_flight_max')} "
+              f"server_mean={srv.get('server_mean_ms')}ms" + (f"  <-- {why}" if why else ""), flush=True)
+        if why:
+            reason = why
+            break
+        baseline = baseline or res
+        knee = c
+        if args.cooldown:
+            await asyncio.sleep(args.cooldown)
+    best = max((s for s in steps if not s["breach"]), key=lambda s: s["throughput_rps"] or 0, default=None)
+    return {
+        "steps": steps,
+        "knee_concurrency": knee,
+        "knee_reason": reason,
+        "max_good_throughput_rps": best["throughput_rps"] if best else None,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Concurrency sweep with saturation (knee) detection")
+    ap.add_argument("--target", default="simple_backend", choices=sorted(TARGETS))
+    ap.add_argument("--base-url", default=None, help="use a running server instead of starting one")
+    ap.add_argument("--questions", action="append", default=[],
+                    help="extra question mix (JSONL with question/contract_text, or one question per line)")
+    ap.add_argument("--steps", default=None, help="explicit concurrency steps, e.g. 1,2,4,8,16")
+    ap.add_argument("--start", type=int, default=1)
+    ap.add_argument("--factor", type=float, default=2.0)
+    ap.add_argument("--max-concurrency", type=int, default=256)
+    ap.add_argument("--duration", type=float, default=15.0, help="seconds per step")
+    ap.add_argument("--cooldown", type=float, default=1.0)
+    ap.add_argument("--p99-ms", type=float, default=0.0, help="absolute p99 threshold (0 = off)")
+    ap.add_argument("--p99-factor", type=float, default=4.0,
+                    help="p99 threshold relative to the first step's p99 (0 = off)")
+    ap.add_argument("--max-error-rate", type=float, default=0.01)
+    ap.add_argument("--scrape-interval", type=float, default=1.0)
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--startup-timeout", type=float, default=120.0)
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting the app")
+    ap.add_argument("--ttft-ms", type=float, default=200.0)
+    ap.add_argument("--tokens", type=int, default=64)
+    ap.add_argument("--tps", type=float, default=200.0)
+    ap.add_argument("--upstream-error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="result file (default bench/results/...)")
+    args = ap.parse_args()
+
+    mix = load_mix(args.questions)
+    if not mix:
+        raise SystemExit("empty question mix (docs/scope.md missing and no --questions)")
+    app, env_for, path, build = TARGETS[args.target]
+
+    procs = []
+    try:
+        if args.base_url:
+            base = args.base_url.rstrip("/")
+        else:
+            up_port = free_port()
+            up_proc = start_script("bench/fake_upstream.py", [
+                "--port", str(up_port), "--ttft-ms", str(args.ttft_ms), "--tokens", str(args.tokens),
+                "--tps", str(args.tps), "--error-rate", str(args.upstream_error_rate)])
+            procs.append(up_proc)
+            if not wait_port(up_port, proc=up_proc):
+                raise SystemExit("fake upstream did not start")
+            port = free_port()
+            proc = start_uvicorn(app, port, env_for(f"http://127.0.0.1:{up_port}"), workers=args.workers)
+            procs.append(proc)
+            if not wait_port(port, timeout=args.startup_timeout, proc=proc):
+                raise SystemExit(f"{args.target} did not start (missing deps or index?)")
+            base = f"http://127.0.0.1:{port}"
+        if not wait_ready(base, args.startup_timeout):
+            raise SystemExit(f"{args.target} is not ready (see GET {base}/ready)")
+        print(f"[load] {args.target} {base}{path}  mix={len(mix)} questions", flush=True)
+        result = asyncio.run(sweep(base, path, build, mix, args))
+    finally:
+        for p in reversed(procs):
+            stop(p)
+
+    print(f"[load] knee: concurrency={result['knee_concurrency']} "
+          f"max_good_rps={result['max_good_throughput_rps']} ({result['knee_reason'] or 'no threshold crossed'})")
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    config["path"] = path
+    config["mix_size"] = len(mix)
+    out = save_result("load", {"config": config, **result}, args.out)
+    print(f"[load] saved {out}")
+
+
+if __name__ == "__main__":
+    main()
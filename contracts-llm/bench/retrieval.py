@@ -0,0 +1,207 @@
+"""
+retrieval.py
+
+Retrieval quality and speed benchmark for the two vector indexes:
+
+  parquet  data/index/faiss.index + meta.parquet  (api/ingest.py -> api/rag_api.py)
+  records  data/index/faiss.index + meta.json     (src/retriever/indexer.py -> src/answerer/rag_api.py)
+
+Reads a labelled set (JSONL), one object per line:
+    {"question": "...", "relevant_ids": ["<id>", ...], "relevant_contains": ["phrase", ...]}
+A hit counts as relevant if its id is listed or its text contains one of the
+phrases (case-insensitive). Ids are "<owner>#<row>" for the parquet index and
+"<doc_id>#<clause_id>#<n>" (or the record's own "id") for the records index.
+
+Reports recall@k, MRR, nDCG@k and QPS, with encode / search / metadata
+assembly timed separately, for every combination of --top-k, --return-k and
+--index-types. Results are saved to bench/results/retrieval-<rev>-<ts>.json.
+
+Run with:
+    .venv\\Scripts\\python.exe bench\\retrieval.py --labels eval\\datasets\\retrieval.jsonl --which parquet --top-k 6,12,24 --return-k 5
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from common import BASE_DIR, latency_summary, save_result  # noqa: E402
+
+IDXD = BASE_DIR / "data" / "index"
+
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def load_labels(path: Path) -> List[Dict]:
+    items = []
+    with path.open("r", encoding="utf-8-sig") as f:
+        for line in f:
+            if line.strip():
+                items.append(json.loads(line))
+    return items
+
+
+def load_parquet_index():
+    import faiss
+    import pandas as pd
+    index = faiss.read_index(str(IDXD / "faiss.index"))
+    meta = pd.read_parquet(IDXD / "meta.parquet")
+    ids = [f"{o}#{i}" for i, o in enumerate(meta["owner"].tolist())]
+    texts = meta["text"].tolist()
+
+    def assemble(I, D):
+        rows = meta.iloc[I].copy()
+        rows = rows.assign(score=D)
+        return rows.to_dict(orient="records")
+    return index, None, ids, texts, assemble
+
+
+def load_records_index():
+    import faiss
+    index = faiss.read_index(str(IDXD / "faiss.index"))
+    meta = json.loads((IDXD / "meta.json").read_text(encoding="utf-8"))
+    recs = meta["records"]
+    ids = [r.get("id") or f"{r.get('doc_id')}#{r.get('clause_id')}#{i}" for i, r in enumerate(recs)]
+    texts = [r.get("text", "") for r in recs]
+
+    def assemble(I, D):
+        return [{**recs[i], "score": float(d)} for i, d in zip(I, D) if 0 <= i < len(recs)]
+    return index, meta.get("model"), ids, texts, assemble
+
+
+def build_variant(base, kind: str):
+    """Rebuild the flat index as another faiss type from its stored vectors."""
+    import faiss
+    if kind == "flat":
+        return base
+    xb = base.reconstruct_n(0, base.ntotal)
+    d = xb.shape[1]
+    if kind.startswith("hnsw"):
+        idx = faiss.IndexHNSWFlat(d, int(kind[4:] or 32), faiss.METRIC_INNER_PRODUCT)
+    elif kind.startswith("ivf"):
+        nlist = int(kind[3:] or max(1, int(math.sqrt(base.ntotal))))
+        quant = faiss.IndexFlatIP(d)
+        idx = faiss.IndexIVFFlat(quant, d, nlist, faiss.METRIC_INNER_PRODUCT)
+        idx.train(xb)
+        idx.nprobe = max(1, nlist // 8)
+    else:
+        raise SystemExit(f"Unknown index type {kind}")
+    idx.add(xb)
+    return idx
+
+
+def relevant_flags(item: Dict, hit_rows: List[int], ids: List[str], texts: List[str]) -> List[int]:
+    rel_ids = set(item.get("relevant_ids") or [])
+    phrases = [p.lower() for p in item.get("relevant_contains") or []]
+    flags = []
+    for r in hit_rows:
+        ok = 0 <= r < len(ids) and (ids[r] in rel_ids or any(p in texts[r].lower() for p in phrases))
+        flags.append(1 if ok else 0)
+    return flags
+
+
+def n_relevant(item: Dict, ids: List[str], texts: List[str]) -> int:
+    rel_ids = set(item.get("relevant_ids") or [])
+    phrases = [p.lower() for p in item.get("relevant_contains") or []]
+    if not phrases:
+        return len(rel_ids)
+    return sum(1 for i, t in zip(ids, texts) if i in rel_ids or any(p in t.lower() for p in phrases))
+
+
+def score(flags: List[int], total_rel: int) -> Dict[str, float]:
+    found = sum(flags)
+    recall = found / total_rel if total_rel else 0.0
+    rr = next((1.0 / (i + 1) for i, f in enumerate(flags) if f), 0.0)
+    dcg = sum(f / math.log2(i + 2) for i, f in enumerate(flags))
+    ideal = sum(1.0 / math.log2(i + 2) for i in range(min(total_rel, len(flags))))
+    return {"recall": recall, "mrr": rr, "ndcg": dcg / ideal if ideal else 0.0}
+
+
+def run_config(model, index, ids, texts, assemble, labels, top_k: int, return_k: int) -> Dict:
+    t_enc, t_search, t_meta = [], [], []
+    totals = {"recall": 0.0, "mrr": 0.0, "ndcg": 0.0}
+    t_all = time.perf_counter()
+    for item in labels:
+        t0 = time.perf_counter()
+        q = model.encode([item["question"]], normalize_embeddings=True)
+        t1 = time.perf_counter()
+        D, I = index.search(np.asarray(q, dtype="float32"), top_k)
+        t2 = time.perf_counter()
+        assemble(I[0][:return_k], D[0][:return_k])
+        t3 = time.perf_counter()
+        t_enc.append((t1 - t0) * 1000)
+        t_search.append((t2 - t1) * 1000)
+        t_meta.append((t3 - t2) * 1000)
+        flags = relevant_flags(item, [int(i) for i in I[0][:return_k]], ids, texts)
+        for k, v in score(flags, item["_n_rel"]).items():
+            totals[k] += v
+    wall = time.perf_counter() - t_all
+    n = len(labels) or 1
+    return {
+        "top_k": top_k, "return_k": return_k,
+        f"recall@{return_k}": round(totals["recall"] / n, 4),
+        "mrr": round(totals["mrr"] / n, 4),
+        f"ndcg@{return_k}": round(totals["ndcg"] / n, 4),
+        "qps": round(len(labels) / wall, 2) if wall > 0 else None,
+        "encode": latency_summary(t_enc),
+        "search": latency_summary(t_search),
+        "assemble": latency_summary(t_meta),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Retrieval quality/speed benchmark")
+    ap.add_argument("--labels", default=str(BASE_DIR / "eval" / "datasets" / "retrieval.jsonl"))
+    ap.add_argument("--which", default="parquet", choices=["parquet", "records"])
+    ap.add_argument("--top-k", default="12")
+    ap.add_argument("--return-k", default="5")
+    ap.add_argument("--index-types", default="flat", help="comma list: flat,hnsw32,ivf64")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    labels_path = Path(args.labels)
+    if not labels_path.exists():
+        raise SystemExit(f"Labelled set not found: {labels_path}")
+    labels = load_labels(labels_path)
+
+    base, model_name, ids, texts, assemble = (load_parquet_index() if args.which == "parquet"
+                                              else load_records_index())
+    for item in labels:
+        item["_n_rel"] = n_relevant(item, ids, texts)
+    sys.path.insert(0, str(BASE_DIR))
+    from src.retriever.encoder import load_encoder
+    model = load_encoder(model_name)  # ENCODER_BACKEND / ENCODER_INT8
+    model.encode(["warm-up"], normalize_embeddings=True)
+
+    results = []
+    for kind in [k.strip() for k in args.index_types.split(",") if k.strip()]:
+        t0 = time.perf_counter()
+        index = build_variant(base, kind)
+        build_s = round(time.perf_counter() - t0, 3)
+        for top_k in _ints(args.top_k):
+            for return_k in _ints(args.return_k):
+                if return_k > top_k:
+                    continue
+                r = run_config(model, index, ids, texts, assemble, labels, top_k, return_k)
+                r.update(index_type=kind, build_s=build_s)
+                results.append(r)
+                print(f"[retrieval] {kind} top_k={top_k} return_k={return_k} "
+                      f"recall={r[f'recall@{return_k}']} mrr={r['mrr']} ndcg={r[f'ndcg@{return_k}']} "
+                      f"qps={r['qps']} enc_p50={r['encode']['p50_ms']}ms "
+                      f"search_p50={r['search']['p50_ms']}ms meta_p50={r['assemble']['p50_ms']}ms")
+
+    config = {"which": args.which, "model": model.model_name, "encoder": f"{model.backend}:{model.model_id}",
+              "labels": str(labels_path), "n_questions": len(labels), "n_chunks": len(ids)}
+    path = save_result("retrieval", {"config": config, "results": results}, args.out)
+    print(f"[retrieval] saved {path}")
+
+
+if __name__ == "__main__":
+    main()
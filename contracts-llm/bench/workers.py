@@ -0,0 +1,156 @@
+"""
+workers.py
+
+Per-worker memory overhead and throughput of api/rag_api.py with N uvicorn
+workers, memory-mapped index/metadata (RAG_MMAP=1) versus private copies
+(RAG_MMAP=0).
+
+For each (mode, N) it starts `uvicorn api.rag_api:app --workers N`, waits
+until every worker reports ready on /health, sends one /search per worker so
+each loads its embedding model, then runs closed-loop /search traffic
+(--concurrency, default 2 per worker) for --duration seconds. Memory is read
+from /proc/<pid>/smaps_rollup of every worker (Linux only):
+    rss      resident pages, shared ones counted in full in every worker
+    pss      shared pages split between the processes mapping them;
+             summed over workers this is the RAM the pool really uses
+    private  pages only this worker has (model weights, Python heap, ...)
+The summary's overhead_mb is the marginal pss per extra worker.
+
+Run with:
+    .venv\\Scripts\\python.exe bench\\workers.py --workers 1,2,4 --duration 10
+    python bench/workers.py --workers 1,2,4 --modes mmap --index-dir /data/big_index
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from common import free_port, latency_summary, save_result, start_uvicorn, stop, wait_port  # noqa: E402
+from load import scope_questions  # noqa: E402
+
+FALLBACK_QUESTIONS = ["termination notice period", "late payment penalty", "renewal terms", "indemnification"]
+
+
+def smaps(pid: int) -> Optional[Dict[str, float]]:
+    vals = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    vals[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return None
+    mb = lambda *keys: round(sum(vals.get(k, 0) for k in keys) / 1024, 1)  # noqa: E731
+    return {"rss_mb": mb("Rss"), "pss_mb": mb("Pss"), "private_mb": mb("Private_Clean", "Private_Dirty")}
+
+
+def worker_pids(base: str, n: int, timeout: float) -> List[int]:
+    """Poll /health until n distinct ready worker pids have answered."""
+    pids, deadline = set(), time.time() + timeout
+    with httpx.Client(timeout=5) as client:
+        while len(pids) < n and time.time() < deadline:
+            try:
+                h = client.get(f"{base}/health", headers={"Connection": "close"}).json()
+                if h.get("ready"):
+                    pids.add(h["pid"])
+                elif h.get("status") == "failed":
+                    raise SystemExit("a worker failed to load the index (see its /ready)")
+            except (httpx.HTTPError, ValueError):
+                pass
+            time.sleep(0.05)
+    return sorted(pids)
+
+
+async def drive(base: str, questions: List[str], concurrency: int, duration: float) -> Dict:
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+    rng = random.Random(0)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+
+        async def loop():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                t = time.perf_counter()
+                try:
+                    r = await client.post(f"{base}/search", params={"question": rng.choice(questions), "k": 5})
+                    if r.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - t) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+    return {"requests": len(latencies), "errors": errors, "rps": round(len(latencies) / wall, 1),
+            "latency_ms": latency_summary(latencies)}
+
+
+def run_one(mode: str, n: int, args, questions: List[str]) -> Dict:
+    port = free_port()
+    env = {"RAG_WORKERS": str(n), "RAG_MMAP": "1" if mode == "mmap" else "0"}
+    if args.index_dir:
+        env["RAG_INDEX_DIR"] = args.index_dir
+    proc = start_uvicorn("api.rag_api:app", port, env=env, workers=n)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        if not wait_port(port, timeout=60, proc=proc):
+            raise SystemExit("api/rag_api did not start")
+        pids = worker_pids(base, n, args.ready_timeout)
+        # one query per connection so every worker loads its model before measuring
+        with httpx.Client(timeout=120) as client:
+            for _ in range(n * 4):
+                client.post(f"{base}/search", params={"question": questions[0], "k": 1},
+                            headers={"Connection": "close"})
+        load = asyncio.run(drive(base, questions, args.concurrency or 2 * n, args.duration))
+        mem = {pid: smaps(pid) for pid in pids}
+        known = [m for m in mem.values() if m]
+        total = {k: round(sum(m[k] for m in known), 1) for k in ("rss_mb", "pss_mb", "private_mb")} if known else None
+        row = {"mode": mode, "workers": n, "ready_workers": len(pids), **load,
+               "memory_total": total, "memory_per_worker": mem}
+        print(f"{mode:6} workers={n} rps={load['rps']:8} p50={load['latency_ms'].get('p50_ms')}ms "
+              f"errors={load['errors']} pss_total={total and total['pss_mb']}MB "
+              f"private_total={total and total['private_mb']}MB", flush=True)
+        return row
+    finally:
+        stop(proc)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="api/rag_api.py multi-worker memory / throughput")
+    ap.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    ap.add_argument("--modes", default="mmap,copy", help="mmap and/or copy (RAG_MMAP=0)")
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--concurrency", type=int, default=0, help="clients (default 2 per worker)")
+    ap.add_argument("--index-dir", default="", help="RAG_INDEX_DIR for the server (default data/index)")
+    ap.add_argument("--ready-timeout", type=float, default=300.0)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    questions = scope_questions() or FALLBACK_QUESTIONS
+    rows = [run_one(mode, int(n), args, questions)
+            for mode in args.modes.split(",") for n in args.workers.split(",")]
+
+    summary = {}
+    for mode in {r["mode"] for r in rows}:
+        mine = sorted((r for r in rows if r["mode"] == mode and r["memory_total"]), key=lambda r: r["workers"])
+        if len(mine) >= 2:
+            a, b = mine[0], mine[-1]
+            extra = b["workers"] - a["workers"]
+            summary[mode] = {"overhead_mb": round((b["memory_total"]["pss_mb"] - a["memory_total"]["pss_mb"]) / extra, 1),
+                             "rps_scaling": round(b["rps"] / a["rps"], 2) if a["rps"] else None}
+    print("per extra worker:", summary)
+    path = save_result("workers", {"args": vars(args), "runs": rows, "summary": summary}, args.out)
+    print(f"saved {path}")
+
+
+if __name__ == "__main__":
+    main()
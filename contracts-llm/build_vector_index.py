@@ -2,7 +2,7 @@
 build_vector_index.py
 
 Loads processed policy JSON files from data/policies_processed/,
-computes embeddings for each chunk using sentence-transformers,
+computes embeddings for each chunk (src/retriever/encoder.py, ENCODER_BACKEND),
 and saves them in data/vector_index/ for later retrieval.
 
 Run with:
@@ -14,7 +14,9 @@ from pathlib import Path
 from typing import List, Dict, Any
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from src.retriever.embed_cache import get_cache
+from src.retriever.encoder import EMBED_MODEL, load_encoder, model_id
 
 BASE_DIR = Path(__file__).resolve().parent
 PROCESSED_DIR = BASE_DIR / "data" / "policies_processed"
@@ -23,7 +25,7 @@ INDEX_DIR = BASE_DIR / "data" / "vector_index"
 INDEX_FILE = INDEX_DIR / "policy_chunks_index.npz"
 META_FILE = INDEX_DIR / "policy_chunks_meta.json"
 
-MODEL_NAME = "all-MiniLM-L6-v2"
+MODEL_NAME = EMBED_MODEL
 
 
 def load_chunks() -> List[Dict[str, Any]]:
@@ -58,17 +60,21 @@ def main() -> None:
         return
 
     print(f"[INFO] Loaded {len(items)} chunks from processed policies.")
-    print(f"[INFO] Loading embedding model '{MODEL_NAME}' ...")
-    model = SentenceTransformer(MODEL_NAME)
+
+    def load_model():
+        print(f"[INFO] Loading embedding model '{MODEL_NAME}' ...")
+        return load_encoder(MODEL_NAME)
 
     texts = [item["text"] for item in items]
-    print("[INFO] Computing embeddings...")
-    embeddings = model.encode(
+    print("[INFO] Computing embeddings (cached by chunk text)...")
+    cache = get_cache(model_id(MODEL_NAME))
+    embeddings = cache.encode(
         texts,
+        load_model,
         batch_size=32,
         show_progress_bar=True,
-        convert_to_numpy=True,
     )
+    print(f"[INFO] Embedding cache: {cache.last_hits} hits, {cache.last_misses} encoded.")
 
     np.savez_compressed(INDEX_FILE, embeddings=embeddings)
     with META_FILE.open("w", encoding="utf-8") as f:
@@ -5,33 +5,49 @@ from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
 DATA = ROOT/'datasets'
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+# same nearest-rank percentile as the bench/ scripts
+from bench.common import percentile  # noqa: E402
+
+def score(gold, pred):
+    """VerdictAccuracy / HasCitation (+ latency percentiles over non-cached rows carrying latency_ms)."""
+    n = min(len(gold), len(pred))
+    ok = 0; cited = 0
+    for i in range(n):
+        gv = (gold[i].get('answer') or {}).get('verdict')
+        pv = (pred[i].get('answer') or {}).get('verdict')
+        if gv and pv and gv.strip().lower()==pv.strip().lower():
+            ok += 1
+        # count citation presence
+        cites = (pred[i].get('answer') or {}).get('citations',[])
+        if cites: cited += 1
+    res = {"N": n, "VerdictAccuracy": ok/n if n else 0, "HasCitation": cited/n if n else 0}
+    lat = [p['latency_ms'] for p in pred[:n]
+           if isinstance(p.get('latency_ms'), (int, float)) and not p.get('cached')]
+    if lat:
+        res.update(LatencyP50=percentile(lat, 50), LatencyP95=percentile(lat, 95), LatencyMax=max(lat))
+    return res
+
+def format_result(res):
+    out = f"[eval] N={res['N']}  VerdictAccuracy={res['VerdictAccuracy']:.3f}  HasCitation={res['HasCitation']:.3f}"
+    if 'LatencyP50' in res:
+        out += f"  LatencyP50={res['LatencyP50']:.0f}ms  LatencyP95={res['LatencyP95']:.0f}ms"
+    return out
 
 def main():
-    gold = []
-    pred = []
     # Expect two files for quick test: gold.jsonl and pred.jsonl (same order)
     g = DATA/'gold.jsonl'
     p = DATA/'pred.jsonl'
     if not g.exists() or not p.exists():
-        print('[eval] Put gold.jsonl and pred.jsonl in eval/datasets/')
+        print('[eval] Put gold.jsonl and pred.jsonl in eval/datasets/ (or run eval/run_eval.py)')
         return
     with g.open('r', encoding='utf-8') as f:
         gold = [json.loads(l) for l in f]
     with p.open('r', encoding='utf-8') as f:
         pred = [json.loads(l) for l in f]
 
-    n = min(len(gold), len(pred))
-    ok = 0; cited = 0
-    for i in range(n):
-        gv = gold[i].get('answer',{}).get('verdict')
-        pv = pred[i].get('answer',{}).get('verdict')
-        if gv and pv and gv.strip().lower()==pv.strip().lower():
-            ok += 1
-        # count citation presence
-        cites = pred[i].get('answer',{}).get('citations',[])
-        if cites: cited += 1
-
-    print(f'[eval] N={n}  VerdictAccuracy={ok/n if n else 0:.3f}  HasCitation={cited/n if n else 0:.3f}')
+    print(format_result(score(gold, pred)))
 
 if __name__ == '__main__':
     main()
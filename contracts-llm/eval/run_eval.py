@@ -0,0 +1,180 @@
+# eval/run_eval.py
+# Produce pred.jsonl from gold.jsonl by querying an endpoint concurrently, then score it.
+#
+#   python eval/run_eval.py --kind rag --url http://127.0.0.1:8000/ask --concurrency 8 --rps 4
+#
+# kinds:  rag        POST {question, top_k}                  -> {"answer": {...}} (src/answerer/rag_api.py)
+#         ask-basic  POST {question, contractText}           -> {"answer": "..."}  (simple_backend)
+#         chat       POST {contract_text, question}          -> {"answer": "..."}  (llm_server)
+# gold rows: {"question": ..., "contract_text"?: ..., "answer": {"verdict": ...}}
+#
+# Predictions are cached in eval/cache/predictions.jsonl keyed by sha1(endpoint config + question
+# + contract text), so re-runs only query new or changed items (--refresh to ignore the cache).
+import argparse, asyncio, hashlib, json, sys, time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from eval import DATA, score, format_result  # noqa: E402
+
+CACHE = Path(__file__).resolve().parent/'cache'/'predictions.jsonl'
+
+
+def build_request(kind, item, top_k):
+    q = item.get('question', '')
+    ctx = item.get('contract_text', '')
+    if kind == 'rag':
+        return {"question": q, "top_k": top_k}
+    if kind == 'ask-basic':
+        return {"question": q, "contractText": ctx}
+    return {"contract_text": ctx, "question": q}
+
+
+def parse_answer(kind, body):
+    """Normalize any endpoint's response into the {"verdict", "citations", ...} answer dict."""
+    ans = body.get('answer') if isinstance(body, dict) else None
+    if isinstance(ans, dict):
+        return ans
+    if isinstance(ans, str):
+        # models often return the JSON answer as text
+        try:
+            parsed = json.loads(ans)
+            if isinstance(parsed, dict):
+                return parsed
+        except ValueError:
+            pass
+        return {"verdict": ans.strip(), "citations": []}
+    raw = body.get('raw') if isinstance(body, dict) else None
+    return {"verdict": (raw or '').strip(), "citations": [], "raw": True}
+
+
+def cache_key(config, req):
+    blob = json.dumps({"config": config, "request": req}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+
+def load_cache():
+    out = {}
+    if CACHE.exists():
+        with CACHE.open('r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    out[rec['key']] = rec
+                except (ValueError, KeyError):
+                    pass
+    return out
+
+
+class RateLimiter:
+    """At most `rps` request starts per second (0 = unlimited)."""
+
+    def __init__(self, rps):
+        self.interval = 1.0/rps if rps and rps > 0 else 0.0
+        self.next = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            if self.next > now:
+                await asyncio.sleep(self.next - now)
+            self.next = max(now, self.next) + self.interval
+
+
+async def run(args, gold):
+    config = {"url": args.url, "kind": args.kind, "top_k": args.top_k, "tag": args.tag}
+    cache = {} if args.refresh else load_cache()
+    preds = [None]*len(gold)
+    todo = []
+    for i, item in enumerate(gold):
+        req = build_request(args.kind, item, args.top_k)
+        key = cache_key(config, req)
+        hit = cache.get(key)
+        if hit:
+            pred = {**hit['pred'], "cached": True}
+            # a cached timing is from an earlier run; keep it out of this run's percentiles
+            if 'latency_ms' in pred:
+                pred['cached_latency_ms'] = pred.pop('latency_ms')
+            preds[i] = pred
+        else:
+            todo.append((i, key, req))
+    print(f'[eval] {len(gold)} items, {len(gold)-len(todo)} cached, {len(todo)} to query', flush=True)
+
+    sem = asyncio.Semaphore(args.concurrency)
+    limiter = RateLimiter(args.rps)
+    CACHE.parent.mkdir(parents=True, exist_ok=True)
+    done = 0
+
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        with CACHE.open('a', encoding='utf-8') as cf:
+            async def one(i, key, req):
+                nonlocal done
+                async with sem:
+                    await limiter.wait()
+                    t0 = time.perf_counter()
+                    try:
+                        r = await client.post(args.url, json=req)
+                        r.raise_for_status()
+                        body = r.json()
+                        pred = {"answer": parse_answer(args.kind, body)}
+                        ok = True
+                        # rag_api and simple_backend report upstream/budget errors as 200 + ok=false
+                        if isinstance(body, dict) and body.get('ok') is False:
+                            pred["error"] = str(body.get('error') or 'ok=false')
+                            ok = False
+                    except (httpx.HTTPError, ValueError) as e:
+                        pred = {"answer": {}, "error": f"{type(e).__name__}: {e}"}
+                        ok = False
+                    pred["latency_ms"] = round((time.perf_counter()-t0)*1000, 1)
+                    pred["question"] = gold[i].get('question', '')
+                    preds[i] = pred
+                    if ok:  # don't cache failures; they are retried next run
+                        cf.write(json.dumps({"key": key, "pred": pred}, ensure_ascii=False) + '\n')
+                        cf.flush()
+                    done += 1
+                    if done % 10 == 0 or done == len(todo):
+                        print(f'[eval] {done}/{len(todo)} queried', flush=True)
+
+            await asyncio.gather(*(one(*t) for t in todo))
+    return preds
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Concurrent, cached eval runner')
+    ap.add_argument('--url', default='http://127.0.0.1:8000/ask')
+    ap.add_argument('--kind', default='rag', choices=['rag', 'ask-basic', 'chat'])
+    ap.add_argument('--gold', default=str(DATA/'gold.jsonl'))
+    ap.add_argument('--pred', default=str(DATA/'pred.jsonl'))
+    ap.add_argument('--top-k', type=int, default=6)
+    ap.add_argument('--concurrency', type=int, default=4)
+    ap.add_argument('--rps', type=float, default=0, help='max requests started per second (0 = no limit)')
+    ap.add_argument('--timeout', type=float, default=300)
+    ap.add_argument('--tag', default='', help='extra cache-key component, e.g. the model name')
+    ap.add_argument('--refresh', action='store_true', help='ignore cached predictions')
+    args = ap.parse_args()
+
+    g = Path(args.gold)
+    if not g.exists():
+        print(f'[eval] gold file not found: {g}')
+        return
+    with g.open('r', encoding='utf-8') as f:
+        gold = [json.loads(l) for l in f if l.strip()]
+
+    t0 = time.perf_counter()
+    preds = asyncio.run(run(args, gold))
+    wall = time.perf_counter()-t0
+
+    with Path(args.pred).open('w', encoding='utf-8') as f:
+        for p in preds:
+            f.write(json.dumps(p, ensure_ascii=False) + '\n')
+    res = score(gold, preds)
+    errors = sum(1 for p in preds if p.get('error'))
+    print(format_result(res) + f'  Errors={errors}  Wall={wall:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
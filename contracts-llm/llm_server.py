@@ -1,4 +1,6 @@
 ﻿import os
+import asyncio
+import logging
 from typing import List, Optional, Dict, Any
 
 from fastapi import FastAPI, HTTPException
@@ -6,6 +8,12 @@ from pydantic import BaseModel
 import httpx
 from dotenv import load_dotenv
 
+from src.serving import metrics, tracing, profiling, budget, logs
+from src.serving.logs import log_event
+from src.serving.upstream import chat_completion, BudgetExceeded
+from src.answerer.contract_store import ContractStore, contract_sha1
+from src.answerer.semantic_cache import SemanticCache
+
 # Cargar variables de entorno desde .env.llm o .env si existen
 for env_file in (".env.llm", ".env"):
     if os.path.exists(env_file):
@@ -15,6 +23,15 @@ LLM_API_BASE = os.getenv("LLM_API_BASE", "http://localhost:1234/v1")
 LLM_API_KEY = os.getenv("LLM_API_KEY", "")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4.1-mini")  # pon aquí el modelo de LM Studio / OpenAI
 
+# Contratos largos: solo las cláusulas relevantes (índice en memoria por sha1, LRU)
+CONTRACT_RETRIEVAL = os.getenv("CONTRACT_RETRIEVAL", "1") != "0"
+RETRIEVAL_MIN_CHARS = int(os.getenv("RETRIEVAL_MIN_CHARS", "6000"))
+RETRIEVAL_CONTEXT_CHARS = int(os.getenv("RETRIEVAL_CONTEXT_CHARS", "6000"))
+STORE = ContractStore()
+# Preguntas parecidas sobre el mismo contrato (sin historial) reutilizan la respuesta
+ANSWERS = SemanticCache()
+logger = logging.getLogger("contracts-llm-server")
+
 SYSTEM_PROMPT = """
 You are ContractAI Pro, an expert legal contract analyst.
 You specialize in:
@@ -30,11 +47,17 @@ When answering:
 - If something is unclear or missing in the contract, say it explicitly.
 """
 
+logs.setup("llm_server")
+
 app = FastAPI(
     title="Contracts LLM Server",
     description="Specialized LLM API for contract analysis",
     version="0.1.0",
 )
+metrics.install(app, "llm_server")
+tracing.install(app, "llm_server")
+profiling.install(app, "llm_server")
+budget.install(app)
 
 
 class HistoryMessage(BaseModel):
@@ -51,6 +74,8 @@ class ContractChatRequest(BaseModel):
 class ContractChatResponse(BaseModel):
     answer: str
     raw_provider_response: Optional[Dict[str, Any]] = None
+    source: Optional[str] = None           # "llm" | "semantic_cache"
+    cache: Optional[Dict[str, Any]] = None  # score + pregunta original si viene de la caché
 
 
 @app.get("/health")
@@ -75,13 +100,12 @@ async def call_llm(messages: List[Dict[str, str]]) -> str:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.post(url, json=payload, headers=headers)
-            resp.raise_for_status()
+        data = await chat_completion(url, payload, headers=headers, timeout=60)
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=413, detail=f"Prompt too large: {e}")
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Upstream LLM error: {e}")
 
-    data = resp.json()
     try:
         return data["choices"][0]["message"]["content"]
     except Exception:
@@ -91,6 +115,24 @@ async def call_llm(messages: List[Dict[str, str]]) -> str:
         )
 
 
+async def relevant_clauses(contract_text: str, question: str) -> Optional[str]:
+    """Top-k cláusulas para contratos largos; None = enviar el texto completo."""
+    text = (contract_text or "").strip()
+    if not CONTRACT_RETRIEVAL or len(text) <= RETRIEVAL_MIN_CHARS:
+        return None
+    try:
+        return await asyncio.to_thread(STORE.relevant_text, contract_sha1(text), question,
+                                       RETRIEVAL_CONTEXT_CHARS, text)
+    except Exception as e:
+        log_event(logger, logging.WARNING, "contract_retrieval_failed", detail=str(e))
+        return None
+
+
+def _semantic_lookup(scope: str, question: str):
+    vec = ANSWERS.embed(question)
+    return vec, ANSWERS.lookup(scope, vec)
+
+
 @app.post("/chat/contracts", response_model=ContractChatResponse)
 async def chat_contracts(body: ContractChatRequest) -> ContractChatResponse:
     """
@@ -99,7 +141,20 @@ async def chat_contracts(body: ContractChatRequest) -> ContractChatResponse:
     - Recibe la pregunta del usuario
     - Opcionalmente historial
     - Devuelve respuesta experta
+    Sin historial, una pregunta parecida (SEMCACHE_THRESHOLD) sobre el mismo
+    contrato y modelo se responde desde la caché semántica.
     """
+    scope, vec = f"{contract_sha1(body.contract_text)}:{LLM_MODEL}", None
+    if ANSWERS.enabled and not body.history and body.contract_text.strip():
+        try:
+            vec, hit = await asyncio.to_thread(_semantic_lookup, scope, body.question)
+        except Exception as e:
+            log_event(logger, logging.WARNING, "semantic_cache_failed", detail=str(e))
+            hit = None
+        if hit:
+            answer, info = hit
+            return ContractChatResponse(answer=answer, source="semantic_cache", cache=info)
+
     messages: List[Dict[str, str]] = [
         {"role": "system", "content": SYSTEM_PROMPT.strip()},
     ]
@@ -109,16 +164,28 @@ async def chat_contracts(body: ContractChatRequest) -> ContractChatResponse:
         for m in body.history:
             messages.append({"role": m.role, "content": m.content})
 
-    # Mensaje actual con contrato + pregunta
-    user_content = (
-        "You are analyzing the following contract.\n\n"
-        "=== CONTRACT TEXT START ===\n"
-        f"{body.contract_text}\n"
-        "=== CONTRACT TEXT END ===\n\n"
-        f"User question: {body.question}"
-    )
+    # Mensaje actual con contrato (o sus cláusulas relevantes) + pregunta
+    excerpt = await relevant_clauses(body.contract_text, body.question)
+    if excerpt:
+        user_content = (
+            "You are analyzing a contract. Only the clauses most relevant to the question are shown.\n\n"
+            "=== RELEVANT CLAUSES START ===\n"
+            f"{excerpt}\n"
+            "=== RELEVANT CLAUSES END ===\n\n"
+            f"User question: {body.question}"
+        )
+    else:
+        user_content = (
+            "You are analyzing the following contract.\n\n"
+            "=== CONTRACT TEXT START ===\n"
+            f"{body.contract_text}\n"
+            "=== CONTRACT TEXT END ===\n\n"
+            f"User question: {body.question}"
+        )
 
     messages.append({"role": "user", "content": user_content})
 
     answer = await call_llm(messages)
-    return ContractChatResponse(answer=answer)
+    if vec is not None and answer:
+        ANSWERS.store(scope, vec, body.question, answer)
+    return ContractChatResponse(answer=answer, source="llm")
@@ -1,18 +1,28 @@
-﻿from fastapi.responses import Response
+﻿from fastapi.responses import Response, JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 import os
+import re
+import json
+import time
+import asyncio
+import functools
 import logging
-from typing import Optional
+from typing import List, NamedTuple, Optional
 
 import httpx
 from fastapi import FastAPI, Request
 from pydantic import BaseModel
 import uvicorn
 
-# --- Logging básico ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+from src.serving import metrics, tracing, profiling, budget, logs
+from src.serving.logs import log_event, lazy_preview
+from src.serving.metrics import stage
+from src.answerer.contract_store import ContractStore, contract_sha1, context_key
+from src.answerer.semantic_cache import SemanticCache
+from src.serving.upstream import chat_completion, BudgetExceeded
+
+# --- Logging: JSON por cola + hilo escritor (src/serving/logs.py) ---
+logs.setup("simple_backend")
 logger = logging.getLogger("contracts-llm-backend")
 
 # --- Configuración de LM Studio ---
@@ -20,6 +30,10 @@ LM_STUDIO_URL = os.getenv("LM_STUDIO_URL", "http://127.0.0.1:1234")
 LM_MODEL = os.getenv("LM_MODEL", "deepseek-r1-distill-llama-8b:3")
 
 app = FastAPI(title="Contracts LLM Backend")
+metrics.install(app, "simple_backend")
+tracing.install(app, "simple_backend")
+profiling.install(app, "simple_backend")
+budget.install(app)
 
 
 # BEGIN_FORCE_OPTIONS_CORS_PATCH
@@ -44,7 +58,9 @@ async def _force_options_cors(request: Request, call_next):
     response.headers["Access-Control-Allow-Origin"] = allow_origin
     response.headers["Vary"] = "Origin"
     response.headers["Access-Control-Allow-Methods"] = "GET,POST,PUT,PATCH,DELETE,OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Request-ID"
+    response.headers["Access-Control-Expose-Headers"] = "X-Request-ID, Server-Timing"
+    response.headers["Timing-Allow-Origin"] = allow_origin
     return response
 # END_FORCE_OPTIONS_CORS_PATCH
 
@@ -58,24 +74,55 @@ class AskResponse(BaseModel):
     answer: Optional[str] = None
     error: Optional[str] = None
     detail: Optional[str] = None
+    # "llm" | "canonical" | "semantic_cache"; cache = score y pregunta original del acierto
+    source: Optional[str] = None
+    cache: Optional[dict] = None
+
+MAX_CONTRACT_CHARS = 16000
+# Límite de llamadas simultáneas a LM Studio (ask-basic + ask-batch)
+LM_MAX_CONCURRENCY = int(os.getenv("LM_MAX_CONCURRENCY", "8"))
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "20"))
+# Recuperación por contrato: por encima de RETRIEVAL_MIN_CHARS solo se envían las
+# cláusulas más relevantes (top-k, hasta RETRIEVAL_CONTEXT_CHARS) en vez del texto entero
+CONTRACT_RETRIEVAL = os.getenv("CONTRACT_RETRIEVAL", "1") != "0"
+RETRIEVAL_MIN_CHARS = int(os.getenv("RETRIEVAL_MIN_CHARS", "6000"))
+RETRIEVAL_CONTEXT_CHARS = int(os.getenv("RETRIEVAL_CONTEXT_CHARS", "6000"))
+_lm_slots: Optional[asyncio.Semaphore] = None
+
+class PreparedContract(NamedTuple):
+    text: str
+    sha1: str
+    truncated: bool
+    full: str
+
+def _truncate_contract(contract_text: str) -> str:
+    # Limitar longitud del contrato (en caracteres) para no explotar el contexto
+    text = (contract_text or "").strip()
+    return text[-MAX_CONTRACT_CHARS:] if len(text) > MAX_CONTRACT_CHARS else text
+
+def prepare_contract(contract_text: str) -> PreparedContract:
+    """
+    Limpia, recorta y hashea el contrato una sola vez (para todas las preguntas de un batch).
+    """
+    full = (contract_text or "").strip()
+    text = _truncate_contract(full)
+    return PreparedContract(text, contract_sha1(full), len(text) < len(full), full)
 
-def build_user_prompt(question: str, contract_text: str, extra_context: str) -> str:
+def build_user_prompt(question: str, contract_text: str, extra_context: str, excerpt: bool = False) -> str:
     """
     Construye el prompt para el modelo, limitando el tamaño del contrato
     para evitar errores de contexto en LM Studio.
+    excerpt=True: contract_text son solo las cláusulas recuperadas para la pregunta.
     """
-    contract_text = (contract_text or "").strip()
+    contract_text = _truncate_contract(contract_text)
     extra_context = (extra_context or "").strip()
     question = (question or "").strip()
-
-    # Limitar longitud del contrato (en caracteres) para no explotar el contexto
-    max_chars = 16000
-    if len(contract_text) > max_chars:
-        contract_text = contract_text[-max_chars:]
+    header = ("RELEVANT CONTRACT CLAUSES (selected for this question, in document order)" if excerpt
+              else "CONTRACT TEXT (may be truncated)")
 
     user_content = f"""You are a senior contracts lawyer. Answer clearly, in plain English.
 
-CONTRACT TEXT (may be truncated):
+{header}:
 {contract_text}
 
 EXTRA CONTEXT (metadata or notes, may be empty):
@@ -86,19 +133,62 @@ QUESTION:
 """
     return user_content
 
-@app.post("/llm/ask-basic", response_model=AskResponse)
-async def ask_basic(req: AskRequest) -> AskResponse:
+# Precompute por contrato (cláusulas, embeddings, respuestas canónicas) e índices
+# en memoria (LRU por sha1), ver src/answerer/contract_store.py
+STORE = ContractStore()
+# Respuestas anteriores del mismo contrato (sha1 + modelo) para preguntas parecidas,
+# ver src/answerer/semantic_cache.py (SEMCACHE_THRESHOLD)
+ANSWERS = SemanticCache()
+
+def _retrieved_context(contract: PreparedContract, question: str) -> Optional[str]:
+    # Usa el precompute si existe; si no, trocea y embebe el contrato una vez (LRU)
+    try:
+        return STORE.relevant_text(contract.sha1, question, RETRIEVAL_CONTEXT_CHARS, text=contract.full)
+    except Exception as e:
+        log_event(logger, logging.WARNING, "contract_retrieval_failed", detail=str(e))
+        return None
+
+def _semantic_lookup(scope: str, question: str, lookup: bool = True):
+    with stage("semantic_cache"):
+        vec = ANSWERS.embed(question)
+        return vec, (ANSWERS.lookup(scope, vec) if lookup else None)
+
+async def answer_question(question: str, contract: PreparedContract, extra_context: str,
+                          cached: bool = True) -> AskResponse:
     """
-    Endpoint principal llamado por el servidor Node (server.js) y por la UI.
+    Una pregunta -> LM Studio, respetando LM_MAX_CONCURRENCY.
+    cached=False: siempre genera (precompute), sin mirar respuestas guardadas.
     """
-    question = (req.question or "").strip()
-    if not question:
-        return AskResponse(ok=False, error="missing_question", detail="Question is empty.")
+    global _lm_slots
+    if _lm_slots is None:
+        _lm_slots = asyncio.Semaphore(LM_MAX_CONCURRENCY)
 
-    contract_text = req.contractText or ""
-    extra_context = req.extraContext or ""
+    if cached:
+        hit = await asyncio.to_thread(STORE.canonical_answer, contract.sha1, question, LM_MODEL, extra_context)
+        if hit:
+            log_event(logger, logging.INFO, "canonical_answer", contract=contract.sha1[:12])
+            return AskResponse(ok=True, answer=hit, source="canonical")
+
+    # extra context (metadata / notes) is part of the prompt, so it is part of the scope too
+    scope, vec = f"{contract.sha1}:{context_key(extra_context)}:{LM_MODEL}", None
+    if ANSWERS.enabled and contract.full:
+        try:
+            vec, hit = await asyncio.to_thread(_semantic_lookup, scope, question, cached)
+        except Exception as e:
+            log_event(logger, logging.WARNING, "semantic_cache_failed", detail=str(e))
+            hit = None
+        if hit:
+            answer, info = hit
+            log_event(logger, logging.INFO, "semantic_cache_hit", contract=contract.sha1[:12], score=info["score"])
+            return AskResponse(ok=True, answer=answer, source="semantic_cache", cache=info)
+
+    contract_text, excerpt = contract.text, False
+    if CONTRACT_RETRIEVAL and len(contract.full) > RETRIEVAL_MIN_CHARS:
+        retrieved = await asyncio.to_thread(_retrieved_context, contract, question)
+        if retrieved:
+            contract_text, excerpt = retrieved, True
 
-    user_prompt = build_user_prompt(question, contract_text, extra_context)
+    user_prompt = build_user_prompt(question, contract_text, extra_context, excerpt=excerpt)
 
     payload = {
         "model": LM_MODEL,
@@ -119,44 +209,140 @@ async def ask_basic(req: AskRequest) -> AskResponse:
         "max_tokens": 512,
     }
 
-    logger.info("contracts-llm-backend: Calling LM Studio at %s/v1/chat/completions with model=%s", LM_STUDIO_URL, LM_MODEL)
-    print(f"DEBUG: Calling LM Studio at {LM_STUDIO_URL}/v1/chat/completions model={LM_MODEL}", flush=True)
+    log_event(logger, logging.INFO, "lm_call", url=f"{LM_STUDIO_URL}/v1/chat/completions", model=LM_MODEL)
 
     try:
-        async with httpx.AsyncClient(timeout=90.0) as client:
-            resp = await client.post(f"{LM_STUDIO_URL}/v1/chat/completions", json=payload)
-            status = resp.status_code
-            logger.info("contracts-llm-backend: LM Studio HTTP %s", status)
-            print(f"DEBUG: LM Studio HTTP {status}", flush=True)
-            # Guardar texto de respuesta recortado para debug
-            preview = resp.text[:400].replace("\n", " ")
-            logger.info("contracts-llm-backend: LM Studio response preview: %s", preview)
-            resp.raise_for_status()
-            data = resp.json()
+        with stage("admission_wait"):
+            await _lm_slots.acquire()
+        try:
+            data = await chat_completion(f"{LM_STUDIO_URL}/v1/chat/completions", payload, timeout=90.0)
+        finally:
+            _lm_slots.release()
+        # Respuesta recortada solo si DEBUG está activo (se formatea en el hilo escritor)
+        log_event(logger, logging.DEBUG, "lm_response", status=200, preview=lazy_preview(data, 400))
+    except BudgetExceeded as e:
+        log_event(logger, logging.WARNING, "prompt_too_large", detail=str(e))
+        return AskResponse(ok=False, error="prompt_too_large", detail=str(e))
     except httpx.HTTPError as e:
         msg = f"LM Studio HTTP error: {e}"
-        logger.error("contracts-llm-backend: %s", msg)
-        print("ERROR:", msg, flush=True)
+        log_event(logger, logging.ERROR, "lm_http_error", detail=msg)
         return AskResponse(ok=False, error="lm_http_error", detail=msg)
     except Exception as e:
         msg = f"Unexpected backend exception: {e}"
-        logger.exception("contracts-llm-backend: %s", msg)
-        print("ERROR:", msg, flush=True)
+        logger.exception("backend_exception", extra={"detail": msg})
         return AskResponse(ok=False, error="backend_exception", detail=msg)
 
     try:
         answer = data["choices"][0]["message"]["content"]
     except Exception as e:
         msg = f"Could not parse LM Studio response: {e}"
-        logger.exception("contracts-llm-backend: %s", msg)
-        print("ERROR:", msg, flush=True)
+        logger.exception("parse_error", extra={"detail": msg})
         return AskResponse(ok=False, error="parse_error", detail=msg)
 
-    return AskResponse(ok=True, answer=answer)
+    if vec is not None and answer:
+        ANSWERS.store(scope, vec, question, answer)
+    return AskResponse(ok=True, answer=answer, source="llm")
+
+@app.post("/llm/ask-basic", response_model=AskResponse)
+async def ask_basic(req: AskRequest) -> AskResponse:
+    """
+    Endpoint principal llamado por el servidor Node (server.js) y por la UI.
+    """
+    question = (req.question or "").strip()
+    if not question:
+        return AskResponse(ok=False, error="missing_question", detail="Question is empty.")
+
+    return await answer_question(question, prepare_contract(req.contractText or ""), req.extraContext or "")
+
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+    contractText: Optional[str] = ""
+    extraContext: Optional[str] = ""
+    stream: bool = True
+
+@app.post("/llm/ask-batch")
+async def ask_batch(req: AskBatchRequest):
+    """
+    Varias preguntas sobre el mismo contrato en una sola llamada.
+    El contrato se prepara una vez y las preguntas van a LM Studio en paralelo
+    (dentro de LM_MAX_CONCURRENCY). Con stream=true (por defecto) responde
+    NDJSON: una línea "start", una "result" por pregunta según van terminando
+    (con su "index" original) y una "done" al final.
+    """
+    questions = [q.strip() for q in req.questions if q and q.strip()]
+    if not questions:
+        return JSONResponse({"ok": False, "error": "missing_question", "detail": "No questions."}, status_code=400)
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return JSONResponse({"ok": False, "error": "too_many_questions",
+                             "detail": f"At most {BATCH_MAX_QUESTIONS} questions per batch."}, status_code=400)
+
+    contract = prepare_contract(req.contractText or "")
+    extra_context = req.extraContext or ""
+    t0 = time.perf_counter()
+
+    async def one(i: int, q: str) -> dict:
+        t = time.perf_counter()
+        res = await answer_question(q, contract, extra_context)
+        return {"type": "result", "index": i, "question": q, **jsonable_encoder(res),
+                "ms": round((time.perf_counter() - t) * 1000, 1)}
+
+    start = {"type": "start", "count": len(questions), "contract_sha1": contract.sha1,
+             "truncated": contract.truncated}
+    if not req.stream:
+        results = await asyncio.gather(*(one(i, q) for i, q in enumerate(questions)))
+        return {"ok": True, **start, "results": results,
+                "wall_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+    async def lines():
+        yield json.dumps(start) + "\n"
+        tasks = [asyncio.ensure_future(one(i, q)) for i, q in enumerate(questions)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield json.dumps(await fut, ensure_ascii=False) + "\n"
+        finally:
+            # cliente desconectado: no seguir gastando LM Studio
+            for t in tasks:
+                t.cancel()
+        yield json.dumps({"type": "done", "count": len(questions),
+                          "wall_ms": round((time.perf_counter() - t0) * 1000, 1)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+class PrecomputeRequest(BaseModel):
+    contractText: str
+    # el mismo extraContext que mandará /llm/ask-basic; las respuestas canónicas solo sirven con él
+    extraContext: Optional[str] = ""
+    force: bool = False
+
+async def _precompute_answer(question: str, contract_text: str, extra_context: str = "") -> str:
+    res = await answer_question(question, prepare_contract(contract_text), extra_context, cached=False)
+    if not res.ok:
+        raise RuntimeError(res.detail or res.error)
+    return res.answer
+
+@app.post("/contracts/precompute", status_code=202)
+async def contracts_precompute(req: PrecomputeRequest):
+    """
+    Llamado al registrar un contrato: segmenta, etiqueta, embebe y responde las
+    preguntas canónicas (docs/scope.md) en segundo plano. Clave = sha1 del texto.
+    """
+    if not (req.contractText or "").strip():
+        return JSONResponse({"ok": False, "error": "missing_contract"}, status_code=400)
+    extra_context = req.extraContext or ""
+    answer_fn = functools.partial(_precompute_answer, extra_context=extra_context)
+    return {"ok": True, **STORE.submit(req.contractText, answer_fn, LM_MODEL, force=req.force,
+                                       extra_context=extra_context)}
+
+@app.get("/contracts/{sha1}")
+async def contracts_status(sha1: str):
+    if not re.fullmatch(r"[0-9a-f]{40}", sha1):
+        return JSONResponse({"ok": False, "error": "bad_sha1"}, status_code=400)
+    return {"ok": True, **STORE.status(sha1)}
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "lm_studio_url": LM_STUDIO_URL, "model": LM_MODEL}
+    return {"status": "ok", "lm_studio_url": LM_STUDIO_URL, "model": LM_MODEL,
+            "semantic_cache": ANSWERS.stats()}
 
 if __name__ == "__main__":
     # Arrancar Uvicorn cuando ejecutas: python .\simple_backend.py
@@ -0,0 +1,296 @@
+# src/answerer/contract_store.py
+"""
+Per-contract precompute, keyed by the sha1 of the (stripped) contract text.
+
+When a contract is registered (POST /contracts/precompute on simple_backend,
+called by the UI server on POST /api/contracts) a background task:
+  1. segments + tags the text into clause records (src/extract/extractor.records_from_text)
+  2. embeds the clauses (through the embedding cache, CONTRACT_EMBED_MODEL)
+  3. answers the canonical questions of docs/scope.md with the serving app's
+     own answer function
+and persists everything under data/contract_store/<sha1>/:
+    meta.json        status, counts, timings, models
+    clauses.jsonl    clause records
+    embeddings.npy   float32, L2-normalized, one row per clause
+    answers.json     {"model": ..., "context": context_key, "answers": {question: answer}}
+
+Later questions on the same text reuse it: canonical questions (normalized
+exact match, same LLM model, same extra context as the precompute) are
+answered from answers.json, and long
+contracts are packed with their most relevant clauses instead of a blind
+truncation (relevant_text()).
+
+Contracts that were never registered get the same retrieval ephemerally:
+relevant_text(..., text=contract) chunks + embeds the text once and keeps a
+small in-memory index (faiss IndexFlatIP, numpy if faiss is missing) in an
+LRU keyed by the same sha1 (CONTRACT_INDEX_CACHE entries), so follow-up
+questions on the same contract only embed the question.
+"""
+import os, re, json, time, asyncio, hashlib, threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from src.serving.metrics import stage
+from src.retriever.encoder import EMBED_MODEL
+
+ROOT = Path(__file__).resolve().parents[2]
+STORE_DIR = Path(os.getenv("CONTRACT_STORE_DIR", str(ROOT/'data'/'contract_store')))
+CONTRACT_EMBED_MODEL = os.getenv("CONTRACT_EMBED_MODEL", EMBED_MODEL)
+SCOPE = ROOT/'docs'/'scope.md'
+KEEP_LOADED = int(os.getenv("CONTRACT_INDEX_CACHE", "32"))
+RETRIEVAL_TOP_K = int(os.getenv("CONTRACT_TOP_K", "8"))
+CHUNK_CHARS = int(os.getenv("CONTRACT_CHUNK_CHARS", "1500"))
+
+_QWORD = re.compile(r"[a-z0-9]+")
+
+
+def contract_sha1(text: str) -> str:
+    return hashlib.sha1((text or "").strip().encode("utf-8")).hexdigest()
+
+
+def context_key(extra_context: str) -> str:
+    """Short hash of whitespace-normalized extra context ("" when there is none)."""
+    norm = " ".join((extra_context or "").split())
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()[:16] if norm else ""
+
+
+def question_key(q: str) -> str:
+    return " ".join(_QWORD.findall((q or "").lower()))
+
+
+def canonical_questions(path: Path = SCOPE):
+    if not path.exists():
+        return []
+    lines = path.read_text(encoding="utf-8-sig").splitlines()
+    return [l[2:].strip() for l in lines if l.startswith("- ") and l.rstrip().endswith("?")]
+
+
+def load_embedder(model_name: str = CONTRACT_EMBED_MODEL):
+    """Process-wide encoder per model name (src/retriever/encoder.py, loaded on first use)."""
+    from src.retriever.encoder import load_encoder
+
+    return load_encoder(model_name)
+
+
+def chunk_records(records, max_chars: int = CHUNK_CHARS):
+    """Split clause records longer than max_chars into overlapping windows (same span base)."""
+    out = []
+    step = max(1, max_chars - max_chars // 5)
+    for r in records:
+        text = r["text"]
+        if len(text) <= max_chars:
+            out.append(r)
+            continue
+        for off in range(0, len(text), step):
+            piece = text[off:off + max_chars]
+            out.append({**r, "text": piece, "span": [r["span"][0] + off, r["span"][0] + off + len(piece)]})
+            if off + max_chars >= len(text):
+                break
+    return out
+
+
+def embed_records(records, model_name: str = CONTRACT_EMBED_MODEL) -> np.ndarray:
+    from src.retriever.embed_cache import get_cache
+    from src.retriever.encoder import model_id
+
+    texts = [r["text"] for r in records]
+    if not texts:
+        return np.zeros((0, 0), dtype="float32")
+    cache = get_cache(model_id(model_name))
+    return cache.encode(texts, lambda: load_embedder(model_name), normalize=True).astype("float32")
+
+
+def _build_index(emb: np.ndarray):
+    if not len(emb):
+        return None
+    try:
+        import faiss
+    except ImportError:
+        return None
+    index = faiss.IndexFlatIP(emb.shape[1])
+    index.add(np.ascontiguousarray(emb))
+    return index
+
+
+def _write_json(path: Path, data) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class ContractStore:
+    def __init__(self, root: Path = STORE_DIR, model_name: str = CONTRACT_EMBED_MODEL):
+        self.root, self.model_name = Path(root), model_name
+        self._loaded = OrderedDict()   # sha1 -> {"records", "emb", "index", "answers", "source"}
+        self._lock = threading.Lock()
+        self._building = {}            # sha1 -> Lock, so one contract is only chunked/embedded once
+        self._running = {}             # sha1 -> asyncio.Task
+
+    def _dir(self, sha1: str) -> Path:
+        return self.root/sha1
+
+    # ---------- reading ----------
+
+    def meta(self, sha1: str):
+        p = self._dir(sha1)/'meta.json'
+        if not p.exists():
+            return None
+        return json.loads(p.read_text(encoding="utf-8"))
+
+    def status(self, sha1: str) -> dict:
+        m = self.meta(sha1)
+        if sha1 in self._running and (m is None or m.get("status") != "ready"):
+            return {**(m or {"sha1": sha1}), "status": (m or {}).get("status", "queued"), "running": True}
+        return m or {"sha1": sha1, "status": "unknown"}
+
+    def _cached(self, sha1: str):
+        with self._lock:
+            e = self._loaded.get(sha1)
+            if e is not None:
+                self._loaded.move_to_end(sha1)
+            return e
+
+    def _remember(self, sha1: str, e: dict) -> dict:
+        with self._lock:
+            self._loaded[sha1] = e
+            while len(self._loaded) > KEEP_LOADED:
+                self._loaded.popitem(last=False)
+        return e
+
+    def _entry(self, sha1: str):
+        """In-memory entry, else the precomputed one from disk; None if neither."""
+        e = self._cached(sha1)
+        if e is not None:
+            return e
+        d = self._dir(sha1)
+        if not (d/'embeddings.npy').exists():
+            return None
+        with (d/'clauses.jsonl').open(encoding="utf-8") as f:
+            records = [json.loads(l) for l in f if l.strip()]
+        emb = np.load(d/'embeddings.npy')
+        e = {"records": records, "emb": emb, "index": _build_index(emb), "answers": None, "source": "store"}
+        if (d/'answers.json').exists():
+            e["answers"] = json.loads((d/'answers.json').read_text(encoding="utf-8"))
+        return self._remember(sha1, e)
+
+    def index_for(self, sha1: str, text: str = None):
+        """Entry for retrieval: cached, precomputed, or (given the text) built now and kept in the LRU."""
+        e = self._entry(sha1)
+        if e is not None or not text:
+            return e
+        with self._lock:
+            lock = self._building.setdefault(sha1, threading.Lock())
+        with lock:
+            e = self._cached(sha1)
+            if e is None:
+                from src.extract.extractor import records_from_text
+                with stage("contract_index"):
+                    records = chunk_records(records_from_text(text.strip(), f"contract-{sha1[:12]}"))
+                    emb = embed_records(records, self.model_name)
+                e = self._remember(sha1, {"records": records, "emb": emb, "index": _build_index(emb),
+                                          "answers": None, "source": "ephemeral"})
+        with self._lock:
+            self._building.pop(sha1, None)
+        return e
+
+    def canonical_answer(self, sha1: str, question: str, llm_model: str, extra_context: str = ""):
+        """Precomputed answer, only if it was generated with the same model and extra context."""
+        e = self._entry(sha1)
+        if not e or not e["answers"] or e["answers"].get("model") != llm_model:
+            return None
+        if e["answers"].get("context", "") != context_key(extra_context):
+            return None
+        return e["answers"]["answers"].get(question_key(question))
+
+    def search(self, e: dict, question: str, k: int):
+        with stage("encode"):
+            q = np.asarray(load_embedder(self.model_name).encode([question], normalize_embeddings=True),
+                           dtype="float32")
+        k = min(k, len(e["records"]))
+        with stage("search"):
+            if e["index"] is not None:
+                D, I = e["index"].search(q, k)
+                return [int(i) for i in I[0] if i >= 0]
+            return [int(i) for i in np.argsort(-(e["emb"] @ q[0]))[:k]]
+
+    def relevant_text(self, sha1: str, question: str, max_chars: int, text: str = None,
+                      k: int = RETRIEVAL_TOP_K):
+        """
+        Top-k clauses for the question (document order), packed into max_chars.
+        None if the contract is neither precomputed nor given as `text`.
+        """
+        e = self.index_for(sha1, text)
+        if not e or not e["records"]:
+            return None
+        picked, used = [], 0
+        for i in self.search(e, question, k):
+            n = len(e["records"][i]["text"]) + 2
+            if used + n > max_chars:
+                continue
+            picked.append(i)
+            used += n
+        picked.sort(key=lambda i: e["records"][i]["span"][0])
+        return "\n\n".join(e["records"][i]["text"] for i in picked)
+
+    # ---------- precompute ----------
+
+    def precompute_clauses(self, text: str, sha1: str) -> dict:
+        """Sync part: segment, tag, chunk, embed, persist. Returns timings."""
+        from src.extract.extractor import records_from_text
+
+        d = self._dir(sha1)
+        d.mkdir(parents=True, exist_ok=True)
+        t0 = time.perf_counter()
+        records = chunk_records(records_from_text(text.strip(), f"contract-{sha1[:12]}"))
+        t1 = time.perf_counter()
+        emb = embed_records(records, self.model_name)
+        t2 = time.perf_counter()
+        with (d/'clauses.jsonl').open('w', encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r, ensure_ascii=False) + '\n')
+        np.save(d/'embeddings.npy', emb)
+        with self._lock:
+            self._loaded.pop(sha1, None)
+        return {"clauses": len(records), "segment_s": round(t1 - t0, 3), "embed_s": round(t2 - t1, 3)}
+
+    async def precompute(self, text: str, sha1: str, answer_fn, llm_model: str, context: str = "") -> None:
+        """answer_fn(question, text) must answer with the extra context whose context_key is `context`."""
+        meta = {"sha1": sha1, "status": "clauses", "chars": len(text.strip()), "embed_model": self.model_name,
+                "llm_model": llm_model, "context": context, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        d = self._dir(sha1)
+        d.mkdir(parents=True, exist_ok=True)
+        _write_json(d/'meta.json', meta)
+        try:
+            meta.update(await asyncio.to_thread(self.precompute_clauses, text, sha1))
+            meta["status"] = "answers"
+            _write_json(d/'meta.json', meta)
+
+            t0 = time.perf_counter()
+            questions = canonical_questions()
+            answers = await asyncio.gather(*(answer_fn(q, text) for q in questions), return_exceptions=True)
+            ok = {question_key(q): a for q, a in zip(questions, answers) if isinstance(a, str) and a}
+            _write_json(d/'answers.json', {"model": llm_model, "context": context, "answers": ok,
+                                           "questions": {question_key(q): q for q in questions}})
+            with self._lock:
+                self._loaded.pop(sha1, None)
+            meta.update({"status": "ready", "canonical_answers": len(ok), "canonical_questions": len(questions),
+                         "answers_s": round(time.perf_counter() - t0, 3)})
+        except Exception as e:  # noqa: BLE001
+            meta.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+        finally:
+            _write_json(d/'meta.json', meta)
+            self._running.pop(sha1, None)
+
+    def submit(self, text: str, answer_fn, llm_model: str, force: bool = False, extra_context: str = "") -> dict:
+        """Schedule precompute on the running event loop (no-op if done or already running)."""
+        sha1 = contract_sha1(text)
+        context = context_key(extra_context)
+        m = self.meta(sha1)
+        if (not force and m and m.get("status") == "ready" and m.get("llm_model") == llm_model
+                and m.get("context", "") == context):
+            return m
+        if sha1 not in self._running:
+            self._running[sha1] = asyncio.ensure_future(self.precompute(text, sha1, answer_fn, llm_model, context))
+        return self.status(sha1)
@@ -0,0 +1,32 @@
+# src/answerer/extractive.py
+"""
+Extractive answer + heuristic risk label, no LLM involved.
+
+Shared by api/rag_api.py (/ask) and the progressive endpoint of
+src/answerer/rag_api.py (/ask/progressive), which sends this first and the
+LLM answer afterwards over the same connection.
+"""
+import re
+
+from src.answerer.risk import classify_risk  # noqa: F401  (re-exported; compiled tiers live there)
+
+MAX_SENTENCES = 6
+
+_TOKEN = re.compile(r"[^a-zA-Z0-9]+")
+_SENTENCE = re.compile(r"(?<=[\.\!\?])\s+")
+
+
+def extractive_answer(question: str, snippets, max_sentences: int = MAX_SENTENCES) -> str:
+    """Sentences of the snippets (in rank order) that mention a question word; first snippet otherwise."""
+    snippets = list(snippets)
+    if not snippets:
+        return "(no context)"
+    toks = [t for t in _TOKEN.split(question.lower()) if t]
+    keep = []
+    for sent in _SENTENCE.split("\n".join(snippets)):
+        sL = sent.lower()
+        if any(t in sL for t in toks):
+            keep.append(sent)
+        if len(keep) >= max_sentences:
+            break
+    return ("\n".join(keep) or snippets[0]).strip()
@@ -0,0 +1,109 @@
+# src/answerer/ingest_jobs.py
+"""
+Background ingestion jobs for the RAG API.
+
+POST /ingest enqueues PDFs here; a bounded worker pool runs
+extract (text/OCR -> clauses -> tags) -> embed (through the embedding cache)
+-> publish (LiveIndex swap + persist; a re-ingested PDF replaces its old
+rows), recording per-stage progress and
+throughput so GET /ingest/{id} can report it.
+
+Env: INGEST_WORKERS (default 2), INGEST_KEEP_JOBS (default 200).
+"""
+import os, time, uuid, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from src.extract.extractor import ensure_dirs, extract_records, write_records
+from src.retriever.embed_cache import get_cache
+from src.retriever.encoder import model_id
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+KEEP_JOBS = int(os.getenv("INGEST_KEEP_JOBS", "200"))
+
+
+def _rate(n, secs):
+    return round(n / secs, 2) if secs > 0 else None
+
+
+class IngestJobs:
+    def __init__(self, live, load_embedder, index_path: Path, meta_path: Path, workers: int = INGEST_WORKERS):
+        self.live = live
+        self.load_embedder = load_embedder
+        self.index_path, self.meta_path = index_path, meta_path
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest")
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, paths) -> dict:
+        # records are keyed by file name (doc_id); one job ingests each name once
+        paths = list({Path(p).name: Path(p) for p in paths}.values())
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id, "status": "queued", "files": [Path(p).name for p in paths],
+            "created": time.time(), "started": None, "finished": None, "error": None,
+            "stages": {
+                "extract": {"done": 0, "total": len(paths), "pages": 0, "ocr_pages": 0, "seconds": 0.0},
+                "embed": {"chunks": 0, "cache_hits": 0, "seconds": 0.0},
+                "publish": {"chunks": 0, "seconds": 0.0},
+            },
+            "skipped": [],
+        }
+        with self._lock:
+            self.jobs[job_id] = job
+            while len(self.jobs) > KEEP_JOBS:
+                self.jobs.popitem(last=False)
+        self.pool.submit(self._run, job, paths)
+        return self.get(job_id)
+
+    def get(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        ex, em = job["stages"]["extract"], job["stages"]["embed"]
+        return {**job, "throughput": {
+            "pages_per_s": _rate(ex["pages"], ex["seconds"]),
+            "chunks_per_s": _rate(em["chunks"], em["seconds"]),
+        }}
+
+    def _run(self, job, paths):
+        job["status"] = "running"
+        job["started"] = time.time()
+        st = job["stages"]
+        try:
+            ensure_dirs()
+            recs = []
+            for pdf in paths:
+                t0 = time.perf_counter()
+                stats = {}
+                out = extract_records(pdf, stats)
+                st["extract"]["seconds"] += time.perf_counter() - t0
+                st["extract"]["done"] += 1
+                st["extract"]["pages"] += stats.get("pages", 0)
+                st["extract"]["ocr_pages"] += stats.get("ocr_pages", 0)
+                if not out:
+                    job["skipped"].append(pdf.name)
+                    continue
+                write_records(pdf, out)
+                recs.extend(out)
+
+            if recs:
+                t0 = time.perf_counter()
+                cache = get_cache(model_id(self.live.model_name))
+                vecs = cache.encode([r["text"] for r in recs], self.load_embedder, normalize=True)
+                st["embed"]["seconds"] = time.perf_counter() - t0
+                st["embed"]["chunks"] = len(recs)
+                st["embed"]["cache_hits"] = cache.last_hits
+
+                t0 = time.perf_counter()
+                self.live.publish(vecs, recs)
+                self.live.save(self.index_path, self.meta_path)
+                st["publish"]["seconds"] = time.perf_counter() - t0
+                st["publish"]["chunks"] = len(recs)
+            job["status"] = "done"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            job["finished"] = time.time()
@@ -1,63 +1,299 @@
 ﻿# src/answerer/rag_api.py
-import json, requests
+import os, sys, json, time, asyncio, hashlib, tempfile
 from pathlib import Path
-from fastapi import FastAPI, Body
-from pydantic import BaseModel
-import faiss, numpy as np
-from sentence_transformers import SentenceTransformer
+from typing import List
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
 
 ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from src.serving import metrics, tracing, profiling, budget, logs
+from src.serving.metrics import stage
+from src.serving.upstream import ollama_stream, UpstreamError, BudgetExceeded
+from src.serving.readiness import Loader
+from src.answerer.semantic_cache import SemanticCache
+from src.answerer.extractive import classify_risk, extractive_answer
+from src.answerer.structured import IncrementalJSON, ollama_format, parse_answer
+
+RAW = ROOT/'data'/'raw_pdfs'
 INDEX = ROOT/'data'/'index'/'faiss.index'
 META  = ROOT/'data'/'index'/'meta.json'
-PROMPT = (ROOT/'prompts'/'contract_qa.txt').read_text(encoding='utf-8')
+PROMPT_FILE = ROOT/'prompts'/'contract_qa.txt'
 
-OLLAMA = 'http://127.0.0.1:11434'
-LLM_MODEL = 'llama3.1:latest'
+OLLAMA = os.getenv('OLLAMA_URL', 'http://127.0.0.1:11434')
+LLM_MODEL = os.getenv('API_MODEL', 'llama3.1:latest')
 
-app = FastAPI(title='Contracts-RAG')
 
 class AskIn(BaseModel):
     question: str
     top_k: int = 6
 
-def load_index():
-    idx = faiss.read_index(str(INDEX))
-    meta = json.loads(META.read_text(encoding='utf-8'))
-    model = SentenceTransformer(meta.get("model", "nomic-embed-text:latest"))
-    recs = meta["records"]
-    return idx, model, recs
+class IngestIn(BaseModel):
+    paths: List[str]
+
+# faiss / the encoder / the index are loaded in the background
+# (see src/serving/readiness.py) so uvicorn is listening right away.
+def _load(loader):
+    with loader.step("read_prompt"):
+        prompt = PROMPT_FILE.read_text(encoding='utf-8')
+    with loader.step("import_faiss"):
+        from src.retriever.live_index import LiveIndex
+    with loader.step("import_extractor"):
+        from src.answerer.ingest_jobs import IngestJobs
+    with loader.step("import_encoder"):
+        from src.retriever.encoder import load_encoder
+    with loader.step("read_index"):
+        live = LiveIndex.load(INDEX, META)
+    with loader.step("load_model"):
+        embedder = load_encoder(live.model_name)  # None -> EMBED_MODEL
+    jobs = IngestJobs(live, lambda: embedder, INDEX, META)
+    return {"prompt": prompt, "live": live, "embedder": embedder, "jobs": jobs}
+
+def _warmup(res):
+    qemb = res["embedder"].encode(["warm-up query"], convert_to_numpy=True, normalize_embeddings=True)
+    index, records = res["live"].snapshot()
+    if records:
+        index.search(qemb.astype('float32'), 1)
 
-index, embedder, records = load_index()
+state = Loader("rag_api", _load, _warmup)
+# keyed by index generation + model + top_k, so every publish starts a fresh scope;
+# reuses the retrieval query embedding (no extra encode)
+ANSWERS = SemanticCache()
+logs.setup("rag_api")
+
+app = FastAPI(title='Contracts-RAG')
+metrics.install(app, "rag_api")
+tracing.install(app, "rag_api")
+profiling.install(app, "rag_api")
+budget.install(app)
+state.install(app)
 
 @app.get('/health')
 def health():
-    return {"ok": True, "records": len(records)}
+    if not state.ready:
+        return {"ok": True, "ready": False, "status": state.status}
+    return {"ok": True, "ready": True, "records": len(state.resources["live"])}
+
+def _allowed_path(p: str) -> Path:
+    path = Path(p)
+    path = (path if path.is_absolute() else ROOT/path).resolve()
+    if (ROOT/'data') not in path.parents or path.suffix.lower() != '.pdf' or not path.is_file():
+        raise HTTPException(400, f"not a PDF under data/: {p}")
+    return path
+
+def _sha1_file(f) -> str:
+    h = hashlib.sha1()
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+        h.update(chunk)
+    return h.hexdigest()
+
+def _store_upload(src, dest: Path) -> bool:
+    """
+    Stream an upload into data/raw_pdfs/<name> via a temp file (runs off the event loop).
+    False if a different file already has that name; an identical one is kept as is.
+    """
+    h = hashlib.sha1()
+    fd, tmp = tempfile.mkstemp(suffix=".part", dir=dest.parent)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: src.read(1 << 20), b""):
+                h.update(chunk)
+                out.write(chunk)
+        if dest.exists():
+            with dest.open("rb") as f:
+                return _sha1_file(f) == h.hexdigest()
+        os.replace(tmp, dest)
+        tmp = None
+        return True
+    finally:
+        if tmp is not None:
+            os.unlink(tmp)
+
+@app.post('/ingest', status_code=202)
+async def ingest(request: Request):
+    """
+    Enqueue PDFs for background ingestion. Accepts multipart uploads (files=...)
+    and/or server-side paths under data/ (form field or JSON {"paths": [...]}).
+    """
+    jobs = state.get()["jobs"]
+    paths = []
+    if request.headers.get("content-type", "").startswith("multipart/"):
+        form = await request.form()
+        RAW.mkdir(parents=True, exist_ok=True)
+        for up in form.getlist("files"):
+            name = Path(up.filename or "").name
+            if not name.lower().endswith('.pdf'):
+                raise HTTPException(400, f"not a PDF: {up.filename}")
+            dest = RAW/name
+            if not await asyncio.to_thread(_store_upload, up.file, dest):
+                raise HTTPException(409, f"a different {name} already exists in data/raw_pdfs")
+            paths.append(dest)
+        paths += [_allowed_path(p) for p in form.getlist("paths")]
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(400, "body must be JSON {\"paths\": [...]} or multipart")
+        if not isinstance(body, dict):
+            raise HTTPException(400, "body must be a JSON object {\"paths\": [...]}")
+        try:
+            inp = IngestIn(**body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        paths = [_allowed_path(p) for p in inp.paths]
+    if not paths:
+        raise HTTPException(400, "no files or paths given")
+    return jobs.submit(paths)
+
+@app.get('/ingest/{job_id}')
+def ingest_status(job_id: str):
+    job = state.get()["jobs"].get(job_id)
+    if job is None:
+        raise HTTPException(404, "unknown job")
+    return job
+
+def _encode(res, q: str):
+    with stage("encode"):
+        return res["embedder"].encode([q], convert_to_numpy=True, normalize_embeddings=True).astype('float32')
+
+def _scope(generation: int, top_k: int) -> str:
+    return f"corpus:{generation}:{LLM_MODEL}:{top_k}"
+
+def _search(index, records, qemb, top_k: int):
+    with stage("search"):
+        D, I = index.search(qemb, top_k)
+    keep = [(records[i], float(d)) for d, i in zip(D[0], I[0]) if 0 <= i < len(records)]
+    return [h for h, _ in keep], [d for _, d in keep]
+
+def _build_prompt(res, q: str, hits) -> str:
+    with stage("assemble"):
+        # Build snippets with ids
+        snippets = []
+        for j, h in enumerate(hits, start=1):
+            quoted = h['text'].replace('"', '\\"')[:1200]
+            snippets.append(f"- [c{j}] \"{quoted}\" (doc {h['doc_id']} clause {h['clause_id']})")
+
+        user = f"QUESTION: \"{q}\"\nSNIPPETS:\n" + "\n".join(snippets) + "\n[OUTPUT ONLY JSON]"
+        return f"{res['prompt']}\n\n{user}"
+
+def _generate(hits, prompt: str):
+    """
+    Schema-constrained Ollama answer, streamed. Yields ("token", piece) and
+    ("field", name, value) events; returns (the /ask response, object complete).
+    The generation is cut as soon as the JSON object closes or the parser gives
+    up on it (runaway / invalid output) instead of running to num_predict.
+    """
+    payload = {"model": LLM_MODEL, "prompt": prompt}
+    fmt = ollama_format()
+    if fmt is not None:
+        payload["format"] = fmt
+    parser, parts = IncrementalJSON(), []
+    gen = ollama_stream(OLLAMA, payload)
+    try:
+        for piece in gen:
+            parts.append(piece)
+            yield ("token", piece)
+            for name, value in parser.feed(piece):
+                yield ("field", name, value)
+            if parser.done or parser.error:
+                break
+    finally:
+        gen.close()
+    txt = "".join(parts).strip()
+    data, result = parse_answer(txt, parser)
+    if data is None:
+        return {"ok": True, "raw": txt, "snippets": hits, "parse": result}, False
+    return {"ok": True, "answer": data, "snippets": hits, "parse": result}, parser.done
+
+def _drain(gen):
+    while True:
+        try:
+            next(gen)
+        except StopIteration as done:
+            return done.value
 
 @app.post('/ask')
 def ask(inp: AskIn):
+    res = state.get()
     q = inp.question.strip()
-    qemb = embedder.encode([q], convert_to_numpy=True, normalize_embeddings=True).astype('float32')
-    D, I = index.search(qemb, inp.top_k)
-    hits = [records[i] for i in I[0] if i < len(records)]
-
-    # Build snippets with ids
-    snippets = []
-    for j, h in enumerate(hits, start=1):
-        snippets.append(f"- [c{j}] \"{h['text'].replace('\"','\\\"')[:1200]}\" (doc {h['doc_id']} clause {h['clause_id']})")
-
-    user = f"QUESTION: \"{q}\"\nSNIPPETS:\n" + "\n".join(snippets) + "\n[OUTPUT ONLY JSON]"
-    prompt = f"{PROMPT}\n\n{user}"
-
-    # Call Ollama
-    r = requests.post(f"{OLLAMA}/api/generate",
-                      json={"model": LLM_MODEL, "prompt": prompt, "stream": False})
-    if r.status_code != 200:
-        return {"ok": False, "error": r.text}
-
-    txt = r.json().get("response","").strip()
-    # Try parse JSON response
+    qemb = _encode(res, q)
+    index, records, generation = res["live"].versioned()
+    scope = _scope(generation, inp.top_k)
+    hit = ANSWERS.lookup(scope, qemb[0])
+    if hit:
+        cached, info = hit
+        return {**cached, "source": "semantic_cache", "cache": info}
+    hits, _ = _search(index, records, qemb, inp.top_k)
+    prompt = _build_prompt(res, q, hits)
+
+    # Call Ollama (JSON schema constrained, parsed while streaming)
     try:
-        data = json.loads(txt)
-        return {"ok": True, "answer": data, "snippets": hits}
-    except:
-        return {"ok": True, "raw": txt, "snippets": hits}
+        out, complete = _drain(_generate(hits, prompt))
+    except (UpstreamError, BudgetExceeded) as e:
+        return {"ok": False, "error": e.detail}
+    if complete:
+        ANSWERS.store(scope, qemb[0], q, out)
+    return {**out, "source": "llm"}
+
+@app.post('/ask/progressive')
+def ask_progressive(inp: AskIn):
+    """
+    Same question as /ask, answered twice over one NDJSON stream:
+      {"type": "extractive", ...}  right after retrieval: extractive answer, risk, citations
+      {"type": "token", "text"}    LLM output pieces as Ollama produces them
+      {"type": "field", "name", "value"}  each answer field (verdict, risk_level...) once complete
+      {"type": "final", ...}       the /ask response (parsed JSON answer, or "raw")
+      {"type": "error", ...}       instead of "final" if the LLM call fails
+    The LLM prompt reuses the snippets already retrieved for the extractive answer.
+    """
+    t0 = time.perf_counter()
+    res = state.get()
+    q = inp.question.strip()
+    qemb = _encode(res, q)
+    index, records, generation = res["live"].versioned()
+    hits, scores = _search(index, records, qemb, inp.top_k)
+    with stage("extractive"):
+        answer = extractive_answer(q, [h['text'] for h in hits])
+        first = {"type": "extractive", "answer": answer, "risk": classify_risk(answer),
+                 "citations": [{"doc_id": h.get('doc_id'), "clause_id": h.get('clause_id'), "page": h.get('page'),
+                                "score": sc, "text": h['text']} for h, sc in zip(hits, scores)]}
+    scope = _scope(generation, inp.top_k)
+    hit = ANSWERS.lookup(scope, qemb[0])
+    prompt = None if hit else _build_prompt(res, q, hits)
+
+    def ms():
+        return round((time.perf_counter() - t0) * 1000, 1)
+
+    def lines():
+        yield json.dumps({**first, "ms": ms()}, ensure_ascii=False) + "\n"
+        if hit:
+            cached, info = hit
+            yield json.dumps({"type": "final", **cached, "source": "semantic_cache", "cache": info, "ms": ms()},
+                             ensure_ascii=False) + "\n"
+            return
+        gen = _generate(hits, prompt)
+        try:
+            while True:
+                try:
+                    ev = next(gen)
+                except StopIteration as done:
+                    final, complete = done.value
+                    break
+                if ev[0] == "token":
+                    yield json.dumps({"type": "token", "text": ev[1]}, ensure_ascii=False) + "\n"
+                else:
+                    yield json.dumps({"type": "field", "name": ev[1], "value": ev[2]}, ensure_ascii=False) + "\n"
+        except (UpstreamError, BudgetExceeded) as e:
+            yield json.dumps({"type": "error", "ok": False, "error": e.detail, "ms": ms()}) + "\n"
+            return
+        except Exception as e:
+            yield json.dumps({"type": "error", "ok": False, "error": f"{type(e).__name__}: {e}", "ms": ms()}) + "\n"
+            return
+        if complete:
+            ANSWERS.store(scope, qemb[0], q, final)
+        yield json.dumps({"type": "final", **final, "source": "llm", "ms": ms()}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,58 @@
+# src/answerer/risk.py
+"""
+Keyword-tier risk scoring (low / medium / high), built once, scored in batches.
+
+Same rule as the original per-answer classify_risk: a text is "high" if it
+contains any HIGH_RISK phrase, else "medium" if it contains any MEDIUM_RISK
+phrase, else "low" (case-insensitive substring match). RiskEngine keeps the
+tiers lowercased and ordered highest first, and score() returns one int8 code
+per text for a whole batch (0 low, 1 medium, 2 high).
+
+The inner test stays a plain substring search: CPython's `in` runs the
+search in C and stops at the first hit. Joining the batch and running one
+regex alternation per tier over it measured 2-2.5x slower; one str.find per
+keyword over the joined text measured about the same as per-text `in`.
+
+Per-chunk risk is stored at ingest time:
+    api/ingest.py                   "risk" column of data/index/meta.parquet
+    src/extract/extractor.py        "risk" field of every clause record
+so corpus summaries (GET /risk/summary on api/rag_api.py) are a column read.
+"""
+import numpy as np
+
+LEVELS = ("low", "medium", "high")
+HIGH_RISK = ["terminate immediately", "material breach", "liquidated damages", "penalty", "default", "forfeit"]
+MEDIUM_RISK = ["notice", "30 days", "cure period", "renewal", "termination", "late fee", "indemn"]
+
+
+class RiskEngine:
+    def __init__(self, tiers=(("high", HIGH_RISK), ("medium", MEDIUM_RISK))):
+        tiers = sorted(((LEVELS.index(level), tuple(w.lower() for w in words)) for level, words in tiers),
+                       reverse=True)
+        self._tiers = tuple(tiers)
+
+    def _code(self, text: str) -> int:
+        t = (text or "").lower()
+        for level, words in self._tiers:
+            for w in words:
+                if w in t:
+                    return level
+        return 0
+
+    def score(self, texts) -> np.ndarray:
+        """Risk level index per text (0 low, 1 medium, 2 high), as int8."""
+        code = self._code
+        return np.fromiter((code(t) for t in texts), dtype="int8")
+
+    def labels(self, texts):
+        return [LEVELS[c] for c in self.score(texts)]
+
+    def classify(self, text: str) -> str:
+        return LEVELS[self._code(text)]
+
+
+RISK = RiskEngine()
+
+
+def classify_risk(answer: str) -> str:
+    return RISK.classify(answer)
@@ -0,0 +1,129 @@
+# src/answerer/semantic_cache.py
+"""
+Semantic answer cache, scoped per contract.
+
+Questions are embedded (MiniLM, CONTRACT_EMBED_MODEL, or whatever query
+vector the caller already has) and compared by cosine similarity with the
+questions already answered in the same scope; at or above SEMCACHE_THRESHOLD
+the stored answer is returned instead of generating a new one, so
+"can I cancel early?" and "early termination penalty?" share one generation.
+
+Scopes are opaque strings built by the apps, e.g.
+    f"{contract_sha1}:{context_key}:{llm_model}"  simple_backend (context_key: hash of extraContext)
+    f"{contract_sha1}:{llm_model}"                llm_server
+    f"corpus:{generation}:{llm_model}:{top_k}"    src/answerer/rag_api.py (every publish starts a new scope)
+
+Each scope holds a float32 matrix of normalized question vectors plus the
+answers; entries expire after SEMCACHE_TTL_S, a scope keeps at most
+SEMCACHE_PER_SCOPE entries (least recently used evicted) and at most
+SEMCACHE_SCOPES scopes are kept (LRU). SEMCACHE=0 disables it.
+"""
+import os, time, threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.serving.metrics import SEMANTIC_CACHE
+from src.answerer.contract_store import load_embedder, CONTRACT_EMBED_MODEL
+
+SEMCACHE = os.getenv("SEMCACHE", "1") != "0"
+SEMCACHE_THRESHOLD = float(os.getenv("SEMCACHE_THRESHOLD", "0.85"))
+SEMCACHE_PER_SCOPE = int(os.getenv("SEMCACHE_PER_SCOPE", "256"))
+SEMCACHE_SCOPES = int(os.getenv("SEMCACHE_SCOPES", "512"))
+SEMCACHE_TTL_S = float(os.getenv("SEMCACHE_TTL_S", "86400"))
+
+
+class _Scope:
+    __slots__ = ("vecs", "entries", "used")
+
+    def __init__(self, dim: int):
+        self.vecs = np.zeros((0, dim), dtype="float32")
+        self.entries = []   # {"question", "answer", "ts", "hits"}
+        self.used = []      # last use (monotonic) per row, for LRU eviction
+
+    def drop(self, rows) -> None:
+        keep = np.ones(len(self.entries), dtype=bool)
+        keep[list(rows)] = False
+        self.vecs = self.vecs[keep]
+        self.entries = [e for e, k in zip(self.entries, keep) if k]
+        self.used = [u for u, k in zip(self.used, keep) if k]
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = SEMCACHE_THRESHOLD, model_name: str = CONTRACT_EMBED_MODEL,
+                 per_scope: int = SEMCACHE_PER_SCOPE, scopes: int = SEMCACHE_SCOPES, ttl: float = SEMCACHE_TTL_S):
+        self.threshold, self.model_name = threshold, model_name
+        self.per_scope, self.max_scopes, self.ttl = per_scope, scopes, ttl
+        self.enabled = SEMCACHE
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed(self, question: str) -> np.ndarray:
+        v = load_embedder(self.model_name).encode([question], normalize_embeddings=True)
+        return np.asarray(v, dtype="float32")[0]
+
+    @staticmethod
+    def _norm(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype="float32").reshape(-1)
+        n = float(np.linalg.norm(v))
+        return v / n if n > 0 else v
+
+    def lookup(self, scope: str, vec):
+        """Best cached answer in scope at/above the threshold: (answer, info) or None."""
+        if not self.enabled:
+            return None
+        v = self._norm(vec)
+        now = time.time()
+        with self._lock:
+            sc = self._scopes.get(scope)
+            if sc is None or not sc.entries or sc.vecs.shape[1] != v.shape[0]:
+                SEMANTIC_CACHE.inc(result="miss")
+                return None
+            self._scopes.move_to_end(scope)
+            expired = [i for i, e in enumerate(sc.entries) if now - e["ts"] > self.ttl]
+            if expired:
+                sc.drop(expired)
+                if not sc.entries:
+                    SEMANTIC_CACHE.inc(result="miss")
+                    return None
+            sims = sc.vecs @ v
+            i = int(np.argmax(sims))
+            score = float(sims[i])
+            if score < self.threshold:
+                SEMANTIC_CACHE.inc(result="miss")
+                return None
+            e = sc.entries[i]
+            e["hits"] += 1
+            sc.used[i] = time.monotonic()
+            SEMANTIC_CACHE.inc(result="hit")
+            return e["answer"], {"source": "semantic_cache", "score": round(score, 4),
+                                 "matched_question": e["question"]}
+
+    def store(self, scope: str, vec, question: str, answer) -> None:
+        if not self.enabled:
+            return
+        v = self._norm(vec)
+        with self._lock:
+            sc = self._scopes.get(scope)
+            if sc is None or sc.vecs.shape[1] != v.shape[0]:
+                sc = self._scopes[scope] = _Scope(v.shape[0])
+            self._scopes.move_to_end(scope)
+            if sc.entries:
+                sims = sc.vecs @ v
+                i = int(np.argmax(sims))
+                if sims[i] >= 0.999:   # same question again: refresh instead of duplicating
+                    sc.entries[i].update(answer=answer, ts=time.time())
+                    sc.used[i] = time.monotonic()
+                    return
+            if len(sc.entries) >= self.per_scope:
+                sc.drop([int(np.argmin(sc.used))])
+            sc.vecs = np.vstack([sc.vecs, v[None, :]])
+            sc.entries.append({"question": question, "answer": answer, "ts": time.time(), "hits": 0})
+            sc.used.append(time.monotonic())
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": self.enabled, "threshold": self.threshold, "scopes": len(self._scopes),
+                    "entries": sum(len(s.entries) for s in self._scopes.values())}
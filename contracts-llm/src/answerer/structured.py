@@ -0,0 +1,154 @@
+# src/answerer/structured.py
+"""
+Schema-constrained answers for prompts/contract_qa.txt.
+
+ANSWER_SCHEMA is the verdict / supporting_quotes / citations / risk_level /
+notes object the prompt asks for. It is handed to Ollama as
+payload["format"] = ollama_format(), so decoding is constrained instead of
+hoping for valid JSON. (llm_server and simple_backend answer in prose, not
+this schema, so their OpenAI-compatible payloads stay unconstrained.)
+STRUCTURED_OUTPUT=schema (default) | json (plain JSON mode, older Ollama) | off.
+
+IncrementalJSON parses the streamed text as it arrives: each top-level field
+is returned as soon as its value is complete, and the caller can stop the
+generation once the object is closed or the output runs away (prose before
+the object, more than STRUCTURED_MAX_CHARS). Outcomes are counted in
+contracts_structured_output_total{result="ok|repaired|failed|aborted"}.
+"""
+import os, json
+
+from src.serving.metrics import STRUCTURED_OUTPUT
+
+STRUCTURED_MODE = os.getenv("STRUCTURED_OUTPUT", "schema").lower()
+STRUCTURED_MAX_CHARS = int(os.getenv("STRUCTURED_MAX_CHARS", "8000"))
+MAX_PREAMBLE_CHARS = 2000
+RUNAWAY = ("too_long", "no_object")
+
+ANSWER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdict": {"type": "string"},
+        "supporting_quotes": {"type": "array", "items": {"type": "string"}},
+        "citations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "doc_id": {"type": "string"},
+                    "page": {"type": ["integer", "null"]},
+                    "clause_id": {"type": "string"},
+                },
+                "required": ["doc_id", "clause_id"],
+            },
+        },
+        "risk_level": {"type": "string", "enum": ["low", "medium", "high"]},
+        "notes": {"type": "string"},
+    },
+    "required": ["verdict", "supporting_quotes", "citations", "risk_level"],
+}
+
+
+def ollama_format():
+    """Value for Ollama's "format" field (None = leave unconstrained)."""
+    if STRUCTURED_MODE == "schema":
+        return ANSWER_SCHEMA
+    if STRUCTURED_MODE == "json":
+        return "json"
+    return None
+
+
+class IncrementalJSON:
+    """
+    Feed text pieces of one JSON object; feed() returns the top-level
+    (key, value) pairs completed by that piece. done: the object closed.
+    error: why parsing gave up (runaway / invalid), None while healthy.
+    """
+
+    def __init__(self, max_chars: int = STRUCTURED_MAX_CHARS):
+        self.max_chars = max_chars
+        self.buf = ""
+        self.fields = {}
+        self.done, self.error = False, None
+        self._i = 0              # next char to scan
+        self._start = None       # start of the current top-level member
+        self._depth = 0
+        self._in_str = self._esc = False
+
+    def _member(self, end: int):
+        seg = self.buf[self._start:end].strip()
+        if not seg:
+            return []
+        try:
+            items = list(json.loads("{" + seg + "}").items())
+        except ValueError:
+            self.error = "invalid"
+            return []
+        self.fields.update(items)
+        return items
+
+    def feed(self, piece: str):
+        if self.done or self.error:
+            return []
+        self.buf += piece
+        if len(self.buf) > self.max_chars:
+            self.error = "too_long"
+            return []
+        out = []
+        buf, n = self.buf, len(self.buf)
+        while self._i < n and not self.error:
+            ch = buf[self._i]
+            if self._start is None:             # before the opening brace (fences, prose)
+                if ch == "{":
+                    self._depth, self._start = 1, self._i + 1
+                elif self._i >= MAX_PREAMBLE_CHARS:
+                    self.error = "no_object"
+            elif self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    out += self._member(self._i)
+                    self.done = True
+                    self._i += 1
+                    break
+            elif ch == "," and self._depth == 1:
+                out += self._member(self._i)
+                self._start = self._i + 1
+            self._i += 1
+        return out
+
+
+def parse_answer(text: str, parser: IncrementalJSON = None):
+    """
+    Final parse of a generation: (data, result) with result "ok" (the text is
+    the JSON object), "repaired" (object recovered from around fences/prose, or
+    the complete fields of a cut-off object), "aborted" (the stream was cut
+    for running away; data = the fields completed so far, if any) or "failed"
+    (data None).
+    Records the outcome in contracts_structured_output_total.
+    """
+    text = (text or "").strip()
+    if parser is not None and parser.error in RUNAWAY:
+        data = dict(parser.fields) or None
+        STRUCTURED_OUTPUT.inc(result="aborted")
+        return data, "aborted"
+    try:
+        data = json.loads(text)
+        result = "ok" if isinstance(data, dict) else "failed"
+    except ValueError:
+        if parser is None:
+            parser = IncrementalJSON(max_chars=max(len(text), 1))
+            parser.feed(text)
+        data = dict(parser.fields) if parser.fields and parser.error != "invalid" else None
+        result = "repaired" if data else "failed"
+    STRUCTURED_OUTPUT.inc(result=result)
+    return (data if result != "failed" else None), result
@@ -1,49 +1,86 @@
 ﻿# src/extract/extractor.py
-import os, json, sys, pathlib, re
+import os, json, sys, pathlib
 from pathlib import Path
-import fitz  # PyMuPDF
 
 ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from src.extract.tagger import get_tagger
+from src.extract.segmenter import segment, span_text, heading_path
+from src.extract.ocr import extract_pages, join_pages, page_of
+from src.answerer.risk import RISK
+
 RAW = ROOT/'data'/'raw_pdfs'
 OCR_PDFS = ROOT/'data'/'ocr_pdfs'
 OCR_TXT = ROOT/'data'/'ocr_text'
 JSONL = ROOT/'data'/'jsonl'
-ONTO = json.loads((ROOT/'data'/'ontology.json').read_text(encoding='utf-8'))
+ONTO = json.loads((ROOT/'data'/'ontology.json').read_text(encoding='utf-8-sig'))
 
 def ensure_dirs():
     for p in [OCR_PDFS, OCR_TXT, JSONL]:
         p.mkdir(parents=True, exist_ok=True)
 
 def doc_to_text(pdf_path: Path) -> str:
-    doc = fitz.open(pdf_path)
-    parts = []
-    for page in doc:
-        parts.append(page.get_text("text"))
-    return "\n".join(parts)
+    """Native text layer per page, OCR (tesseract) only for pages without one."""
+    text, _ = join_pages(extract_pages(pdf_path))
+    return text
 
 def naive_clause_split(text: str):
-    """Very simple split by headings / common markers; replace with something smarter later."""
-    chunks = re.split(r'(?mi)^\s*(section\s+\d+\.?|article\s+\d+\.?|clause\s+\d+\.?)', text)
-    out = []
-    cur = []
-    for ch in chunks:
-        if re.match(r'(?mi)^\s*(section|article|clause)\s+\d+\.?', ch or ""):
-            if cur:
-                out.append("\n".join(cur).strip())
-                cur = []
-        cur.append(ch)
-    if cur: out.append("\n".join(cur).strip())
-    # fallback if nothing split:
-    if len(out) <= 1: out = re.split(r'\n{2,}', text)
-    return [c.strip() for c in out if c.strip()]
+    """Clause bodies as strings; see src/extract/segmenter.py for the span API."""
+    return [span_text(text, sp) for sp in segment(text)]
 
 def tag_clause_id(clause: str):
-    """Heuristic tag using ontology signals."""
-    clause_l = clause.lower()
-    for ct in ONTO["clause_types"]:
-        if any(sig in clause_l for sig in ct["signals"]):
-            return ct["id"]
-    return "other"
+    """Best ontology label for a clause ("other" if no signal fires)."""
+    return get_tagger().best(clause)
+
+def tag_clause_labels(clauses):
+    """Scored multi-labels for a batch of clauses (see src/extract/tagger.py)."""
+    return get_tagger().tag_many(clauses)
+
+def extract_records(pdf: Path, stats: dict = None):
+    """Text -> clause spans -> tagged JSONL records for one PDF (None if no text)."""
+    page_starts = None
+    try:
+        text, page_starts = join_pages(extract_pages(pdf, stats=stats))
+    except (ImportError, RuntimeError, OSError, ValueError) as e:
+        # unreadable/corrupt PDF (fitz raises RuntimeError subclasses) or no PyMuPDF
+        print(f"[extract] {pdf.name}: {type(e).__name__}: {e}")
+        text = ""
+    if not text.strip():
+        # older runs of ingest.ps1 left OCR'd text next to the PDFs
+        txt_candidate = (OCR_TXT/pdf.with_suffix('.txt').name)
+        if not txt_candidate.exists():
+            return None
+        text = txt_candidate.read_text(encoding='utf-8', errors='ignore')
+        page_starts = None
+    return records_from_text(text, pdf.name, page_starts)
+
+def records_from_text(text: str, doc_id: str, page_starts=None):
+    """Clause spans -> tagged records for already extracted text (PDF or pasted contract)."""
+    spans = segment(text)
+    clauses = [span_text(text, sp) for sp in spans]
+    labels = tag_clause_labels(clauses)
+    risks = RISK.labels(clauses)
+    recs = []
+    for i, (sp, c, lab, risk) in enumerate(zip(spans, clauses, labels, risks)):
+        recs.append({
+            "doc_id": doc_id,
+            "page": page_of(page_starts, sp.start) if page_starts else None,
+            "clause_id": lab[0]["id"] if lab else "other",
+            "labels": [{"id": l["id"], "score": l["score"]} for l in lab],
+            "heading": heading_path(spans, i),
+            "risk": risk,
+            "span": [sp.start, sp.end],
+            "text": c
+        })
+    return recs
+
+def write_records(pdf: Path, recs) -> Path:
+    out_path = JSONL/(pdf.stem + '.clauses.jsonl')
+    with out_path.open('w', encoding='utf-8') as f:
+        for rec in recs:
+            f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+    return out_path
 
 def run():
     ensure_dirs()
@@ -52,29 +89,14 @@ def run():
         print('[extractor] Put PDFs in data/raw_pdfs and re-run.')
         return
     for pdf in files:
-        try:
-            text = doc_to_text(pdf)
-        except Exception:
-            # if PDF is image-based, try OCR’d PDF text (produced by ingest.ps1)
-            txt_candidate = (OCR_TXT/pdf.with_suffix('.txt').name)
-            if txt_candidate.exists():
-                text = txt_candidate.read_text(encoding='utf-8', errors='ignore')
-            else:
-                print(f'[extractor] No text for {pdf.name}')
-                continue
-        clauses = naive_clause_split(text)
-        out_path = JSONL/(pdf.stem + '.clauses.jsonl')
-        with out_path.open('w', encoding='utf-8') as f:
-            for i, c in enumerate(clauses):
-                cid = tag_clause_id(c)
-                rec = {
-                    "doc_id": pdf.name,
-                    "page": None,
-                    "clause_id": cid,
-                    "text": c
-                }
-                f.write(json.dumps(rec, ensure_ascii=False) + '\n')
-        print(f'[extractor] Wrote {out_path} ({len(clauses)} clauses)')
+        stats = {}
+        recs = extract_records(pdf, stats)
+        if recs is None:
+            print(f'[extractor] No text for {pdf.name}')
+            continue
+        out_path = write_records(pdf, recs)
+        ocr = f", OCR {stats['ocr_pages']}/{stats['pages']} pages in {stats['ocr_seconds']}s" if stats.get("ocr_pages") else ""
+        print(f'[extractor] Wrote {out_path} ({len(recs)} clauses{ocr})')
 
 if __name__ == "__main__":
-    run()
+    run()
\ No newline at end of file
@@ -0,0 +1,117 @@
+# src/extract/ocr.py
+"""
+Per-page OCR stage for the ingest pipeline.
+
+Each page keeps its native text layer when it has one; only pages without
+usable text are rendered and sent to a local `tesseract` binary. OCR jobs run
+in a worker pool (tesseract is a subprocess, so threads are enough to keep
+every core busy) and results are cached by sha1 of the rendered page image in
+data/ocr_cache/, so re-ingesting a document never re-OCRs the same page.
+
+Env: OCR_WORKERS (default cpu count), OCR_DPI (300), OCR_LANG (eng),
+TESSERACT_CMD (tesseract), OCR_MIN_CHARS (25).
+"""
+import os, hashlib, shutil, subprocess, time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+OCR_CACHE = ROOT/'data'/'ocr_cache'
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 2)))
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", "tesseract")
+MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "25"))
+
+
+def page_needs_ocr(page, text: str = None) -> bool:
+    """No usable text layer but something drawn on the page (scan / image)."""
+    if text is None:
+        text = page.get_text("text")
+    if len(text.strip()) >= MIN_CHARS:
+        return False
+    return bool(page.get_images(full=False)) or bool(page.get_drawings())
+
+
+def tesseract_available() -> bool:
+    return shutil.which(TESSERACT_CMD) is not None
+
+
+def _ocr_png(png: bytes, lang: str = OCR_LANG) -> str:
+    key = hashlib.sha1(png).hexdigest()
+    cached = OCR_CACHE/f"{key}.{lang}.txt"
+    if cached.exists():
+        return cached.read_text(encoding='utf-8')
+    try:
+        proc = subprocess.run([TESSERACT_CMD, "stdin", "stdout", "-l", lang],
+                              input=png, capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        # one bad page must not cost the rest of the document; not cached, so retried next time
+        err = getattr(e, "stderr", None) or b""
+        print(f"[ocr] tesseract failed on page {key[:12]}: {e} {err.decode('utf-8', 'ignore').strip()[:200]}")
+        return ""
+    text = proc.stdout.decode("utf-8", errors="ignore")
+    OCR_CACHE.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_suffix(".tmp")
+    tmp.write_text(text, encoding='utf-8')
+    os.replace(tmp, cached)
+    return text
+
+
+def extract_pages(pdf_path: Path, workers: int = None, stats: dict = None):
+    """
+    Return one text per page, OCR'ing only pages without a text layer.
+    If `stats` is given it is filled with page counts and OCR wall time.
+    """
+    import fitz  # PyMuPDF
+
+    # closed even if rendering or OCR raises (an open handle locks the PDF on Windows)
+    with fitz.open(pdf_path) as doc:
+        texts, todo = [], []
+        for i, page in enumerate(doc):
+            native = page.get_text("text")
+            if page_needs_ocr(page, native):
+                todo.append(i)
+                texts.append("")
+            else:
+                texts.append(native)
+
+        t0 = time.perf_counter()
+        if todo and tesseract_available():
+            # render in this thread (fitz documents are not thread-safe), OCR in the pool;
+            # at most 2 pages per worker are rendered ahead, so big scans aren't held in memory
+            n_workers = max(1, workers or OCR_WORKERS)
+            with ThreadPoolExecutor(max_workers=n_workers) as pool:
+                pending = {}
+                for i in todo:
+                    if len(pending) >= 2*n_workers:
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for fut in finished:
+                            texts[pending.pop(fut)] = fut.result()
+                    png = doc[i].get_pixmap(dpi=OCR_DPI).tobytes("png")
+                    pending[pool.submit(_ocr_png, png)] = i
+                for fut, i in pending.items():
+                    texts[i] = fut.result()
+        elif todo:
+            print(f"[ocr] {Path(pdf_path).name}: {len(todo)} scanned page(s) but '{TESSERACT_CMD}' not found")
+
+    if stats is not None:
+        stats.update({"pages": len(texts), "ocr_pages": len(todo),
+                      "ocr_seconds": round(time.perf_counter() - t0, 3)})
+    return texts
+
+
+def join_pages(texts):
+    """Join page texts; returns (text, page_starts) for offset -> page lookups."""
+    starts, pos = [], 0
+    for t in texts:
+        starts.append(pos)
+        pos += len(t) + 1
+    return "\n".join(texts), starts
+
+
+def page_of(page_starts, offset: int) -> int:
+    """1-based page number containing a character offset of the joined text."""
+    return bisect_right(page_starts, offset)
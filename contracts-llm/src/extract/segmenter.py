@@ -0,0 +1,106 @@
+# src/extract/segmenter.py
+"""
+Single-pass clause segmentation.
+
+One compiled multiline regex finds every heading marker (ARTICLE / SECTION /
+CLAUSE n, numbered "1." / "2.3" (title on the same or the next line, as OCR
+often splits them), lettered "A." / "(B)" / "(a)" / "b)" / "(iv)", and ALL-CAPS
+heading lines) in a single finditer over the text. Clauses are returned as
+Span offsets into the original string, so multi-MB OCR text is never copied;
+slice with span_text() only when the body is actually needed.
+"""
+import re
+from collections import namedtuple
+
+# start/end: body offsets (heading included), kind: marker type,
+# label: heading text, level: depth (0 = top), parent: index of enclosing span or None
+Span = namedtuple("Span", "start end kind label level parent")
+
+HEADING_RE = re.compile(
+    r"^[ \t]*(?:"
+    r"(?P<article>(?i:article)[ \t]+(?:\d+|[IVXLCivxlc]+)\b\.?)"
+    r"|(?P<section>(?i:section)[ \t]+\d+(?:\.\d+)*\.?)"
+    r"|(?P<clause>(?i:clause)[ \t]+\d+(?:\.\d+)*\.?)"
+    r"|(?P<num>(?:\d{1,3}(?:\.\d{1,3})*[.)]|\d{1,3}(?:\.\d{1,3})+)(?=[ \t]+[A-Z]|[ \t]*\r?\n[ \t]*[A-Z]))"
+    r"|(?P<upper>\([A-Z]\)|[A-Z][.)])(?=[ \t]+[A-Z(\"])"
+    r"|(?P<letter>\((?:[a-z]|[ivx]{1,4})\)|[a-z]\))(?=[ \t]+\S)"
+    r"|(?P<caps>[A-Z][A-Z0-9&,'/()\- ]{2,78}[A-Z)])[ \t]*$"
+    r")",
+    re.M,
+)
+PARA_RE = re.compile(r"\n[ \t]*\n")
+
+_BASE_LEVEL = {"article": 0, "caps": 1, "section": 2, "clause": 2, "num": 2, "upper": 5, "letter": 6}
+
+
+def _level(kind: str, label: str) -> int:
+    if kind == "num":
+        return _BASE_LEVEL["num"] + label.rstrip(".)").count(".")
+    return _BASE_LEVEL[kind]
+
+
+def _trim(text: str, start: int, end: int):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end-1].isspace():
+        end -= 1
+    return start, end
+
+
+def _caps_ok(label: str) -> bool:
+    # at least 4 letters and not just a page artefact like "PAGE 2" or a roman numeral
+    letters = sum(c.isalpha() for c in label)
+    return letters >= 4 and not label.startswith("PAGE ")
+
+
+def segment(text: str):
+    """Return [Span] covering text, with heading hierarchy via Span.parent."""
+    marks = []
+    for m in HEADING_RE.finditer(text):
+        kind = m.lastgroup
+        label = m.group(kind).strip()
+        if kind == "caps" and not _caps_ok(label):
+            continue
+        marks.append((m.start(kind), kind, label))
+
+    spans = []
+    if not marks:
+        pos = 0
+        for m in PARA_RE.finditer(text):
+            s, e = _trim(text, pos, m.start())
+            if s < e:
+                spans.append(Span(s, e, "para", "", 0, None))
+            pos = m.end()
+        s, e = _trim(text, pos, len(text))
+        if s < e:
+            spans.append(Span(s, e, "para", "", 0, None))
+        return spans
+
+    s, e = _trim(text, 0, marks[0][0])
+    if s < e:
+        spans.append(Span(s, e, "preamble", "", 0, None))
+
+    stack = []  # indexes into spans of currently open headings
+    for i, (start, kind, label) in enumerate(marks):
+        end = marks[i+1][0] if i+1 < len(marks) else len(text)
+        s, e = _trim(text, start, end)
+        level = _level(kind, label)
+        while stack and spans[stack[-1]].level >= level:
+            stack.pop()
+        spans.append(Span(s, e, kind, label, level, stack[-1] if stack else None))
+        stack.append(len(spans)-1)
+    return spans
+
+
+def span_text(text: str, span: Span) -> str:
+    return text[span.start:span.end]
+
+
+def heading_path(spans, i: int):
+    """Labels from the outermost heading down to spans[i]."""
+    path = []
+    while i is not None:
+        if spans[i].label:
+            path.append(spans[i].label)
+        i = spans[i].parent
+    return path[::-1]
@@ -0,0 +1,158 @@
+# src/extract/tagger.py
+"""
+Multi-label clause tagger compiled once from data/ontology.json.
+
+All signals of all clause types go into a single Aho-Corasick automaton, so a
+clause is scanned once no matter how many types/signals the ontology grows to.
+Uses pyahocorasick when installed, otherwise a pure-Python automaton.
+
+Word boundaries: a signal must start at a word boundary. Short signals
+(< PREFIX_MIN chars, e.g. "cap", "term") must also end at one, allowing only
+an inflectional ending (INFLECTIONS: "terms", "losses", "cured"), so they
+don't fire inside "capital" or "terminate"; longer ones match as word
+prefixes ("assign" -> "assignment", "renew" -> "renewal").
+"""
+import json
+from collections import defaultdict, deque
+from functools import lru_cache
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+ONTO_PATH = ROOT/'data'/'ontology.json'
+PREFIX_MIN = 5
+INFLECTIONS = frozenset({"s", "es", "d", "ed", "ing"})
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class _PyAutomaton:
+    """Minimal Aho-Corasick (dict trie + failure links)."""
+
+    def __init__(self, words):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for value, word in words:
+            node = 0
+            for ch in word:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({}); self.fail.append(0); self.out.append([])
+                node = nxt
+            self.out[node].append(value)
+        # BFS for failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter(self, text: str):
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for value in out[node]:
+                    yield i, value
+
+
+def _build_automaton(words):
+    try:
+        import ahocorasick
+    except ImportError:
+        return _PyAutomaton(words)
+    A = ahocorasick.Automaton()
+    by_word = defaultdict(list)
+    for value, word in words:
+        by_word[word].append(value)
+    for word, values in by_word.items():
+        A.add_word(word, tuple(values))
+    A.make_automaton()
+
+    class _Wrapped:
+        def iter(self, text):
+            for end, values in A.iter(text):
+                for value in values:
+                    yield end, value
+    return _Wrapped()
+
+
+class ClauseTagger:
+    def __init__(self, clause_types):
+        self.types = [ct["id"] for ct in clause_types]
+        self.signals = []          # (type index, signal text)
+        self.n_signals = []
+        words = []
+        for ti, ct in enumerate(clause_types):
+            sigs = sorted({s.lower().strip() for s in ct.get("signals", []) if s.strip()})
+            self.n_signals.append(len(sigs))
+            for s in sigs:
+                words.append((len(self.signals), s))
+                self.signals.append((ti, s))
+        self.automaton = _build_automaton(words)
+
+    @classmethod
+    def from_ontology(cls, path: Path = ONTO_PATH):
+        onto = json.loads(Path(path).read_text(encoding='utf-8-sig'))
+        return cls(onto["clause_types"])
+
+    def _scan(self, text_l: str):
+        n = len(text_l)
+        for end, si in self.automaton.iter(text_l):
+            ti, sig = self.signals[si]
+            start = end - len(sig) + 1
+            if start > 0 and _is_word(text_l[start-1]) and _is_word(sig[0]):
+                continue
+            if len(sig) < PREFIX_MIN and end+1 < n and _is_word(text_l[end+1]) and _is_word(sig[-1]):
+                j = end+1
+                while j < n and _is_word(text_l[j]):
+                    j += 1
+                if text_l[end+1:j] not in INFLECTIONS:
+                    continue
+            yield ti, si
+
+    def tag(self, text: str, min_score: float = 0.0):
+        """
+        Return [{"id", "score", "hits", "signals"}] best first.
+        score = share of the type's signals present (0..1); hits = occurrences.
+        """
+        hits = defaultdict(int)
+        seen = defaultdict(set)
+        for ti, si in self._scan((text or "").lower()):
+            hits[ti] += 1
+            seen[ti].add(self.signals[si][1])
+        labels = []
+        for ti, sigs in seen.items():
+            score = len(sigs) / self.n_signals[ti]
+            if score >= min_score:
+                labels.append({"id": self.types[ti], "score": round(score, 3),
+                               "hits": hits[ti], "signals": sorted(sigs), "_order": ti})
+        labels.sort(key=lambda l: (-l["score"], -l["hits"], l["_order"]))
+        for l in labels:
+            del l["_order"]
+        return labels
+
+    def tag_many(self, texts, min_score: float = 0.0):
+        """Batch API: tag a whole corpus with the same compiled automaton."""
+        return [self.tag(t, min_score) for t in texts]
+
+    def best(self, text: str, default: str = "other") -> str:
+        labels = self.tag(text)
+        return labels[0]["id"] if labels else default
+
+
+@lru_cache(maxsize=None)
+def get_tagger(path: str = str(ONTO_PATH)) -> ClauseTagger:
+    return ClauseTagger.from_ontology(Path(path))
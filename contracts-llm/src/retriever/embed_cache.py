@@ -0,0 +1,209 @@
+# src/retriever/embed_cache.py
+"""
+Persistent embedding cache keyed by (model name, normalized chunk text hash).
+
+Layout under data/embed_cache/<model>/:
+    meta.json     {"model": ..., "dim": D}
+    vectors.f32   raw float32 rows (read through np.memmap)
+    keys.bin      20-byte sha1 digests, row i of keys <-> row i of vectors
+    .lock         advisory lock held across every append
+
+Several processes (backends, ingest jobs, index builders) share one cache
+directory, so appends take an exclusive file lock and place new rows by the
+on-disk row count; readers reload whenever keys.bin has grown past them.
+
+Vectors are stored un-normalized; callers asking for normalized embeddings
+get them normalized on the way out, so one cache serves both styles.
+Set EMBED_CACHE=0 to bypass the cache entirely.
+"""
+import os, json, hashlib, re, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[2]
+CACHE_DIR = Path(os.getenv("EMBED_CACHE_DIR", str(ROOT/'data'/'embed_cache')))
+ENABLED = os.getenv("EMBED_CACHE", "1") != "0"
+
+_DIGEST = 20  # sha1
+_WS = re.compile(r"\s+")
+
+
+def model_key(model_name: str) -> str:
+    """'sentence-transformers/all-MiniLM-L6-v2' and 'all-MiniLM-L6-v2' are the same model."""
+    name = (model_name or "").strip()
+    if name.startswith("sentence-transformers/"):
+        name = name.split("/", 1)[1]
+    return name
+
+
+def text_key(text: str) -> bytes:
+    norm = _WS.sub(" ", text or "").strip()
+    return hashlib.sha1(norm.encode("utf-8")).digest()
+
+
+def _normalize(vecs: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vecs / norms
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive inter-process lock on `path` (flock on POSIX, msvcrt on Windows)."""
+    with open(path, 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10s; keep waiting
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, root: Path = CACHE_DIR):
+        self.model_name = model_key(model_name)
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", self.model_name)
+        self.dir = Path(root)/slug
+        self.meta_path = self.dir/'meta.json'
+        self.vec_path = self.dir/'vectors.f32'
+        self.key_path = self.dir/'keys.bin'
+        self.lock_path = self.dir/'.lock'
+        self.dim = None
+        self.rows = {}
+        self.n_rows = 0  # rows in the files as of the last load, may exceed len(rows) on duplicates
+        self._mm = None
+        self._lock = threading.Lock()
+        self.last_hits = self.last_misses = 0
+        self._load()
+
+    def _disk_rows(self):
+        """Consistent row count on disk: an interrupted append may leave one side longer."""
+        n_keys = self.key_path.stat().st_size // _DIGEST if self.key_path.exists() else 0
+        if not self.dim:
+            return 0
+        n_vec = self.vec_path.stat().st_size // (4*self.dim) if self.vec_path.exists() else 0
+        return min(n_keys, n_vec)
+
+    def _load(self):
+        self._mm = None
+        if not self.meta_path.exists():
+            return
+        self.dim = int(json.loads(self.meta_path.read_text(encoding='utf-8'))["dim"])
+        keys = self.key_path.read_bytes() if self.key_path.exists() else b""
+        n = self._disk_rows()
+        rows = {}
+        for i in range(n):
+            rows.setdefault(keys[i*_DIGEST:(i+1)*_DIGEST], i)
+        self.rows = rows
+        self.n_rows = n
+
+    def _refresh(self):
+        """Pick up rows other processes appended since our last load."""
+        if self.dim is None and self.meta_path.exists():
+            self._load()
+        elif self.dim and self._disk_rows() > self.n_rows:
+            self._load()
+
+    def _vectors(self):
+        if self._mm is None and self.n_rows:
+            self._mm = np.memmap(self.vec_path, dtype='float32', mode='r',
+                                 shape=(self.n_rows, self.dim))
+        return self._mm
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _append(self, keys, vecs: np.ndarray):
+        self._mm = None  # release the mapping before growing the file (Windows)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with _file_lock(self.lock_path):
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(vecs.shape[1])
+                self.meta_path.write_text(json.dumps({"model": self.model_name, "dim": self.dim}), encoding='utf-8')
+            # another process may have cached some of these while we were encoding
+            todo = [i for i, k in enumerate(keys) if k not in self.rows]
+            if not todo:
+                return
+            keys = [keys[i] for i in todo]
+            vecs = vecs[todo]
+            # cut any half-written tail so both files agree on the row count
+            base = self._disk_rows()
+            for path, width in ((self.vec_path, 4*self.dim), (self.key_path, _DIGEST)):
+                if path.exists() and path.stat().st_size != base*width:
+                    with path.open('r+b') as f:
+                        f.truncate(base*width)
+            # vectors first, then keys: a crash in between only loses the new rows
+            with self.vec_path.open('ab') as f:
+                f.write(np.ascontiguousarray(vecs, dtype='float32').tobytes())
+            with self.key_path.open('ab') as f:
+                f.write(b"".join(keys))
+            for i, k in enumerate(keys):
+                self.rows[k] = base + i
+            self.n_rows = base + len(keys)
+
+    def encode(self, texts, model, batch_size=32, normalize=False, show_progress_bar=False):
+        """
+        Return embeddings for texts, calling model.encode only for cache misses.
+        `model` may be a SentenceTransformer or a zero-arg callable returning one,
+        so a fully cached rebuild never has to load the model.
+        """
+        texts = list(texts)
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            if ENABLED:
+                self._refresh()
+            missing = {}
+            if ENABLED:
+                for k, t in zip(keys, texts):
+                    if k not in self.rows and k not in missing:
+                        missing[k] = t
+            else:
+                missing = dict(zip(keys, texts))
+
+            self.last_misses = len(missing)
+            self.last_hits = len(texts) - sum(1 for k in keys if k in missing)
+            fresh = {}
+            if missing:
+                if not hasattr(model, "encode"):
+                    model = model()
+                new = model.encode(list(missing.values()), batch_size=batch_size,
+                                   show_progress_bar=show_progress_bar,
+                                   convert_to_numpy=True, normalize_embeddings=False)
+                new = np.asarray(new, dtype='float32')
+                fresh = dict(zip(missing.keys(), new))
+                if ENABLED:
+                    self._append(list(missing.keys()), new)
+
+            if not texts:
+                return np.zeros((0, self.dim or 0), dtype='float32')
+            vecs = self._vectors()
+            out = np.empty((len(texts), self.dim or len(next(iter(fresh.values())))), dtype='float32')
+            for i, k in enumerate(keys):
+                out[i] = fresh[k] if k in fresh else vecs[self.rows[k]]
+        return _normalize(out) if normalize else out
+
+
+_caches = {}
+
+def get_cache(model_name: str) -> EmbeddingCache:
+    key = model_key(model_name)
+    if key not in _caches:
+        _caches[key] = EmbeddingCache(key)
+    return _caches[key]
@@ -0,0 +1,84 @@
+# src/retriever/embed_client.py
+"""
+Thin client of the embedding service (api/embed_api.py).
+
+load_encoder() returns a ServiceEncoder when EMBED_SERVICE_URL is set, so the
+RAG APIs, the index builders and the contract store share one warm model (and
+its batching) instead of loading a copy each. It has the same encode()
+signature as the in-process encoders; vectors travel as base64 float32.
+
+If the service can't be reached, answers an error, or encodes a different
+model than the one asked for (its "model" field is compared with model_id()),
+the call is served by an in-process encoder instead (loaded on first
+fallback) and the service is retried after EMBED_SERVICE_RETRY_S. Calls are
+counted in contracts_embed_client_total{result="service"|"local"}.
+"""
+import os, time, base64, logging
+
+import numpy as np
+
+from src.retriever.encoder import EMBED_SERVICE_URL, Encoder, load_encoder
+from src.serving.metrics import EMBED_CLIENT
+from src.serving.tracing import current_request_id, REQUEST_ID_HEADER
+
+EMBED_SERVICE_TIMEOUT = float(os.getenv("EMBED_SERVICE_TIMEOUT", "30"))
+EMBED_SERVICE_RETRY_S = float(os.getenv("EMBED_SERVICE_RETRY_S", "30"))
+EMBED_SERVICE_CHUNK = int(os.getenv("EMBED_SERVICE_CHUNK", "256"))  # texts per request
+
+logger = logging.getLogger("embed_client")
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceEncoder(Encoder):
+    backend = "service"
+
+    def __init__(self, model_name: str, backend: str, int8: bool = False, url: str = EMBED_SERVICE_URL):
+        super().__init__(model_name, int8)
+        import httpx
+
+        self.local_backend, self.int8, self.url = backend, int8, url
+        self._client = httpx.Client(timeout=EMBED_SERVICE_TIMEOUT,
+                                    limits=httpx.Limits(max_connections=16, max_keepalive_connections=8))
+        self._down_until = 0.0
+
+    def _local(self) -> Encoder:
+        return load_encoder(self.model_name, self.local_backend, self.int8, remote=False)
+
+    def _post(self, texts, normalize: bool) -> np.ndarray:
+        rid = current_request_id()
+        r = self._client.post(f"{self.url}/embed",
+                              json={"texts": texts, "model": self.model_name, "int8": self.int8,
+                                    "normalize": normalize},
+                              headers={REQUEST_ID_HEADER: rid} if rid else None)
+        if r.status_code != 200:
+            raise ServiceError(f"HTTP {r.status_code}: {r.text[:200]}")
+        body = r.json()
+        if body.get("model") != self.model_id:
+            raise ServiceError(f"service encodes {body.get('model')!r}, wanted {self.model_id!r}")
+        self.dim, self.version = int(body["dim"]), body.get("version")
+        vecs = np.frombuffer(base64.b64decode(body["vectors"]), dtype="<f4")
+        return vecs.reshape(len(texts), self.dim)
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype="float32")
+        if time.monotonic() >= self._down_until:
+            try:
+                out = np.concatenate([self._post(texts[i:i + EMBED_SERVICE_CHUNK], normalize_embeddings)
+                                      for i in range(0, len(texts), EMBED_SERVICE_CHUNK)])
+                EMBED_CLIENT.inc(result="service")
+                return out.astype("float32", copy=False)
+            except Exception as e:  # noqa: BLE001  (httpx errors, bad payloads, ServiceError)
+                self._down_until = time.monotonic() + EMBED_SERVICE_RETRY_S
+                logger.warning("embed_service_unavailable",
+                               extra={"url": self.url, "error": f"{type(e).__name__}: {e}",
+                                      "retry_s": EMBED_SERVICE_RETRY_S})
+        EMBED_CLIENT.inc(result="local")
+        local = self._local()
+        self.dim = self.dim or local.dim
+        return local.encode(texts, batch_size=batch_size, normalize_embeddings=normalize_embeddings,
+                            show_progress_bar=show_progress_bar)
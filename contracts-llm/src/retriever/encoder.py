@@ -0,0 +1,280 @@
+# src/retriever/encoder.py
+"""
+Sentence encoder behind one interface, with a selectable backend.
+
+    ENCODER_BACKEND=torch   sentence-transformers on PyTorch (default)
+    ENCODER_BACKEND=onnx    same model through ONNX Runtime + tokenizers,
+                            no torch import at query time
+    ENCODER_INT8=1          (onnx) dynamically quantized int8 weights
+
+load_encoder(name) returns a process-wide encoder per (model, backend) whose
+encode(texts, batch_size=32, normalize_embeddings=False, ...) matches
+SentenceTransformer.encode, so it can be handed to EmbeddingCache.encode and
+to every caller that used a SentenceTransformer before (api/rag_api.py,
+api/ingest.py, src/retriever/indexer.py, src/answerer/rag_api.py,
+src/answerer/contract_store.py, build_vector_index.py).
+
+The ONNX backend runs the sentence-transformers pipeline itself: tokenizer.json
+(truncated at max_seq_length), the transformer graph, the pooling of
+1_Pooling/config.json and the Normalize module when modules.json has one.
+The graph is onnx/model.onnx of the model repo when it ships one, otherwise
+it is exported once with torch into ENCODER_ONNX_DIR/<model>/model.onnx; the
+int8 variant is quantized from it once (model_int8.onnx, needs the `onnx`
+package). bench/encoder.py checks the backends against each other.
+
+int8 vectors are close to, not equal to, the fp32 ones, so model_id() gives
+them their own embedding cache ("<model>-int8"); torch and onnx fp32 share one.
+Each encoder also carries a version string (runtime + weights) for logs and
+the embedding service responses.
+
+EMBED_MODEL ("all-MiniLM-L6-v2") is the one model name every component
+defaults to. With EMBED_SERVICE_URL set (api/embed_api.py), load_encoder()
+returns a thin client of that service instead, which falls back to loading
+the model in-process while the service is unreachable
+(src/retriever/embed_client.py).
+"""
+import os, re, json, hashlib, threading
+from pathlib import Path
+
+import numpy as np
+
+from src.retriever.embed_cache import model_key
+
+ROOT = Path(__file__).resolve().parents[2]
+EMBED_MODEL = model_key(os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2"))
+EMBED_SERVICE_URL = os.getenv("EMBED_SERVICE_URL", "").strip().rstrip("/")
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch").strip().lower()
+ENCODER_INT8 = os.getenv("ENCODER_INT8", "0") != "0"
+ENCODER_ONNX_DIR = Path(os.getenv("ENCODER_ONNX_DIR", str(ROOT/'data'/'onnx')))
+BACKENDS = ("torch", "onnx")
+
+_threads = int(os.getenv("ENCODER_THREADS", "0"))
+
+
+def _resolve(backend, int8):
+    backend = (backend or ENCODER_BACKEND).strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown encoder backend {backend!r} (expected one of {BACKENDS})")
+    return backend, bool(ENCODER_INT8 if int8 is None else int8) and backend == "onnx"
+
+
+def model_id(model_name: str, backend: str = None, int8: bool = None) -> str:
+    """Name the vectors are cached under: the model key, plus "-int8" for quantized weights."""
+    _, int8 = _resolve(backend, int8)
+    return model_key(model_name) + ("-int8" if int8 else "")
+
+
+def set_num_threads(n: int) -> None:
+    """Intra-op threads for encoders created from now on (and for torch, right away)."""
+    global _threads
+    _threads = max(0, int(n))
+    if _threads and ENCODER_BACKEND == "torch":
+        try:
+            import torch
+            torch.set_num_threads(_threads)
+        except ImportError:
+            pass
+
+
+class Encoder:
+    """encode(texts) -> float32 [len(texts), dim], SentenceTransformer.encode keywords."""
+    backend = None
+
+    def __init__(self, model_name: str, int8: bool = False):
+        self.model_name = model_key(model_name)
+        self.model_id = self.model_name + ("-int8" if int8 else "")
+        self.dim = None
+        self.version = None
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.model_id!r}, dim={self.dim})"
+
+
+class TorchEncoder(Encoder):
+    backend = "torch"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        get_dim = (getattr(self.model, "get_embedding_dimension", None)  # sentence-transformers >= 5
+                   or getattr(self.model, "get_sentence_embedding_dimension", None))
+        self.dim = get_dim() if get_dim else None
+        import sentence_transformers
+        self.version = f"sentence-transformers-{getattr(sentence_transformers, '__version__', '?')}"
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        vecs = self.model.encode(list(texts), batch_size=batch_size, show_progress_bar=show_progress_bar,
+                                 convert_to_numpy=True, normalize_embeddings=normalize_embeddings)
+        return np.asarray(vecs, dtype="float32")
+
+
+def _model_dir(model_name: str) -> Path:
+    """Local directory with the sentence-transformers files (downloaded from the hub if needed)."""
+    local = Path(model_name)
+    if local.is_dir():
+        return local
+    from huggingface_hub import snapshot_download
+    repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    return Path(snapshot_download(repo, allow_patterns=["*.json", "*.txt", "1_Pooling/*", "onnx/model.onnx"]))
+
+
+def _read_json(path: Path, default=None):
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else default
+
+
+def _export_onnx(src: Path, out: Path) -> None:
+    """One-time torch export of the transformer (input_ids/attention_mask/token_type_ids -> last_hidden_state)."""
+    import torch
+    from transformers import AutoModel
+
+    class Transformer(torch.nn.Module):  # keyword call: positional order differs across transformers versions
+        def __init__(self):
+            super().__init__()
+            self.model = AutoModel.from_pretrained(str(src)).eval()
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids)[0]
+
+    model = Transformer().eval()
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    dummy = tuple(torch.ones((1, 8), dtype=torch.long) for _ in names)
+    axes = {n: {0: "batch", 1: "seq"} for n in names + ["last_hidden_state"]}
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(f"{out.name}.tmp{os.getpid()}")
+    with torch.no_grad():
+        torch.onnx.export(model, dummy, str(tmp), input_names=names, output_names=["last_hidden_state"],
+                          dynamic_axes=axes, opset_version=17, dynamo=False)
+    os.replace(tmp, out)
+
+
+def _quantize(fp32: Path, out: Path) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(f"{out.name}.tmp{os.getpid()}")
+    quantize_dynamic(str(fp32), str(tmp), weight_type=QuantType.QInt8)
+    os.replace(tmp, out)
+
+
+def onnx_files(model_name: str, int8: bool = None):
+    """(model dir, .onnx graph) for the ONNX backend, exporting / quantizing on first use."""
+    _, int8 = _resolve("onnx", int8)
+    src = _model_dir(model_name)
+    work = ENCODER_ONNX_DIR/re.sub(r"[^A-Za-z0-9._-]+", "_", model_key(model_name))
+    fp32 = src/'onnx'/'model.onnx'
+    if not fp32.exists():
+        fp32 = work/'model.onnx'
+        if not fp32.exists():
+            _export_onnx(src, fp32)
+    if not int8:
+        return src, fp32
+    q = work/'model_int8.onnx'
+    if not q.exists():
+        _quantize(fp32, q)
+    return src, q
+
+
+class OnnxEncoder(Encoder):
+    backend = "onnx"
+
+    def __init__(self, model_name: str, int8: bool = False):
+        super().__init__(model_name, int8)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        src, graph = onnx_files(model_name, int8)
+        st_cfg = _read_json(src/'sentence_bert_config.json', {})
+        pool = _read_json(src/'1_Pooling'/'config.json', {})
+        modules = _read_json(src/'modules.json', [])
+        self.pooling = ("cls" if pool.get("pooling_mode_cls_token") else
+                        "max" if pool.get("pooling_mode_max_tokens") else "mean")
+        self.normalize = any(m.get("type", "").endswith("Normalize") for m in modules)
+
+        self.tokenizer = Tokenizer.from_file(str(src/'tokenizer.json'))
+        self.tokenizer.enable_truncation(int(st_cfg.get("max_seq_length", 256)))
+        pad = self.tokenizer.padding or {}
+        self.tokenizer.enable_padding(pad_id=pad.get("pad_id", 0), pad_token=pad.get("pad_token", "[PAD]"))
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if _threads:
+            opts.intra_op_num_threads = _threads
+        self.session = ort.InferenceSession(str(graph), opts, providers=["CPUExecutionProvider"])
+        with open(graph, "rb") as f:
+            self.version = f"onnxruntime-{ort.__version__}:{hashlib.sha1(f.read()).hexdigest()[:12]}"
+        self.inputs = {i.name for i in self.session.get_inputs()}
+        self.dim = int(self.encode(["dim"]).shape[1])
+
+    def _batch(self, texts) -> np.ndarray:
+        enc = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in enc], dtype="int64")
+        mask = np.array([e.attention_mask for e in enc], dtype="int64")
+        feed = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        out = self.session.run(None, {k: v for k, v in feed.items() if k in self.inputs})[0]
+        if out.ndim == 2:  # graph already pools (sentence_embedding output)
+            return out
+        m = mask[..., None].astype(out.dtype)
+        if self.pooling == "cls":
+            return out[:, 0]
+        if self.pooling == "max":
+            return np.where(m > 0, out, -1e9).max(axis=1)
+        return (out * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype="float32")
+        # longest first, like sentence-transformers: less padding per batch
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = np.empty((len(texts), self.dim or 0), dtype="float32") if self.dim else None
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            vecs = self._batch([texts[i] for i in idx])
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype="float32")
+            out[idx] = vecs
+        if self.normalize or normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            out /= norms
+        return out
+
+
+_encoders = {}
+_lock = threading.Lock()   # guards _encoders/_key_locks only, never held while loading
+_key_locks = {}            # key -> Lock, so each encoder is loaded/exported once
+
+
+def load_encoder(model_name: str = None, backend: str = None, int8: bool = None, remote: bool = None) -> Encoder:
+    """
+    Process-wide encoder per (model, backend, int8), loaded on first use.
+    remote (default: EMBED_SERVICE_URL is set) returns the embedding service
+    client instead; remote=False always loads the model in this process.
+    Loading one key never blocks callers of another (or of a loaded one).
+    """
+    model_name = model_key(model_name or EMBED_MODEL)
+    backend, int8 = _resolve(backend, int8)
+    remote = bool(EMBED_SERVICE_URL) if remote is None else remote
+    key = (model_name, backend, int8, remote)
+    enc = _encoders.get(key)
+    if enc is not None:
+        return enc
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        enc = _encoders.get(key)
+        if enc is None:
+            if remote:
+                from src.retriever.embed_client import ServiceEncoder
+                enc = ServiceEncoder(model_name, backend, int8)
+            elif backend == "onnx":
+                enc = OnnxEncoder(model_name, int8)
+            else:
+                enc = TorchEncoder(model_name)
+            _encoders[key] = enc
+        return enc
@@ -1,16 +1,22 @@
 ﻿# src/retriever/indexer.py
-import os, json, glob, faiss
+import os, sys, json, glob, faiss
 import numpy as np
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 
 ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from src.retriever.embed_cache import get_cache
+from src.retriever.encoder import EMBED_MODEL, load_encoder, model_id
+
 JSONL = ROOT/'data'/'jsonl'
 INDEX = ROOT/'data'/'index'
 INDEX.mkdir(parents=True, exist_ok=True)
 
-MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'  # fast + decent
-embedder = SentenceTransformer(MODEL_NAME)
+MODEL_NAME = EMBED_MODEL  # all-MiniLM-L6-v2: fast + decent
+
+def load_embedder():
+    return load_encoder(MODEL_NAME)
 
 def load_records():
     recs = []
@@ -29,7 +35,9 @@ def run():
         print('[indexer] No JSONL clause files. Run extractor first.')
         return
     texts = [r['text'] for r in recs]
-    embs = embedder.encode(texts, convert_to_numpy=True, show_progress_bar=True, normalize_embeddings=True)
+    cache = get_cache(model_id(MODEL_NAME))
+    embs = cache.encode(texts, load_embedder, show_progress_bar=True, normalize=True)
+    print(f"[indexer] Embedding cache: {cache.last_hits} hits, {cache.last_misses} encoded.")
     index = faiss.IndexFlatIP(embs.shape[1])
     index.add(embs.astype('float32'))
     faiss.write_index(index, str(INDEX/'faiss.index'))
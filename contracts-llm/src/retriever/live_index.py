@@ -0,0 +1,68 @@
+# src/retriever/live_index.py
+"""
+Faiss index + records that can grow while queries are being served.
+
+Readers call snapshot() and get an (index, records) pair that never changes
+under them. publish() builds a new index (clone + add) off to the side and
+swaps the reference in one assignment, so query traffic is never blocked by
+ingestion; writers are serialized by a lock. Re-publishing a doc_id replaces
+its earlier rows instead of adding a second copy. Every publish() bumps a
+generation number, so caches keyed on it (semantic answer cache) never serve
+answers built from a previous version of the corpus.
+"""
+import json, os, threading
+from pathlib import Path
+import faiss
+import numpy as np
+
+
+class LiveIndex:
+    def __init__(self, index, records, model_name: str):
+        self._snap = (index, list(records), 0)  # (index, records, generation), swapped as one
+        self.model_name = model_name
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, index_path: Path, meta_path: Path):
+        idx = faiss.read_index(str(index_path))
+        meta = json.loads(Path(meta_path).read_text(encoding='utf-8'))
+        return cls(idx, meta["records"], meta.get("model"))
+
+    def snapshot(self):
+        return self._snap[:2]
+
+    def versioned(self):
+        """(index, records, generation) of one consistent snapshot."""
+        return self._snap
+
+    def __len__(self):
+        return len(self._snap[1])
+
+    def publish(self, vecs: np.ndarray, recs):
+        """Add vectors/records (replacing rows of the same doc_ids) and make them visible atomically."""
+        vecs = np.ascontiguousarray(vecs, dtype='float32')
+        recs = list(recs)
+        docs = {r.get("doc_id") for r in recs}
+        with self._write_lock:
+            idx, old, gen = self._snap
+            new = faiss.clone_index(idx)
+            stale = [i for i, r in enumerate(old) if r.get("doc_id") in docs]
+            if stale:
+                # flat indexes compact on removal, so positions keep matching the records list
+                new.remove_ids(np.asarray(stale, dtype='int64'))
+                drop = set(stale)
+                old = [r for i, r in enumerate(old) if i not in drop]
+            new.add(vecs)
+            self._snap = (new, old + recs, gen + 1)
+
+    def save(self, index_path: Path, meta_path: Path):
+        """Persist the current snapshot (tmp file + replace, so readers of the files never see half a write)."""
+        with self._write_lock:
+            idx, recs, _ = self._snap
+            tmp_idx = Path(str(index_path) + ".tmp")
+            tmp_meta = Path(str(meta_path) + ".tmp")
+            faiss.write_index(idx, str(tmp_idx))
+            with tmp_meta.open('w', encoding='utf-8') as f:
+                json.dump({"model": self.model_name, "records": recs}, f)
+            os.replace(tmp_idx, index_path)
+            os.replace(tmp_meta, meta_path)
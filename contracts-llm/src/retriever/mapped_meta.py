@@ -0,0 +1,94 @@
+# src/retriever/mapped_meta.py
+"""
+Chunk metadata (owner, text, risk, ...) for api/rag_api.py as an uncompressed
+Arrow IPC file, opened memory-mapped and read-only.
+
+pd.read_parquet decodes every text into a private Python object per worker;
+an Arrow IPC file is already in its in-memory layout, so with
+pa.memory_map() the columns point straight into the page cache and N uvicorn
+workers share one copy. Only the k rows a query returns are materialized
+(rows(), from zero-copy slices), and dictionary columns (risk, owner) are
+read as integer codes.
+
+data/index/meta.parquet stays the ingest output (bench/retrieval.py and
+friends read it); meta.arrow is written next to it by api/ingest.py, or
+derived from it on first start (ensure_arrow()).
+"""
+import os
+
+import numpy as np
+
+
+def write_arrow(df, path: str) -> None:
+    """DataFrame -> uncompressed Arrow IPC file (atomic replace)."""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def ensure_arrow(parquet_path: str, arrow_path: str, prepare=None) -> str:
+    """(Re)build arrow_path from parquet_path if missing or older; prepare(df) -> df runs first."""
+    if os.path.exists(arrow_path) and os.path.getmtime(arrow_path) >= os.path.getmtime(parquet_path):
+        return arrow_path
+    import pandas as pd
+
+    df = pd.read_parquet(parquet_path)
+    write_arrow(prepare(df) if prepare else df, arrow_path)
+    return arrow_path
+
+
+class MappedMeta:
+    def __init__(self, path: str, mmap: bool = True):
+        import pyarrow as pa
+
+        self.path, self.mmap = path, mmap
+        source = pa.memory_map(path, "r") if mmap else pa.OSFile(path, "rb")
+        self.table = pa.ipc.open_file(source).read_all()
+        self._encoded = {}
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    def rows(self, ids):
+        """Rows at the given positions as dicts (dictionary columns decoded to their values)."""
+        # one zero-copy slice per row: Table.take() on a multi-chunk table
+        # concatenates the chunks first, i.e. copies every column into this worker
+        table = self.table
+        return [table.slice(int(i), 1).to_pylist()[0] for i in np.asarray(ids, dtype="int64")]
+
+    def _dictionary(self, column: str):
+        arr = self._encoded.get(column)
+        if arr is None:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+
+            col = self.table.column(column)
+            if not pa.types.is_dictionary(col.type):
+                col = pc.dictionary_encode(col)
+            arr = self._encoded[column] = col.combine_chunks()
+        return arr
+
+    def codes(self, column: str, levels) -> np.ndarray:
+        """Position in `levels` of each row's value (-1 for values not in levels)."""
+        arr = self._dictionary(column)
+        remap = np.array([levels.index(v) if v in levels else -1 for v in arr.dictionary.to_pylist()],
+                         dtype="int8")
+        return remap[arr.indices.to_numpy(zero_copy_only=False)]
+
+    def level_counts(self, by: str, column: str, levels):
+        """(names of `by`, int64 matrix [len(names), len(levels)]) of row counts per value of `by`."""
+        keys = self._dictionary(by)
+        names = keys.dictionary.to_pylist()
+        k = keys.indices.to_numpy(zero_copy_only=False).astype("int64")
+        c = self.codes(column, levels).astype("int64")
+        ok = c >= 0
+        counts = np.bincount(k[ok] * len(levels) + c[ok], minlength=len(names) * len(levels))
+        return names, counts.reshape(len(names), len(levels))
@@ -0,0 +1,87 @@
+# src/serving/batcher.py
+"""
+Dynamic batching for async endpoints.
+
+    batcher = MicroBatcher(fn, max_batch=64, max_wait_ms=5)
+    results = await batcher.submit(items)      # in an endpoint
+
+Concurrent submit() calls are merged into one fn(items) -> results call (same
+length and order), run in a single worker thread so the event loop stays
+free. A batch closes when it holds max_batch items or max_wait_ms after its
+first item arrived; while one batch runs, the next one keeps filling, so
+under load batches grow by themselves and at low load a lone request waits
+at most max_wait_ms. A request larger than max_batch runs as its own batch.
+"""
+import asyncio, time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch: int = 64, max_wait_ms: float = 5.0, name: str = "batch"):
+        self.fn, self.name = fn, name
+        self.max_batch, self.max_wait = max(1, max_batch), max(0.0, max_wait_ms) / 1000.0
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._queue = None
+        self._task = None
+        self.batches = self.items = 0
+
+    async def submit(self, items):
+        items = list(items)
+        if not items:
+            return []
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((items, fut))
+        return await fut
+
+    async def _collect(self):
+        pending = [await self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            if self._queue.empty():
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    nxt = await asyncio.wait_for(self._queue.get(), left)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                nxt = self._queue.get_nowait()
+            if size + len(nxt[0]) > self.max_batch:
+                self._queue.put_nowait(nxt)  # back of the queue; starts the next batch
+                break
+            pending.append(nxt)
+            size += len(nxt[0])
+        return pending
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = await self._collect()
+            pending = [(items, fut) for items, fut in pending if not fut.done()]  # caller went away
+            if not pending:
+                continue
+            flat = [x for items, _ in pending for x in items]
+            try:
+                results = await loop.run_in_executor(self._pool, self.fn, flat)
+            except Exception as e:  # noqa: BLE001
+                for _, fut in pending:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(flat)
+            start = 0
+            for items, fut in pending:
+                if not fut.done():
+                    fut.set_result(results[start:start + len(items)])
+                start += len(items)
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "items": self.items,
+                "mean_batch": round(self.items / self.batches, 2) if self.batches else None,
+                "max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000}
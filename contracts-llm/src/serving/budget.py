@@ -0,0 +1,229 @@
+# src/serving/budget.py
+"""
+Prompt token budget and token usage accounting for upstream LLM calls.
+
+Before a call, src/serving/upstream.py estimates the prompt size
+(~TOKEN_CHARS characters per token plus a few tokens per chat message; no
+tokenizer needed) and applies the budget for the current route:
+
+    PROMPT_TOKEN_BUDGET=8000                       default budget (default 0 = unlimited, opt-in)
+    PROMPT_TOKEN_BUDGET_ROUTES=/chat/contracts=12000,/ask=4000
+    BUDGET_MODE=trim | reject
+
+trim:   drop the oldest history messages (system prompt and the final user
+        message are kept), then cut the middle out of the largest message,
+        keeping its head (instructions, start of the contract) and its tail
+        (the question). An upstream prompt string is trimmed the same way.
+reject: raise BudgetExceeded (HTTP 413) without calling the upstream.
+Every trimmed prompt is logged as a prompt_trimmed warning.
+
+After a call, the prompt/completion/total tokens reported by the upstream
+(falling back to the estimate) are recorded per request (trace log), per
+route (Prometheus contracts_upstream_tokens_total) and per route and client
+in the aggregates served by GET /usage (install(app)).
+"""
+import os, math, time, logging, threading
+
+from src.serving.metrics import UPSTREAM_ROUTE_TOKENS, PROMPT_TOKENS_ESTIMATED, PROMPT_BUDGET_ACTIONS
+from src.serving.tracing import current_trace
+from src.serving.logs import log_event
+
+TOKEN_CHARS = float(os.getenv("TOKEN_CHARS", "3.5"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "0"))
+BUDGET_MODE = os.getenv("BUDGET_MODE", "trim").lower()
+MESSAGE_OVERHEAD = 4
+MIN_KEEP_TOKENS = 64
+MAX_CLIENTS = 1000
+logger = logging.getLogger("budget")
+
+
+def _route_budgets(spec: str) -> dict:
+    out = {}
+    for part in spec.split(","):
+        route, _, val = part.strip().rpartition("=")
+        if route and val.strip().isdigit():
+            out[route.strip()] = int(val)
+    return out
+
+
+ROUTE_BUDGETS = _route_budgets(os.getenv("PROMPT_TOKEN_BUDGET_ROUTES", ""))
+
+
+class BudgetExceeded(Exception):
+    """Prompt over the token budget (reject mode, or too large to trim)."""
+
+    status = 413
+
+    def __init__(self, estimated: int, budget: int):
+        super().__init__(f"prompt is ~{estimated} tokens, budget is {budget}")
+        self.estimated, self.budget = estimated, budget
+        self.detail = str(self)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / TOKEN_CHARS)
+
+
+def estimate_messages(messages) -> int:
+    return sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD for m in messages) + 2
+
+
+def budget_for(route: str) -> int:
+    return ROUTE_BUDGETS.get(route, PROMPT_TOKEN_BUDGET)
+
+
+def trim_middle(text: str, max_tokens: int) -> str:
+    """Keep the head and tail of `text` so it fits in ~max_tokens."""
+    keep = int(max_tokens * TOKEN_CHARS)
+    if len(text) <= keep:
+        return text
+    marker = "\n[... {} characters omitted to fit the prompt budget ...]\n"
+    keep = max(0, keep - len(marker) - 8)
+    head = keep * 2 // 3
+    tail = keep - head
+    return text[:head] + marker.format(len(text) - keep) + (text[-tail:] if tail else "")
+
+
+def fit_messages(messages, budget: int):
+    """Return (messages, estimated tokens before trimming, action) with action None or "trimmed"."""
+    est = estimate_messages(messages)
+    if not budget or est <= budget:
+        return messages, est, None
+    if BUDGET_MODE == "reject":
+        raise BudgetExceeded(est, budget)
+    msgs = [dict(m) for m in messages]
+    first = 1 if msgs and msgs[0].get("role") == "system" else 0
+    while len(msgs) - first > 1 and estimate_messages(msgs) > budget:
+        del msgs[first]
+    over = estimate_messages(msgs) - budget
+    if over > 0:
+        big = max(range(len(msgs)), key=lambda i: len(msgs[i].get("content") or ""))
+        target = estimate_tokens(msgs[big].get("content") or "") - over
+        if target < MIN_KEEP_TOKENS:
+            raise BudgetExceeded(est, budget)
+        msgs[big]["content"] = trim_middle(msgs[big]["content"], target)
+    return msgs, est, "trimmed"
+
+
+def fit_prompt(prompt: str, budget: int):
+    """fit_messages() for a plain prompt string (Ollama /api/generate)."""
+    est = estimate_tokens(prompt)
+    if not budget or est <= budget:
+        return prompt, est, None
+    if BUDGET_MODE == "reject" or budget < MIN_KEEP_TOKENS:
+        raise BudgetExceeded(est, budget)
+    return trim_middle(prompt, budget), est, "trimmed"
+
+
+def _current_route_client():
+    tr = current_trace()
+    if tr is None:
+        return "none", "none"
+    return tr.route or "none", tr.client or "unknown"
+
+
+def apply(payload: dict, budget: int = None):
+    """
+    Enforce the route's budget on an upstream payload (messages or prompt).
+    Returns (payload, estimated tokens of the payload as sent).
+    """
+    route, client = _current_route_client()
+    budget = budget_for(route) if budget is None else budget
+    try:
+        if "messages" in payload:
+            msgs, est, action = fit_messages(payload["messages"], budget)
+            payload = {**payload, "messages": msgs}
+        else:
+            prompt, est, action = fit_prompt(payload.get("prompt") or "", budget)
+            payload = {**payload, "prompt": prompt}
+    except BudgetExceeded as e:
+        PROMPT_TOKENS_ESTIMATED.observe(e.estimated, route=route)
+        PROMPT_BUDGET_ACTIONS.inc(route=route, action="rejected")
+        USAGE.add(route, client, rejected=1, requested=e.estimated)
+        raise
+    PROMPT_TOKENS_ESTIMATED.observe(est, route=route)
+    if action:
+        PROMPT_BUDGET_ACTIONS.inc(route=route, action=action)
+        USAGE.add(route, client, trimmed=1, requested=est)
+        sent = estimate_messages(payload["messages"]) if "messages" in payload else estimate_tokens(payload["prompt"])
+        log_event(logger, logging.WARNING, "prompt_trimmed", route=route, budget=budget,
+                  estimated=est, sent=sent)
+        est = sent
+    return payload, est
+
+
+def record(estimated: int, prompt_tokens, completion_tokens) -> None:
+    """Account one finished upstream call to the current request, route and client."""
+    route, client = _current_route_client()
+    prompt_tokens = int(prompt_tokens) if prompt_tokens else estimated
+    completion_tokens = int(completion_tokens or 0)
+    UPSTREAM_ROUTE_TOKENS.inc(prompt_tokens, route=route, kind="prompt")
+    UPSTREAM_ROUTE_TOKENS.inc(completion_tokens, route=route, kind="completion")
+    USAGE.add(route, client, calls=1, estimated=estimated, prompt=prompt_tokens,
+              completion=completion_tokens)
+    tr = current_trace()
+    if tr is not None:
+        u = tr.usage
+        u["prompt_tokens"] = u.get("prompt_tokens", 0) + prompt_tokens
+        u["completion_tokens"] = u.get("completion_tokens", 0) + completion_tokens
+        u["total_tokens"] = u["prompt_tokens"] + u["completion_tokens"]
+        u["estimated_prompt_tokens"] = u.get("estimated_prompt_tokens", 0) + estimated
+
+
+class UsageAggregates:
+    """Running token totals per route and per (route, client)."""
+
+    FIELDS = ("calls", "estimated", "prompt", "completion", "trimmed", "rejected")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes, self.clients = {}, {}
+        self.since = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def _bump(self, table, key, vals):
+        row = table.get(key)
+        if row is None:
+            row = table[key] = dict.fromkeys(self.FIELDS, 0) | {"max_prompt": 0, "max_requested": 0}
+        for k, v in vals.items():
+            if k in self.FIELDS:
+                row[k] += v
+        row["max_prompt"] = max(row["max_prompt"], vals.get("prompt", 0))
+        # largest prompt asked for, before trimming / when rejected
+        row["max_requested"] = max(row["max_requested"], vals.get("requested", 0), vals.get("estimated", 0))
+
+    def add(self, route: str, client: str, **vals) -> None:
+        with self._lock:
+            self._bump(self.routes, route, vals)
+            if (route, client) not in self.clients and len(self.clients) >= MAX_CLIENTS:
+                client = "other"
+            self._bump(self.clients, (route, client), vals)
+
+    @staticmethod
+    def _view(row):
+        out = dict(row, total=row["prompt"] + row["completion"])
+        out["mean_prompt"] = round(row["prompt"] / row["calls"], 1) if row["calls"] else None
+        out["mean_completion"] = round(row["completion"] / row["calls"], 1) if row["calls"] else None
+        # >1 means the chars/token estimate over-counts for this model
+        out["estimate_ratio"] = round(row["estimated"] / row["prompt"], 3) if row["prompt"] else None
+        return out
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "since": self.since,
+                "budget": {"default": PROMPT_TOKEN_BUDGET, "routes": ROUTE_BUDGETS, "mode": BUDGET_MODE,
+                           "token_chars": TOKEN_CHARS},
+                "routes": {r: self._view(v) for r, v in self.routes.items()},
+                "clients": [{"route": r, "client": c, **self._view(v)} for (r, c), v in self.clients.items()],
+            }
+
+
+USAGE = UsageAggregates()
+
+
+def install(app) -> None:
+    """GET /usage: token aggregates for capacity planning."""
+
+    @app.get("/usage")
+    def usage():
+        return USAGE.snapshot()
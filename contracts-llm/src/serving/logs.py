@@ -0,0 +1,217 @@
+# src/serving/logs.py
+"""
+Structured, non-blocking logging for the serving apps.
+
+setup("simple_backend") replaces the root handlers with a QueueHandler: a
+log call in a request only tags the record with the current request ID /
+route / client and drops it on a bounded queue. Formatting (JSON, one object
+per line) and the write to stderr or LOG_FILE happen on a background thread.
+When the queue is full the record is dropped and counted
+(contracts_log_dropped_total) instead of blocking the event loop.
+
+    LOG_LEVEL=INFO | DEBUG ...
+    LOG_FILE=logs/simple_backend.jsonl     (default: stderr)
+    LOG_FORMAT=json | text
+    LOG_SAMPLE=/llm/ask-basic=0.1,/chat/contracts=0.5
+        keep only that fraction of requests' DEBUG/INFO records on a route,
+        decided per request ID so a sampled request keeps all its lines;
+        WARNING and above are never sampled out.
+
+Structured fields:  log_event(logger, logging.INFO, "upstream_ok", status=200, ms=12.3)
+Large payloads:     pass lazy_preview(obj, 400) as a field and guard with
+                    logger.isEnabledFor(logging.DEBUG); the preview string is
+                    only built on the writer thread, and only if the record is emitted.
+
+BackgroundWriter (also used for tracing.TRACE_LOG) appends lines to a file
+from its own thread.
+"""
+import os, sys, json, time, zlib, queue, atexit, logging, threading
+import logging.handlers
+
+from src.serving.metrics import REGISTRY
+from src.serving.tracing import current_trace
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+LOG_DROPPED = REGISTRY.counter(
+    "contracts_log_dropped_total", "Log records/lines dropped because the writer queue was full.", ("sink",))
+
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _sample_rates(spec: str) -> dict:
+    out = {}
+    for part in spec.split(","):
+        route, _, val = part.strip().rpartition("=")
+        try:
+            out[route.strip()] = float(val)
+        except ValueError:
+            pass
+    return out
+
+
+LOG_SAMPLE = _sample_rates(os.getenv("LOG_SAMPLE", ""))
+
+
+class lazy_preview:
+    """str(obj)[:limit] with newlines flattened, computed only when formatted."""
+
+    __slots__ = ("obj", "limit")
+
+    def __init__(self, obj, limit: int = 400):
+        self.obj, self.limit = obj, limit
+
+    def __str__(self):
+        return str(self.obj)[:self.limit].replace("\n", " ")
+
+
+def log_event(logger, level: int, event: str, **fields) -> None:
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra=fields)
+
+
+class _ContextFilter(logging.Filter):
+    """Runs in the calling thread: attach request context, apply per-route sampling."""
+
+    def filter(self, record):
+        tr = current_trace()
+        if tr is not None:
+            record.request_id, record.route, record.client = tr.request_id, tr.route, tr.client
+            rate = LOG_SAMPLE.get(tr.route)
+            if rate is not None and record.levelno < logging.WARNING:
+                if (zlib.crc32(tr.request_id.encode()) % 10000) / 10000.0 >= rate:
+                    return False
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # no formatting here (the stdlib version formats in the caller);
+        # only pin the exception text, the traceback frames may be reused
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc(sink="log")
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, app_name: str):
+        super().__init__()
+        self.app_name = app_name
+
+    def format(self, record):
+        out = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "app": self.app_name,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in record.__dict__.items():
+            if k not in _RESERVED and not k.startswith("_"):
+                out[k] = v
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        extra = {k: v for k, v in record.__dict__.items() if k not in _RESERVED and not k.startswith("_")}
+        if extra:
+            line += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+        return line
+
+
+_listener = None
+
+
+def setup(app_name: str, level: str = None) -> None:
+    """Route all logging through the queue + background writer (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    if LOG_FILE:
+        os.makedirs(os.path.dirname(os.path.abspath(LOG_FILE)), exist_ok=True)
+        sink = logging.FileHandler(LOG_FILE, encoding="utf-8")
+    else:
+        sink = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == "text":
+        sink.setFormatter(_TextFormatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+    else:
+        sink.setFormatter(JsonFormatter(app_name))
+
+    q = queue.Queue(LOG_QUEUE_SIZE)
+    handler = _QueueHandler(q)
+    handler.addFilter(_ContextFilter())
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(handler)
+    root.setLevel(level or LOG_LEVEL)
+    _listener = logging.handlers.QueueListener(q, sink, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class BackgroundWriter:
+    """Append text lines to a file from a daemon thread; write() never blocks."""
+
+    def __init__(self, path: str, sink: str = "file", maxsize: int = LOG_QUEUE_SIZE):
+        self.path, self.sink = path, sink
+        self.queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name=f"writer-{sink}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, line: str) -> None:
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            LOG_DROPPED.inc(sink=self.sink)
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                line = self.queue.get()
+                if line is None:
+                    break
+                f.write(line + "\n")
+                # batch whatever else is already queued before flushing
+                while True:
+                    try:
+                        line = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if line is None:
+                        f.flush()
+                        return
+                    f.write(line + "\n")
+                f.flush()
+
+    def close(self):
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout=5)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def writer_for(path: str, sink: str = "file") -> BackgroundWriter:
+    with _writers_lock:
+        w = _writers.get(path)
+        if w is None:
+            w = _writers[path] = BackgroundWriter(path, sink)
+        return w
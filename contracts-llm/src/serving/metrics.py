@@ -0,0 +1,227 @@
+# src/serving/metrics.py
+"""
+Prometheus text-format metrics shared by the FastAPI apps (no extra deps).
+
+install(app, "simple_backend") adds:
+  - middleware: per-route request latency histogram + in-flight gauge
+  - GET /metrics
+
+Stage timings (query encode, vector search, metadata assembly, upstream TTFT,
+upstream total, ...) go through record_stage() / stage(); the upstream call
+layer (src/serving/upstream.py) records TTFT, tokens/s and error counts.
+"""
+import threading, time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TPS_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160, 320)
+PROMPT_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+
+def _fmt_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}"
+
+
+def _fmt_num(v) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry, name, help, labelnames=()):
+        self.registry, self.name, self.help = registry, name, help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = registry._lock
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key, extra=None):
+        out = dict(self.registry.const_labels)
+        out.update(zip(self.labelnames, key))
+        if extra:
+            out.update(extra)
+        return out
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _render(self):
+        for key, v in self._values.items():
+            yield f"{self.name}{_fmt_labels(self._labels(key))} {_fmt_num(v)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    _render = Counter._render
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            st = self._values.get(key)
+            if st is None:
+                st = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    st[0][i] += 1
+                    break
+            st[1] += value
+            st[2] += 1
+
+    def _render(self):
+        for key, (counts, total, n) in self._values.items():
+            cum = 0
+            for b, c in zip(self.buckets, counts):
+                cum += c
+                yield f"{self.name}_bucket{_fmt_labels(self._labels(key, {'le': _fmt_num(b)}))} {cum}"
+            yield f"{self.name}_sum{_fmt_labels(self._labels(key))} {_fmt_num(total)}"
+            yield f"{self.name}_count{_fmt_labels(self._labels(key))} {n}"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self.const_labels = {}
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(self, name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self, name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for m in self._metrics:
+                lines.append(f"# HELP {m.name} {m.help}")
+                lines.append(f"# TYPE {m.name} {m.kind}")
+                lines.extend(m._render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "contracts_request_seconds", "HTTP request latency by route.", ("route", "method", "status"))
+IN_FLIGHT = REGISTRY.gauge(
+    "contracts_requests_in_flight", "Requests currently being handled.")
+STAGE_SECONDS = REGISTRY.histogram(
+    "contracts_stage_seconds", "Time spent per request stage (encode, search, assemble, upstream_ttft, upstream, ...).",
+    ("stage",))
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    "contracts_upstream_in_flight", "Upstream LLM calls currently open.")
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "contracts_upstream_errors_total", "Failed upstream LLM calls by kind.", ("kind",))
+UPSTREAM_TOKENS = REGISTRY.counter(
+    "contracts_upstream_completion_tokens_total", "Completion tokens received from the upstream LLM.")
+UPSTREAM_TPS = REGISTRY.histogram(
+    "contracts_upstream_tokens_per_second", "Completion tokens per second of generation (after first token).",
+    buckets=TPS_BUCKETS)
+UPSTREAM_ROUTE_TOKENS = REGISTRY.counter(
+    "contracts_upstream_tokens_total", "Prompt/completion tokens sent to and received from the upstream by route.",
+    ("route", "kind"))
+PROMPT_TOKENS_ESTIMATED = REGISTRY.histogram(
+    "contracts_prompt_tokens_estimated", "Estimated prompt size before budget enforcement.", ("route",),
+    buckets=PROMPT_BUCKETS)
+PROMPT_BUDGET_ACTIONS = REGISTRY.counter(
+    "contracts_prompt_budget_total", "Prompts trimmed or rejected by the token budget.", ("route", "action"))
+SEMANTIC_CACHE = REGISTRY.counter(
+    "contracts_semantic_cache_total", "Semantic answer cache lookups by result (hit/miss).", ("result",))
+STRUCTURED_OUTPUT = REGISTRY.counter(
+    "contracts_structured_output_total", "Structured (JSON) LLM answers by parse result.", ("result",))
+EMBED_BATCH_TEXTS = REGISTRY.histogram(
+    "contracts_embed_batch_texts", "Texts encoded per model call by the embedding service (after batching).",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+EMBED_CACHE = REGISTRY.counter(
+    "contracts_embed_cache_total", "Embedding service vector cache lookups by result (hit/miss).", ("result",))
+EMBED_CLIENT = REGISTRY.counter(
+    "contracts_embed_client_total", "Embedding calls by where they ran (service/local fallback).", ("result",))
+
+
+# callbacks(name, seconds) run for every stage, e.g. the per-request trace in tracing.py
+STAGE_LISTENERS = []
+
+
+def record_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=name)
+    for cb in STAGE_LISTENERS:
+        cb(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0)
+
+
+def install(app, app_name: str) -> None:
+    """Attach request metrics middleware and GET /metrics to a FastAPI app."""
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    REGISTRY.const_labels = {"app": app_name}
+
+    @app.middleware("http")
+    async def _metrics_mw(request: Request, call_next):
+        IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            IN_FLIGHT.dec()
+            route = request.scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, route=route,
+                                    method=request.method, status=status)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,212 @@
+# src/serving/profiling.py
+"""
+Opt-in profiling for the FastAPI apps. Nothing is installed unless
+PROFILE_ENABLED=1, so the normal request path is untouched.
+
+install(app, "simple_backend") (call right after FastAPI(), before the routes
+are declared) adds:
+  - per-request cProfile of the endpoint body for
+      * a random PROFILE_SAMPLE fraction of requests (default 0), and
+      * requests sent with `X-Profile: 1` (or `X-Profile: <PROFILE_TOKEN>`);
+    each profile is written as <PROFILE_DIR>/<time>-<app>-<route>-<request id>.pstats
+    and the file name is returned in the X-Profile-File response header.
+    View with `python -m pstats file` or `snakeviz file`.
+  - GET /admin/profile?seconds=10&interval_ms=5
+    time-boxed sampling profile of every thread in the process (sys._current_frames),
+    returned as collapsed stacks ("frame;frame;frame count" per line, for
+    flamegraph.pl / speedscope) and saved next to the pstats files.
+  - GET /admin/profiles  lists the saved files.
+
+If PROFILE_TOKEN is set, the X-Profile header and the admin endpoints must
+carry it (header X-Profile-Token for the admin endpoints).
+
+Sync endpoints run in a worker thread, so the profiler is enabled inside a
+wrapper around the endpoint itself (ProfiledRoute), not in the middleware.
+For async endpoints the profile also sees whatever else the event loop ran
+while the request was awaiting the upstream.
+
+Only one request is profiled at a time: a cProfile hook is per-thread on 3.11
+(so overlapping async requests on the event loop clobber each other) and
+process-wide on 3.12+ (a second enable() raises). A request that arrives
+while another is being profiled just runs unprofiled, and profiler setup or
+dump errors never fail the request.
+"""
+import os, re, sys, time, random, cProfile, functools, inspect, logging, threading
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+from src.serving.logs import log_event
+from src.serving.tracing import current_request_id
+
+ROOT = Path(__file__).resolve().parents[2]
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"
+PROFILE_SAMPLE = float(os.getenv("PROFILE_SAMPLE", "0") or 0)
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(ROOT/"data"/"profiles")))
+MAX_SAMPLE_SECONDS = 120
+
+_wanted = ContextVar("contracts_profile", default=None)
+_sampling_lock = threading.Lock()
+_request_lock = threading.Lock()  # one per-request cProfile at a time
+logger = logging.getLogger("profiling")
+
+
+def _safe(s: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", s).strip("_") or "root"
+
+
+def _out_path(app_name: str, what: str, ext: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    return PROFILE_DIR/f"{time.strftime('%Y%m%d-%H%M%S')}-{app_name}-{_safe(what)}.{ext}"
+
+
+def _start():
+    """Enabled profiler, or None if another request holds it or it can't start."""
+    if not _request_lock.acquire(blocking=False):
+        return None
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except Exception as e:  # e.g. "Another profiling tool is already active"
+        _request_lock.release()
+        log_event(logger, logging.WARNING, "profile_skipped", error=str(e))
+        return None
+    return prof
+
+
+def _stop(prof, req: dict) -> None:
+    try:
+        prof.disable()
+        _dump(prof, req)
+    except Exception as e:
+        log_event(logger, logging.WARNING, "profile_dump_failed", error=str(e))
+    finally:
+        _request_lock.release()
+
+
+def _profiled_call(fn, args, kwargs):
+    req = _wanted.get()
+    prof = _start()
+    if prof is None:
+        return fn(*args, **kwargs)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _stop(prof, req)
+
+
+async def _profiled_acall(fn, args, kwargs):
+    req = _wanted.get()
+    prof = _start()
+    if prof is None:
+        return await fn(*args, **kwargs)
+    try:
+        return await fn(*args, **kwargs)
+    finally:
+        _stop(prof, req)
+
+
+def _dump(prof, req: dict) -> None:
+    path = _out_path(req["app"], f"{req['route']}-{current_request_id() or 'norid'}", "pstats")
+    prof.dump_stats(str(path))
+    req["file"] = path.name
+
+
+def _wrap_endpoint(fn):
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def endpoint(*args, **kwargs):
+            if _wanted.get() is None:
+                return await fn(*args, **kwargs)
+            return await _profiled_acall(fn, args, kwargs)
+    else:
+        @functools.wraps(fn)
+        def endpoint(*args, **kwargs):
+            if _wanted.get() is None:
+                return fn(*args, **kwargs)
+            return _profiled_call(fn, args, kwargs)
+    return endpoint
+
+
+def sample_stacks(seconds: float, interval: float) -> Counter:
+    """Sample the Python stacks of all other threads every `interval` s for `seconds` s."""
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            parts.append(names.get(tid, f"thread-{tid}"))
+            stacks[";".join(reversed(parts))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{s} {n}\n" for s, n in stacks.most_common())
+
+
+def install(app, app_name: str) -> None:
+    if not PROFILE_ENABLED:
+        return
+    from fastapi import Request, HTTPException, Query
+    from fastapi.responses import PlainTextResponse
+    from fastapi.routing import APIRoute
+
+    class ProfiledRoute(APIRoute):
+        def __init__(self, path, endpoint, **kwargs):
+            super().__init__(path, _wrap_endpoint(endpoint), **kwargs)
+
+    app.router.route_class = ProfiledRoute
+
+    def _check_token(request: Request):
+        if PROFILE_TOKEN and request.headers.get("X-Profile-Token") != PROFILE_TOKEN:
+            raise HTTPException(403, "profiling token required")
+
+    @app.middleware("http")
+    async def _profile_mw(request: Request, call_next):
+        flag = request.headers.get("X-Profile")
+        want = (flag == PROFILE_TOKEN) if (flag and PROFILE_TOKEN) else flag in ("1", "true")
+        if not want and not (PROFILE_SAMPLE and random.random() < PROFILE_SAMPLE):
+            return await call_next(request)
+        req = {"app": app_name, "route": request.url.path, "file": None}
+        token = _wanted.set(req)
+        try:
+            response = await call_next(request)
+        finally:
+            _wanted.reset(token)
+        if req["file"]:
+            response.headers["X-Profile-File"] = req["file"]
+        return response
+
+    @app.get("/admin/profile", include_in_schema=False)
+    def admin_profile(request: Request, seconds: float = Query(10, gt=0, le=MAX_SAMPLE_SECONDS),
+                      interval_ms: float = Query(5, ge=1, le=1000)):
+        _check_token(request)
+        if not _sampling_lock.acquire(blocking=False):
+            raise HTTPException(409, "a sampling profile is already running")
+        try:
+            stacks = sample_stacks(seconds, interval_ms / 1000.0)
+        finally:
+            _sampling_lock.release()
+        text = collapsed(stacks)
+        path = _out_path(app_name, "process", "collapsed.txt")
+        path.write_text(text, encoding="utf-8")
+        return PlainTextResponse(text, headers={"X-Profile-File": path.name})
+
+    @app.get("/admin/profiles", include_in_schema=False)
+    def admin_profiles(request: Request):
+        _check_token(request)
+        if not PROFILE_DIR.exists():
+            return {"dir": str(PROFILE_DIR), "files": []}
+        files = sorted(PROFILE_DIR.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)
+        return {"dir": str(PROFILE_DIR), "files": [
+            {"name": p.name, "bytes": p.stat().st_size} for p in files[:200]]}
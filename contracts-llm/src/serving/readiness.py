@@ -0,0 +1,90 @@
+# src/serving/readiness.py
+"""
+Background loading + readiness for apps with heavy startup (faiss, pandas,
+SentenceTransformer, index files).
+
+    state = Loader("rag_api", load_fn, warmup_fn)
+    state.install(app)          # starts loading on startup, adds GET /ready
+    res = state.get()           # in endpoints: the loaded resources, or HTTP 503
+
+uvicorn starts listening immediately (liveness = /health), the load runs in a
+thread, and /ready reports status, error and per-step timings
+(imports, index/model load, warm-up). load_fn receives the Loader so it can
+time sub-steps with `with loader.step("import_faiss"): ...`.
+Set RAG_WARMUP=0 to skip the warm-up encode/search.
+"""
+import os, logging, threading, time
+from contextlib import contextmanager
+
+WARMUP = os.getenv("RAG_WARMUP", "1") != "0"
+logger = logging.getLogger("readiness")
+
+
+class Loader:
+    def __init__(self, name, load_fn, warmup_fn=None):
+        self.name = name
+        self.load_fn, self.warmup_fn = load_fn, warmup_fn
+        self.status = "starting"
+        self.error = None
+        self.timings = {}
+        self.resources = None
+        self._thread = None
+        self._created = time.perf_counter()
+
+    @contextmanager
+    def step(self, label: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[f"{label}_s"] = round(time.perf_counter() - t0, 3)
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def _run(self):
+        self.status = "loading"
+        try:
+            with self.step("load_total"):
+                res = self.load_fn(self)
+            if self.warmup_fn is not None and WARMUP:
+                with self.step("warmup"):
+                    self.warmup_fn(res)
+            self.resources = res
+            self.status = "ready"
+            self.timings["ready_after_s"] = round(time.perf_counter() - self._created, 3)
+            logger.info("ready", extra={"loader": self.name, "timings": self.timings})
+        except Exception as e:  # noqa: BLE001
+            self.status = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            logger.exception("load_failed", extra={"loader": self.name, "error": self.error})
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-loader", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None) -> bool:
+        self.start()
+        self._thread.join(timeout)
+        return self.ready
+
+    def get(self):
+        if self.ready:
+            return self.resources
+        from fastapi import HTTPException
+        detail = self.error if self.status == "failed" else f"{self.name} is {self.status}"
+        raise HTTPException(503, detail)
+
+    def report(self) -> dict:
+        return {"ready": self.ready, "status": self.status, "error": self.error, "timings": self.timings}
+
+    def install(self, app):
+        from fastapi.responses import JSONResponse
+
+        app.router.on_startup.append(self.start)
+
+        @app.get("/ready")
+        def ready():
+            return JSONResponse(self.report(), status_code=200 if self.ready else 503)
@@ -0,0 +1,132 @@
+# src/serving/tracing.py
+"""
+Request IDs, Server-Timing headers and an opt-in per-request trace log.
+
+install(app, "simple_backend") adds a middleware that:
+  - takes X-Request-ID from the caller (gateway / UI server) or generates one,
+    and echoes it on the response;
+  - collects every stage recorded through src/serving/metrics.record_stage()
+    during the request (encode, search, upstream_ttft, upstream, ...);
+  - emits them as `Server-Timing: encode;dur=3.1, ..., app;dur=812.4`;
+  - for streamed NDJSON responses (/llm/ask-batch, /ask/progressive) the
+    header can only carry the stages that ran before the first byte, so one
+    last line {"type": "timing", "server_timing": "..."} is appended with
+    every stage, including those recorded while streaming (upstream, encode);
+  - if TRACE_LOG=<path> is set, appends one JSON line per request with the
+    same breakdown so a slow request can be reconstructed afterwards (written
+    by a background thread, see src/serving/logs.BackgroundWriter).
+
+The upstream call layer forwards current_request_id() as X-Request-ID and
+attributes token usage to the trace's route and client (X-Client-ID header,
+else the peer address).
+"""
+import os, re, json, time, uuid
+from contextvars import ContextVar
+
+from src.serving import metrics
+
+TRACE_LOG = os.getenv("TRACE_LOG", "")
+REQUEST_ID_HEADER = "X-Request-ID"
+CLIENT_ID_HEADER = "X-Client-ID"
+_VALID_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+_current = ContextVar("contracts_trace", default=None)
+
+
+class Trace:
+    __slots__ = ("request_id", "stages", "start", "route", "client", "usage")
+
+    def __init__(self, request_id: str, route: str = "", client: str = ""):
+        self.request_id = request_id
+        self.stages = []
+        self.start = time.perf_counter()
+        self.route, self.client = route, client
+        self.usage = {}
+
+
+def current_request_id():
+    tr = _current.get()
+    return tr.request_id if tr is not None else None
+
+
+def current_trace():
+    return _current.get()
+
+
+def _on_stage(name: str, seconds: float) -> None:
+    tr = _current.get()
+    if tr is not None:
+        tr.stages.append((name, seconds))
+
+
+metrics.STAGE_LISTENERS.append(_on_stage)
+
+
+def server_timing(stages, total: float, app_name: str) -> str:
+    # repeated stages (e.g. several upstream calls) are summed
+    agg = {}
+    for name, secs in stages:
+        agg[name] = agg.get(name, 0.0) + secs
+    parts = [f"{re.sub(r'[^A-Za-z0-9_-]', '_', n)};dur={s * 1000:.1f}" for n, s in agg.items()]
+    parts.append(f"{app_name};dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _write_trace(rec: dict) -> None:
+    from src.serving.logs import writer_for
+    writer_for(TRACE_LOG, "trace").write(json.dumps(rec, ensure_ascii=False))
+
+
+async def _with_timing_line(body, tr: Trace, app_name: str, done):
+    try:
+        async for chunk in body:
+            yield chunk
+        total = time.perf_counter() - tr.start
+        yield (json.dumps({"type": "timing", "server_timing": server_timing(tr.stages, total, app_name)})
+               + "\n").encode("utf-8")
+    finally:
+        done()
+
+
+def install(app, app_name: str) -> None:
+    from fastapi import Request
+
+    @app.middleware("http")
+    async def _trace_mw(request: Request, call_next):
+        rid = request.headers.get(REQUEST_ID_HEADER, "")
+        if not _VALID_ID.match(rid):
+            rid = uuid.uuid4().hex
+        client = request.headers.get(CLIENT_ID_HEADER, "")
+        if not _VALID_ID.match(client):
+            client = request.client.host if request.client else "unknown"
+        tr = Trace(rid, request.url.path, client)
+        token = _current.set(tr)
+        status = 500
+        streamed = False
+
+        def finish():
+            if TRACE_LOG:
+                route = getattr(request.scope.get("route"), "path", None) or request.url.path
+                _write_trace({
+                    "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "app": app_name, "request_id": rid,
+                    "method": request.method, "route": route, "status": status, "client": tr.client,
+                    "total_ms": round((time.perf_counter() - tr.start) * 1000, 2),
+                    "stages": [[n, round(s * 1000, 2)] for n, s in tr.stages],
+                    **({"usage": tr.usage} if tr.usage else {}),
+                })
+
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            total = time.perf_counter() - tr.start
+            response.headers[REQUEST_ID_HEADER] = rid
+            response.headers["Server-Timing"] = server_timing(tr.stages, total, app_name)
+            if response.headers.get("content-type", "").startswith("application/x-ndjson"):
+                # stages keep landing on tr while the body streams; report (and log) them at the end
+                response.body_iterator = _with_timing_line(response.body_iterator, tr, app_name, finish)
+                streamed = True
+            return response
+        finally:
+            _current.reset(token)
+            if not streamed:
+                finish()
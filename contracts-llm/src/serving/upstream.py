@@ -0,0 +1,217 @@
+# src/serving/upstream.py
+"""
+Upstream LLM call layer shared by the serving apps.
+
+chat_completion()   async, OpenAI-compatible /v1/chat/completions (LM Studio, OpenAI)
+ollama_generate()   sync, Ollama /api/generate
+ollama_stream()     sync generator over the same call, yields text pieces as they arrive
+
+Both stream from the upstream by default (UPSTREAM_STREAM=0 to disable) so
+time-to-first-token can be measured, then hand back the same shape a
+non-streamed call returns. One pooled httpx.AsyncClient is reused per timeout
+instead of opening a new connection per request. TTFT, total upstream time,
+tokens/s, completion tokens and error counts go to src/serving/metrics.py;
+the current request ID is forwarded upstream as X-Request-ID.
+Prompts are held to the route's token budget before sending and the usage
+reported back is accounted per route and client (src/serving/budget.py);
+over-budget prompts raise BudgetExceeded (status 413).
+"""
+import os, json, time
+import httpx
+
+from src.serving.metrics import (record_stage, UPSTREAM_ERRORS, UPSTREAM_IN_FLIGHT,
+                                 UPSTREAM_TOKENS, UPSTREAM_TPS)
+from src.serving.tracing import current_request_id, REQUEST_ID_HEADER
+from src.serving import budget
+from src.serving.budget import BudgetExceeded  # noqa: F401  (re-exported for the apps)
+
+UPSTREAM_STREAM = os.getenv("UPSTREAM_STREAM", "1") != "0"
+
+_clients = {}
+
+
+class UpstreamError(Exception):
+    """Non-2xx answer from the upstream (status + body text)."""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(f"HTTP {status}: {detail[:200]}")
+        self.status, self.detail = status, detail
+
+
+def get_client(timeout: float = 90.0) -> httpx.AsyncClient:
+    client = _clients.get(timeout)
+    if client is None or client.is_closed:
+        client = _clients[timeout] = httpx.AsyncClient(
+            timeout=timeout, limits=httpx.Limits(max_connections=100, max_keepalive_connections=20))
+    return client
+
+
+def _record(t0: float, ttft, completion_tokens) -> None:
+    total = time.perf_counter() - t0
+    record_stage("upstream", total)
+    if ttft is not None:
+        record_stage("upstream_ttft", ttft)
+    if completion_tokens:
+        UPSTREAM_TOKENS.inc(completion_tokens)
+        gen = total - (ttft or 0.0)
+        if gen > 0 and completion_tokens > 1:
+            UPSTREAM_TPS.observe((completion_tokens - 1) / gen)
+
+
+def _with_request_id(headers):
+    rid = current_request_id()
+    if not rid:
+        return headers
+    return {**(headers or {}), REQUEST_ID_HEADER: rid}
+
+
+def _error_kind(e: Exception) -> str:
+    if isinstance(e, UpstreamError):
+        return f"http_{e.status}"
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"http_{e.response.status_code}"
+    return type(e).__name__
+
+
+async def chat_completion(url: str, payload: dict, headers: dict = None, timeout: float = 90.0,
+                          stream: bool = None, token_budget: int = None) -> dict:
+    """
+    POST an OpenAI-style chat completion and return the (non-streamed shape) response dict.
+    Raises httpx.HTTPError (incl. HTTPStatusError) like resp.raise_for_status() would,
+    or BudgetExceeded before sending anything.
+    """
+    stream = UPSTREAM_STREAM if stream is None else stream
+    body, est = budget.apply(payload, token_budget)
+    if stream:
+        body["stream"] = True
+        body["stream_options"] = {"include_usage": True}
+    client = get_client(timeout)
+    t0 = time.perf_counter()
+    ttft = None
+    UPSTREAM_IN_FLIGHT.inc()
+    try:
+        async with client.stream("POST", url, json=body, headers=_with_request_id(headers)) as resp:
+            if resp.status_code >= 400:
+                await resp.aread()
+                resp.raise_for_status()
+            if not stream:
+                ttft = time.perf_counter() - t0
+                data = json.loads(await resp.aread())
+            else:
+                parts, usage, model = [], None, None
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    raw = line[5:].strip()
+                    if raw == "[DONE]":
+                        break
+                    chunk = json.loads(raw)
+                    model = chunk.get("model", model)
+                    if chunk.get("usage"):
+                        usage = chunk["usage"]
+                    for ch in chunk.get("choices") or []:
+                        piece = (ch.get("delta") or {}).get("content")
+                        if piece:
+                            if ttft is None:
+                                ttft = time.perf_counter() - t0
+                            parts.append(piece)
+                data = {"model": model, "usage": usage, "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": "".join(parts)}}]}
+                if usage is None:
+                    data["usage"] = {"completion_tokens": len(parts)}
+    except Exception as e:
+        UPSTREAM_ERRORS.inc(kind=_error_kind(e))
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec()
+    usage = data.get("usage") or {}
+    _record(t0, ttft, usage.get("completion_tokens"))
+    budget.record(est, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+    return data
+
+
+def ollama_stream(base_url: str, payload: dict, timeout: float = 300.0, token_budget: int = None):
+    """
+    Streamed Ollama /api/generate: yields the response text pieces as they arrive.
+    The generator's return value (StopIteration.value, or `yield from`) is the final
+    chunk with the whole "response". Raises like ollama_generate().
+    """
+    import requests
+
+    payload, est = budget.apply(payload, token_budget)
+    t0 = time.perf_counter()
+    ttft = None
+    parts, data = [], {}
+    UPSTREAM_IN_FLIGHT.inc()
+    try:
+        r = requests.post(f"{base_url.rstrip('/')}/api/generate",
+                          json={**payload, "stream": True}, stream=True, timeout=timeout,
+                          headers=_with_request_id(None))
+        with r:
+            if r.status_code != 200:
+                raise UpstreamError(r.status_code, r.text)
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                piece = chunk.get("response")
+                if piece:
+                    if ttft is None:
+                        ttft = time.perf_counter() - t0
+                    parts.append(piece)
+                    yield piece
+                if chunk.get("done"):
+                    data = chunk
+                    break
+    except GeneratorExit:
+        # consumer stopped early (closed the generator): the connection is dropped,
+        # which stops the generation; account for what was produced so far
+        _record(t0, ttft, len(parts))
+        budget.record(est, None, len(parts))
+        raise
+    except Exception as e:
+        UPSTREAM_ERRORS.inc(kind=_error_kind(e))
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec()
+    data = {**data, "response": "".join(parts)}
+    _record(t0, ttft, data.get("eval_count"))
+    budget.record(est, data.get("prompt_eval_count"), data.get("eval_count"))
+    return data
+
+
+def ollama_generate(base_url: str, payload: dict, timeout: float = 300.0, stream: bool = None,
+                    token_budget: int = None) -> dict:
+    """
+    POST to Ollama /api/generate; returns the final non-streamed style dict
+    ({"response": ..., "eval_count": ...}). Raises UpstreamError on non-200
+    and BudgetExceeded before sending anything.
+    """
+    import requests
+
+    stream = UPSTREAM_STREAM if stream is None else stream
+    if stream:
+        gen = ollama_stream(base_url, payload, timeout, token_budget)
+        while True:
+            try:
+                next(gen)
+            except StopIteration as done:
+                return done.value
+    payload, est = budget.apply(payload, token_budget)
+    t0 = time.perf_counter()
+    UPSTREAM_IN_FLIGHT.inc()
+    try:
+        r = requests.post(f"{base_url.rstrip('/')}/api/generate",
+                          json={**payload, "stream": False}, timeout=timeout,
+                          headers=_with_request_id(None))
+        if r.status_code != 200:
+            raise UpstreamError(r.status_code, r.text)
+        data = r.json()
+    except Exception as e:
+        UPSTREAM_ERRORS.inc(kind=_error_kind(e))
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec()
+    _record(t0, time.perf_counter() - t0, data.get("eval_count"))
+    budget.record(est, data.get("prompt_eval_count"), data.get("eval_count"))
+    return data
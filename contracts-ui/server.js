@@ -7,12 +7,14 @@
  *   DELETE /api/contracts/:id
  *   POST   /api/llm/ask-v2
  *   POST   /ask-doc-ui
+ *   POST   /ask-doc-ui-batch
  */
 
 import express from "express";
 import path from "path";
 import fs from "fs/promises";
 import { fileURLToPath } from "url";
+import { randomUUID } from "crypto";
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname  = path.dirname(__filename);
@@ -101,6 +103,10 @@ app.post("/api/contracts", async (req, res) => {
     filtered.push(contract);
     await saveContracts(filtered);
 
+    if (contract.contractText.trim()) {
+      precomputeContract(contract);
+    }
+
     res.json({ ok: true, contract });
   } catch (err) {
     console.error("Error in POST /api/contracts", err);
@@ -112,6 +118,25 @@ app.post("/api/contracts", async (req, res) => {
   }
 });
 
+// Extra context sent with every UI question about a stored contract.
+function contractExtraContext(contract) {
+  return `This question is about the contract "${contract.name}" with id ${contract.id}.`;
+}
+
+// Fire-and-forget: the backend segments, embeds and pre-answers the canonical
+// questions for this text in the background (keyed by content hash). The extra
+// context must match what /ask-doc-ui sends, or the canonical answers are not used.
+function precomputeContract(contract) {
+  fetch(`${LLM_API_URL}/contracts/precompute`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ contractText: contract.contractText, extraContext: contractExtraContext(contract) })
+  })
+    .then(r => r.json())
+    .then(d => console.log(`[LLM] precompute contract=${contract.id} sha1=${d.sha1} status=${d.status}`))
+    .catch(err => console.error("[LLM] precompute failed", String(err)));
+}
+
 // --- API: DELETE /api/contracts/:id ---
 app.delete("/api/contracts/:id", async (req, res) => {
   const { id } = req.params;
@@ -131,18 +156,24 @@ app.delete("/api/contracts/:id", async (req, res) => {
 });
 
 // --- LLM call helper ---
-async function callLlm(question, contractText, extraContext = "") {
+// requestId is forwarded as X-Request-ID so the backend trace can be matched to this call
+async function callLlm(question, contractText, extraContext = "", requestId = randomUUID()) {
   const payload = {
     question: (question || "").toString(),
     contractText: (contractText || "").toString(),
     extraContext: (extraContext || "").toString()
   };
 
+  const t0 = Date.now();
   const resp = await fetch(`${LLM_API_URL}/llm/ask-basic`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { "Content-Type": "application/json", "X-Request-ID": requestId },
     body: JSON.stringify(payload)
   });
+  console.log(
+    `[LLM] id=${requestId} status=${resp.status} ms=${Date.now() - t0} ` +
+    `server-timing="${resp.headers.get("server-timing") || ""}"`
+  );
 
   if (!resp.ok) {
     const text = await resp.text();
@@ -160,7 +191,8 @@ app.post("/api/llm/ask-v2", async (req, res) => {
     const answer = await callLlm(
       body.question || "",
       body.contractText || "",
-      body.extraContext || ""
+      body.extraContext || "",
+      req.get("x-request-id") || randomUUID()
     );
     res.json({ ok: true, answer });
   } catch (err) {
@@ -214,10 +246,10 @@ app.post("/ask-doc-ui", async (req, res) => {
 
     const contractText = contract ? buildContractText(contract) : "";
     const extraContext = contract
-      ? `This question is about the contract "${contract.name}" with id ${contract.id}.`
+      ? contractExtraContext(contract)
       : "No contract was found for this question.";
 
-    const answer = await callLlm(question, contractText, extraContext);
+    const answer = await callLlm(question, contractText, extraContext, req.get("x-request-id") || randomUUID());
 
     res.json({
       ok: true,
@@ -235,6 +267,56 @@ app.post("/ask-doc-ui", async (req, res) => {
   }
 });
 
+// --- API: POST /ask-doc-ui-batch (contract review: many questions, one contract) ---
+// Streams the backend's NDJSON through unchanged: one line per question as it completes.
+app.post("/ask-doc-ui-batch", async (req, res) => {
+  const requestId = req.get("x-request-id") || randomUUID();
+  try {
+    const body = req.body || {};
+    const questions = Array.isArray(body.questions) ? body.questions.map(q => (q || "").toString()) : [];
+    const contractId = body.contractId ? body.contractId.toString() : "";
+
+    const contracts = await loadContracts();
+    const contract  = contracts.find(c => String(c.id) === contractId);
+
+    const payload = {
+      questions,
+      contractText: contract ? buildContractText(contract) : "",
+      extraContext: contract
+        ? `These questions are about the contract "${contract.name}" with id ${contract.id}.`
+        : "No contract was found for these questions."
+    };
+
+    const t0 = Date.now();
+    const resp = await fetch(`${LLM_API_URL}/llm/ask-batch`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json", "X-Request-ID": requestId },
+      body: JSON.stringify(payload)
+    });
+    console.log(`[LLM] batch id=${requestId} status=${resp.status} questions=${questions.length}`);
+
+    res.status(resp.status);
+    res.set("Content-Type", resp.headers.get("content-type") || "application/x-ndjson");
+    res.set("X-Request-ID", requestId);
+    for await (const chunk of resp.body) {
+      res.write(chunk);
+    }
+    res.end();
+    console.log(`[LLM] batch id=${requestId} done ms=${Date.now() - t0}`);
+  } catch (err) {
+    console.error("Error in /ask-doc-ui-batch", err);
+    if (!res.headersSent) {
+      res.status(500).json({
+        ok: false,
+        error: "Unexpected error contacting the LLM.",
+        detail: String(err)
+      });
+    } else {
+      res.end();
+    }
+  }
+});
+
 // --- SPA fallback ---
 app.get("*", (_req, res) => {
   res.sendFile(path.join(__dirname, "public", "index.html"));